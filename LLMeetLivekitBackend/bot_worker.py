@@ -0,0 +1,71 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI
+from loguru import logger
+
+from static.database_connector import init_connection_pool, close_connection_pool
+from router import metrics_router, worker_router
+from utils.bot_registry import BOT_WORKER_ID, HEARTBEAT_INTERVAL, bot_registry
+from utils.livekit_bot import rooms
+from utils.meeting_pipeline import meeting_pipeline
+from utils.record_notificator import record_notificator
+from utils.admission import admission
+from utils.recording_governor import recording_governor
+from utils.recording_catalog import recording_catalog
+
+BOT_WORKER_PORT = int(os.getenv("BOT_WORKER_PORT", "7800"))
+BOT_WORKER_URL = f"http://127.0.0.1:{BOT_WORKER_PORT}"
+
+
+async def heartbeat():
+    while True:
+        try:
+            await asyncio.to_thread(bot_registry.heartbeat, BOT_WORKER_ID, BOT_WORKER_URL, len(rooms))
+        except Exception as e:
+            logger.warning(f"[{BOT_WORKER_ID}] 心跳失败: {e}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_connection_pool()
+    # 上次进程退出前认领的房间已不再录制
+    await asyncio.to_thread(bot_registry.release_all, BOT_WORKER_ID)
+    hb = asyncio.create_task(heartbeat())
+    admission.loop_lag.start()
+    recording_governor.start()
+    # 会后通知写入登记表的事件队列，由 API worker 转发给 WebSocket 客户端
+    record_notificator.forward = bot_registry.publish
+    # 只由第一个 worker 清扫遗留目录，避免多个进程重复接管
+    await meeting_pipeline.start(
+        is_active=lambda meeting_id: bot_registry.owner(meeting_id) is not None,
+        sweep=BOT_WORKER_ID.endswith("-0"),
+    )
+    if BOT_WORKER_ID.endswith("-0"):
+        recording_catalog.start()
+
+    yield
+
+    await recording_catalog.stop()
+    await meeting_pipeline.stop()
+    await recording_governor.stop()
+    await admission.loop_lag.stop()
+    hb.cancel()
+    await asyncio.to_thread(bot_registry.release_all, BOT_WORKER_ID)
+    close_connection_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(worker_router.router)
+app.include_router(metrics_router.router)
+
+
+def main():
+    uvicorn.run(app, host="127.0.0.1", port=BOT_WORKER_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,7 @@ CREATE TABLE `meeting` (
   `meeting_id` varchar(19) NOT NULL COMMENT '19位带横线随机生成ID（示例：0041-gsxw-zx2f-vlpb）',
   `title` varchar(255) NOT NULL COMMENT '会议标题',
   `description` text COMMENT '会议描述',
-  `start_time` datetime DEFAULT NULL COMMENT '开始时间',
+  `start_time` datetime NOT NULL COMMENT '开始时间',
   `end_time` datetime DEFAULT NULL COMMENT '结束时间',
   `creator_id` varchar(50) NOT NULL COMMENT '创建者ID（关联user表）',
   `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
@@ -46,10 +46,11 @@ DROP TABLE IF EXISTS `minutes`;
 CREATE TABLE `minutes` (
   `minutes_id` int NOT NULL AUTO_INCREMENT COMMENT '纪要自增ID',
   `meeting_id` varchar(19) NOT NULL COMMENT '关联的会议UUID',
-  `segments` json DEFAULT NULL COMMENT '纪要内容',
+  `segments` json DEFAULT NULL COMMENT '旧版整段纪要，已迁移到 minute_segments',
   `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `language` varchar(5) DEFAULT 'en',
   `video_summarization` text,
+  `revision` int NOT NULL DEFAULT '0' COMMENT '每次写入纪要或片段时递增，用作 ETag',
   PRIMARY KEY (`minutes_id`),
   UNIQUE KEY `meeting_id_UNIQUE` (`meeting_id`),
   KEY `idx_meeting_id` (`meeting_id`),
@@ -57,6 +58,46 @@ CREATE TABLE `minutes` (
 ) ENGINE=InnoDB AUTO_INCREMENT=4 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='会议纪要表';
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `minute_segments`
+--
+
+DROP TABLE IF EXISTS `minute_segments`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `minute_segments` (
+  `segment_id` bigint NOT NULL AUTO_INCREMENT,
+  `meeting_id` varchar(19) NOT NULL COMMENT '关联的会议ID',
+  `start` double NOT NULL COMMENT '片段开始时间（秒，会议时间轴）',
+  `end` double NOT NULL COMMENT '片段结束时间（秒）',
+  `speaker` varchar(64) DEFAULT NULL COMMENT '发言人',
+  `text` text NOT NULL COMMENT '转写文本',
+  PRIMARY KEY (`segment_id`),
+  KEY `idx_segment_time` (`meeting_id`,`start`),
+  KEY `idx_segment_speaker` (`meeting_id`,`speaker`,`start`),
+  CONSTRAINT `minute_segments_ibfk_1` FOREIGN KEY (`meeting_id`) REFERENCES `meeting` (`meeting_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='会议纪要转写片段（每行一个片段）';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `minute_summaries`
+--
+
+DROP TABLE IF EXISTS `minute_summaries`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!50503 SET character_set_client = utf8mb4 */;
+CREATE TABLE `minute_summaries` (
+  `content_hash` char(64) NOT NULL COMMENT 'sha256(转写片段 + 画面总结 + 模型版本)',
+  `meeting_id` varchar(19) NOT NULL COMMENT '关联的会议ID',
+  `model_version` varchar(128) NOT NULL COMMENT '生成总结的模型 / 适配器版本',
+  `summary` mediumtext NOT NULL COMMENT '生成的会议总结（Markdown）',
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '生成时间',
+  PRIMARY KEY (`content_hash`),
+  KEY `idx_summary_meeting` (`meeting_id`),
+  CONSTRAINT `minute_summaries_ibfk_1` FOREIGN KEY (`meeting_id`) REFERENCES `meeting` (`meeting_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='会议总结缓存（按内容哈希）';
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `records`
 --
@@ -104,9 +145,11 @@ CREATE TABLE `user_meeting` (
   `username` varchar(50) NOT NULL COMMENT '用户ID',
   `meeting_id` varchar(19) NOT NULL COMMENT '会议UUID',
   `joined_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '加入时间',
+  `meeting_start` datetime NOT NULL COMMENT '会议开始时间（冗余自 meeting.start_time，用于列表排序）',
   PRIMARY KEY (`user_meeting_id`),
   UNIQUE KEY `unique_user_meeting` (`username`,`meeting_id`),
   KEY `idx_meeting_id` (`meeting_id`),
+  KEY `idx_user_meeting_start` (`username`,`meeting_start`,`meeting_id`),
   KEY `user_meeting_ibfk_1_idx` (`username`),
   CONSTRAINT `user_meeting_ibfk_1` FOREIGN KEY (`username`) REFERENCES `user` (`username`),
   CONSTRAINT `user_meeting_ibfk_2` FOREIGN KEY (`meeting_id`) REFERENCES `meeting` (`meeting_id`) ON DELETE CASCADE
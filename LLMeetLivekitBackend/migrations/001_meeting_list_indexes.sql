@@ -0,0 +1,20 @@
+-- 会议列表游标分页（/meeting/get_all、/meeting/get_all_with_records）所需的列和索引
+-- 在已有数据库上执行一次：mysql llmeet < migrations/001_meeting_list_indexes.sql
+-- 执行后用 scripts/check_query_plans.py 确认查询计划中没有全表扫描和 filesort
+
+-- 分页按 (start_time, meeting_id) 排序，start_time 为空的会议无法落入任何游标区间，先用创建时间补齐
+UPDATE `meeting` SET `start_time` = COALESCE(`created_at`, NOW()) WHERE `start_time` IS NULL;
+ALTER TABLE `meeting` MODIFY `start_time` datetime NOT NULL COMMENT '开始时间';
+
+-- 过滤条件（username）在 user_meeting 上、排序键（start_time）在 meeting 上，没有一个索引能同时满足，
+-- 重度用户每翻一页都要读出自己全部的参会记录再 filesort。把会议开始时间冗余到 user_meeting，
+-- 按 (username, meeting_start, meeting_id) 索引倒序读够 limit 行即可；二级索引隐含主键 user_meeting_id，EXISTS 关联无需回表。
+-- 会议创建后 start_time 不再修改，冗余列只在写入 user_meeting 时赋值
+ALTER TABLE `user_meeting` ADD COLUMN `meeting_start` datetime DEFAULT NULL COMMENT '会议开始时间（冗余自 meeting.start_time，用于列表排序）';
+UPDATE `user_meeting` um JOIN `meeting` m ON m.`meeting_id` = um.`meeting_id` SET um.`meeting_start` = m.`start_time`;
+ALTER TABLE `user_meeting`
+  MODIFY `meeting_start` datetime NOT NULL COMMENT '会议开始时间（冗余自 meeting.start_time，用于列表排序）',
+  ADD KEY `idx_user_meeting_start` (`username`, `meeting_start`, `meeting_id`);
+
+-- 其余查询已有合适的索引，无需新增：
+--   records.record_ibfk_1_idx (user_meeting_id)：EXISTS 半连接按关联 ID 探测
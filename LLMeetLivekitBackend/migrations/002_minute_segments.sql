@@ -0,0 +1,33 @@
+-- 会议纪要由 minutes.segments 整段 JSON 改为 minute_segments 每行一个片段，
+-- 支持按时间窗 / 发言人 / 分页查询，会议中追加片段也不再改写整段 JSON
+-- mysql llmeet < migrations/002_minute_segments.sql
+
+CREATE TABLE IF NOT EXISTS `minute_segments` (
+  `segment_id` bigint NOT NULL AUTO_INCREMENT,
+  `meeting_id` varchar(19) NOT NULL COMMENT '关联的会议ID',
+  `start` double NOT NULL COMMENT '片段开始时间（秒，会议时间轴）',
+  `end` double NOT NULL COMMENT '片段结束时间（秒）',
+  `speaker` varchar(64) DEFAULT NULL COMMENT '发言人',
+  `text` text NOT NULL COMMENT '转写文本',
+  PRIMARY KEY (`segment_id`),
+  KEY `idx_segment_time` (`meeting_id`,`start`),
+  KEY `idx_segment_speaker` (`meeting_id`,`speaker`,`start`),
+  CONSTRAINT `minute_segments_ibfk_1` FOREIGN KEY (`meeting_id`) REFERENCES `meeting` (`meeting_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='会议纪要转写片段（每行一个片段）';
+
+-- 把已有的整段 JSON 拆成片段行，按数组顺序插入（segment_id 保持原有顺序）
+START TRANSACTION;
+INSERT INTO `minute_segments` (`meeting_id`, `start`, `end`, `speaker`, `text`)
+SELECT m.`meeting_id`, jt.`start`, jt.`end`, jt.`speaker`, COALESCE(jt.`text`, '')
+FROM `minutes` m,
+     JSON_TABLE(m.`segments`, '$[*]' COLUMNS (
+         `idx` FOR ORDINALITY,
+         `start` double PATH '$.start',
+         `end` double PATH '$.end',
+         `speaker` varchar(64) PATH '$.speaker',
+         `text` text PATH '$.text'
+     )) jt
+WHERE m.`segments` IS NOT NULL
+ORDER BY m.`meeting_id`, jt.`idx`;
+UPDATE `minutes` SET `segments` = NULL WHERE `segments` IS NOT NULL;
+COMMIT;
@@ -0,0 +1,13 @@
+-- 会议总结缓存：同一份纪要（片段 + 画面总结）在同一模型版本下只生成一次
+-- mysql llmeet < migrations/003_minute_summaries.sql
+
+CREATE TABLE IF NOT EXISTS `minute_summaries` (
+  `content_hash` char(64) NOT NULL COMMENT 'sha256(转写片段 + 画面总结 + 模型版本)',
+  `meeting_id` varchar(19) NOT NULL COMMENT '关联的会议ID',
+  `model_version` varchar(128) NOT NULL COMMENT '生成总结的模型 / 适配器版本',
+  `summary` mediumtext NOT NULL COMMENT '生成的会议总结（Markdown）',
+  `created_at` datetime DEFAULT CURRENT_TIMESTAMP COMMENT '生成时间',
+  PRIMARY KEY (`content_hash`),
+  KEY `idx_summary_meeting` (`meeting_id`),
+  CONSTRAINT `minute_summaries_ibfk_1` FOREIGN KEY (`meeting_id`) REFERENCES `meeting` (`meeting_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci COMMENT='会议总结缓存（按内容哈希）';
@@ -0,0 +1,5 @@
+-- 纪要版本号：每次写入 minutes 或追加片段时递增，/meeting/convert_content 据此生成 ETag，
+-- 未变化的纪要直接返回 304，无需查询片段和序列化
+-- mysql llmeet < migrations/004_minutes_revision.sql
+
+ALTER TABLE `minutes` ADD COLUMN `revision` int NOT NULL DEFAULT '0' COMMENT '每次写入纪要或片段时递增，用作 ETag';
@@ -1,30 +1,31 @@
+import functools
+import hashlib
 import json
-import os
 import asyncio
-import subprocess
-import shutil
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, Request, Query, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Literal, Optional, Dict, List
 
 import pytz
 
-from static.meeting import fetch_meeting_records, get_meeting_minutes
+from static.meeting import fetch_meeting_records, get_cached_summary, get_meeting_minutes, get_minutes_revision
 from utils.jwt_utils import get_current_user  # 你的 JWT 验证依赖
 from utils.record_notificator import record_notificator
-from utils.livekit_bot import run_bot, rooms, recording_sessions, bot_tasks
-from livekit import api as livekit_api, rtc as livekit_rtc
+from utils.livekit_bot import playlist_url
+from utils.live_encoder import HLS_PLAYLIST, segment_dir
+from utils.bot_pool import bot_pool
+from utils.llm_proxy import llm_proxy
+from utils.json_response import if_none_match, json_response, make_etag, negotiate_encoding, not_modified
+from utils.summarizer import SUMMARY_PATH, replay, store as store_summary, summary_key, summary_payload
+from utils.recording_catalog import recording_catalog
+from livekit import api as livekit_api
 
-import cv2
-import numpy as np
 from datetime import datetime
 from loguru import logger
-import wave
-import time
-import httpx
 
 # -----------------------------
 # 数据模型
@@ -44,6 +45,12 @@ class VideoPathRequest(BaseModel):
     
 class ConvertContentRequest(BaseModel):
     meeting_id: str
+    # 以下均可选：时间窗（秒）、发言人、分页；都不传时返回完整纪要
+    start: Optional[float] = None
+    end: Optional[float] = None
+    speaker: Optional[str] = None
+    offset: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, ge=1, le=2000)
 
 class VideoPathsRequest(BaseModel):
     meeting_id: str
@@ -61,6 +68,9 @@ class TranscriptSegment(BaseModel):
 class SummaryRequest(BaseModel):
     segments: List[TranscriptSegment]
     video_summarization: str
+    # 传入会议 ID 时按内容哈希缓存总结；regenerate 为 True 时忽略缓存重新生成
+    meeting_id: Optional[str] = None
+    regenerate: bool = False
 
 class ChatRequest(BaseModel):
     messages: List[Message]
@@ -75,12 +85,23 @@ router = APIRouter(prefix="/meeting", tags=["meeting"])
 
 @router.post("/start_bot")
 async def start_bot(req: BotRequest, username: str = Depends(get_current_user)):
-    room_name = req.meeting_id
-    if room_name in rooms and rooms[room_name].connection_state == livekit_rtc.ConnectionState.CONN_CONNECTED:
-        logger.info(f"[{room_name}] Bot 已连接，无需重复启动")
-        return {"status": "already connected", "room": room_name}
-    bot_tasks[room_name] = asyncio.create_task(run_bot(room_name, f"bot-{room_name}", str(username)))
-    return {"status": "connecting", "room": room_name}
+    try:
+        result = await bot_pool.start(req.meeting_id, str(username))
+    except Exception as e:
+        logger.error(f"[{req.meeting_id}] 启动 Bot 失败: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+    if result.get("status") == "rejected":
+        # 录制容量已满且排队已满
+        raise HTTPException(status_code=503, detail=result)
+    return result
+
+@router.post("/stop_bot")
+async def stop_bot(req: StopRequest, username: str = Depends(get_current_user)):
+    try:
+        return await bot_pool.stop(req.meeting_id)
+    except Exception as e:
+        logger.error(f"[{req.meeting_id}] 停止 Bot 失败: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
 
 @router.post("/token")
 async def get_token(request: MeetingRequest, username: str = Depends(get_current_user)):
@@ -93,149 +114,171 @@ async def get_token(request: MeetingRequest, username: str = Depends(get_current
     )
     return {"token": token}
 
+def _not_modified(request: Request, response: FileResponse) -> bool:
+    """按 If-None-Match（优先）或 If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or response.headers["etag"] in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(response.headers["last-modified"]) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _file_response(request: Request, fp: Path, media_type: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    FileResponse 以 64KB 分块（服务器支持时走 pathsend 零拷贝）发送文件，并处理单段、后缀、多段 Range 和 If-Range，
+    每次拖动进度条只占用一个分块的内存；这里补上 ETag / Last-Modified 的 304 协商。
+    """
+    response = FileResponse(fp, media_type=media_type, headers=headers, stat_result=fp.stat())
+    if _not_modified(request, response):
+        keep = {k: v for k, v in response.headers.items() if k in ("etag", "last-modified", "cache-control")}
+        return Response(status_code=304, headers=keep)
+    return response
+
+
 @router.get("/video")
 async def get_video(request: Request, path: str):
-    print(path)
     fp = Path(path)
     if not fp.exists() or not fp.is_file():
         raise HTTPException(status_code=404, detail="File not found")
-    size = fp.stat().st_size
-    range_hdr = request.headers.get("range")
-    if range_hdr:
-        start, end = 0, size - 1
-        bytes_range = range_hdr.replace("bytes=", "").split("-")
-        start = int(bytes_range[0])
-        if bytes_range[1]: end = int(bytes_range[1])
-        length = end - start + 1
-        def iter_chunk():
-            with open(fp, 'rb') as f:
-                f.seek(start)
-                yield f.read(length)
-        return StreamingResponse(iter_chunk(), status_code=206, media_type="video/mp4", headers={
-            "Content-Range": f"bytes {start}-{end}/{size}",
-            "Accept-Ranges": "bytes",
-            "Content-Length": str(length)
-        })
-    else:
-        def full():
-            with open(fp, 'rb') as f:
-                yield from f
-        return StreamingResponse(full(), media_type="video/mp4", headers={
-            "Accept-Ranges": "bytes",
-            "Content-Length": str(size)
-        })
+    # 文件可能在恢复流程中被重新合并，要求浏览器每次用 ETag 重新验证
+    return _file_response(request, fp, "video/mp4", {"Cache-Control": "private, no-cache"})
+
+@router.get("/hls/{meeting_id}/{stream}/{filename}")
+async def get_hls(request: Request, meeting_id: str, stream: str, filename: str):
+    """分段录制的播放列表与分片，会议进行中即可播放（播放列表为 EVENT 类型，持续追加）"""
+    if not stream.startswith("hls_") or any(p in ("", ".", "..") for p in (meeting_id, stream, filename)):
+        raise HTTPException(status_code=404, detail="File not found")
+    fp = Path("recordings") / meeting_id / stream / filename
+    if not fp.is_file():
+        raise HTTPException(status_code=404, detail="File not found")
+    if filename == HLS_PLAYLIST:
+        # 录制中播放列表不断增长，禁止缓存
+        return _file_response(request, fp, "application/vnd.apple.mpegurl", {"Cache-Control": "no-cache"})
+    return _file_response(request, fp, "video/mp4", {"Cache-Control": "public, max-age=86400"})
 
 @router.get("/recordings")
-async def list_recordings():
-    d = Path("recordings")
-    if not d.exists():
-        return {"recordings": []}
-    recs = []
-    for f in d.glob("**/final_*.mp4"):
-        s = f.stat()
-        recs.append({
-            "filename": f.name,
-            "size": s.st_size,
-            "created_at": datetime.fromtimestamp(s.st_ctime, pytz.UTC).isoformat(),
-            "modified_at": datetime.fromtimestamp(s.st_mtime, pytz.UTC).isoformat()
-        })
-    return {"recordings": sorted(recs, key=lambda x: x["created_at"], reverse=True)}
+async def list_recordings(
+    meeting_id: Optional[str] = None,
+    username: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    group_by_meeting: bool = False,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """查询录制目录（finalize 时登记，定期与磁盘对账），按创建时间倒序分页；SQLite 查询在线程中执行"""
+    since_ts = since.timestamp() if since else None
+    until_ts = until.timestamp() if until else None
+    if group_by_meeting:
+        meetings, total = await asyncio.to_thread(recording_catalog.meetings, username, since_ts, until_ts, offset, limit)
+        for m in meetings:
+            m["created_at"] = datetime.fromtimestamp(m["created_at"], pytz.UTC).isoformat()
+        return {"meetings": meetings, "total": total}
+    recs, total = await asyncio.to_thread(recording_catalog.query, meeting_id, username, since_ts, until_ts, offset, limit)
+    for r in recs:
+        r["created_at"] = datetime.fromtimestamp(r["created_at"], pytz.UTC).isoformat()
+        r["modified_at"] = datetime.fromtimestamp(r["modified_at"], pytz.UTC).isoformat()
+    return {"recordings": recs, "total": total}
 
 @router.get("/status")
 async def status(meeting_id: Optional[str] = Query(None)):
-    if meeting_id:
-        rm = rooms.get(meeting_id)
-        sess = recording_sessions.get(meeting_id, {})
-        return {
-            "room": meeting_id,
-            "connected": bool(rm and rm.connection_state == livekit_rtc.ConnectionState.CONN_CONNECTED),
-            "active_recordings": len(sess),
-            "recording_sessions": [
-                {"session_id": sid, "participant": s.participant_identity,
-                 "video_frames": s.video_frame_count, "audio_frames": s.audio_frame_count,
-                 "duration": time.time() - s.start_time}
-                for sid, s in sess.items()
-            ]
-        }
-    return {"active_rooms": list(rooms.keys())}
+    try:
+        return await bot_pool.status(meeting_id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 @router.post("/recordingPath", response_model=List[Dict[str, str]])
 async def recording_paths(req: VideoPathsRequest, username: str = Depends(get_current_user)):
     print(req.meeting_id)
     try:
-        recs = fetch_meeting_records(req.meeting_id)
+        recs = await fetch_meeting_records(req.meeting_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return [{"path": r["minutes_path"], "username": r["username"]} for r in recs]
+    paths = []
+    for r in recs:
+        item = {"path": r["minutes_path"], "username": r["username"]}
+        playlist = segment_dir(Path(r["minutes_path"])) / HLS_PLAYLIST
+        if playlist.exists():
+            item["playlist"] = playlist_url(req.meeting_id, playlist)
+        paths.append(item)
+    return paths
 
 @router.post("/convert_content")
-async def convert_content(req: ConvertContentRequest, username: str = Depends(get_current_user)):
+async def convert_content(req: ConvertContentRequest, request: Request, username: str = Depends(get_current_user)):
+    # 会议仍在进行：segments 为增量转写的实时结果
+    live = await bot_pool.is_active(req.meeting_id)
+    encoding = negotiate_encoding(request)
+    # ETag 由纪要版本号、查询条件和是否直播决定，未变化时不查询片段、不序列化
+    query = hashlib.sha1(req.model_dump_json().encode()).hexdigest()[:12]
+    revision = await get_minutes_revision(req.meeting_id)
+    if revision is not None:
+        etag = make_etag(req.meeting_id, revision, query, int(live), encoding=encoding)
+        if if_none_match(request, etag):
+            return not_modified(etag)
     try:
-        content = get_meeting_minutes(req.meeting_id)
+        content = await get_meeting_minutes(
+            req.meeting_id, start=req.start, end=req.end, speaker=req.speaker,
+            offset=req.offset, limit=req.limit,
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return content
+    if content is None:
+        return await json_response(None, encoding)
+    content["live"] = live
+    etag = make_etag(req.meeting_id, content["revision"], query, int(live), encoding=encoding)
+    return await json_response(content, encoding, etag)
 
 # —— 代理 /v1/chat/completions —— #
 @router.post("/v1/chat/completions")
-async def proxy_completions(req: ChatRequest):
-    async def event_stream():
-        async with httpx.AsyncClient() as client:
-            # 直接把 ChatRequest JSON 发给本地模型服务
-            async with client.stream(
-                "POST",
-                "http://localhost:7000/v1/chat/completions",
-                json=req.model_dump(),
-                timeout=60.0,
-            ) as resp:
-                if resp.status_code != 200:
-                    text = await resp.text()
-                    raise HTTPException(status_code=resp.status_code, detail=text)
-                # 按照 SSE（Server-Sent Events）标准，逐块转发
-                async for chunk in resp.aiter_bytes():
-                    yield chunk
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+async def proxy_completions(req: ChatRequest, username: str = Depends(get_current_user)):
+    # 直接把 ChatRequest JSON 发给本地模型服务
+    return await llm_proxy.response("/v1/chat/completions", req.model_dump(), username)
 
 
 # —— 代理 /v1/chat/summarization —— #
 @router.post("/v1/chat/summarization")
-async def proxy_summarization(req: SummaryRequest):
-    # 把 List[TranscriptSegment] 转成 OpenAI 风格 ChatRequest
-    payload = ChatRequest(
-        messages=[
-            Message(
-                role="user",
-                content=json.dumps([seg.model_dump() for seg in req.segments], ensure_ascii=False),
-            )
-        ],
-        segments=None,
-        video_summarization=req.video_summarization,
-        stream=True,
+async def proxy_summarization(req: SummaryRequest, username: str = Depends(get_current_user)):
+    segments = [seg.model_dump() for seg in req.segments]
+    on_complete = None
+    if req.meeting_id:
+        content_hash = summary_key(segments, req.video_summarization)
+        if not req.regenerate:
+            cached = await get_cached_summary(content_hash)
+            if cached is not None:
+                return StreamingResponse(replay(cached), media_type="text/event-stream", headers={"X-Summary-Cache": "hit"})
+        on_complete = functools.partial(store_summary, content_hash, req.meeting_id)
+    return await llm_proxy.response(
+        SUMMARY_PATH, summary_payload(segments, req.video_summarization), username, on_complete
     )
-    async def event_stream():
-        async with httpx.AsyncClient() as client:
-            async with client.stream(
-                "POST",
-                "http://localhost:7000/v1/chat/summarization",
-                json=payload.model_dump(),
-                timeout=60.0,
-            ) as resp:
-                if resp.status_code != 200:
-                    text = await resp.text()
-                    raise HTTPException(status_code=resp.status_code, detail=text)
-                async for chunk in resp.aiter_bytes():
-                    yield chunk
-
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.websocket("/ws/recordings")
-async def websocket_endpoint(ws: WebSocket):
-    await record_notificator.connect(ws)
+async def websocket_endpoint(ws: WebSocket, meeting_id: List[str] = Query(default=[])):
+    """
+    会后处理通知。连接时可用 ?meeting_id=... 订阅指定会议（可重复），不传则接收全部会议；
+    连接后也可发送 {"action": "subscribe" | "unsubscribe", "meeting_ids": [...]} 调整订阅。
+    """
+    await record_notificator.connect(ws, meeting_id)
     try:
         while True:
-            # 如果需要双向通信，可以在这里 await ws.receive_text()
-            await asyncio.sleep(1)
+            # 阻塞在接收上，客户端断开时立即得到 WebSocketDisconnect
+            raw = await ws.receive_text()
+            try:
+                msg = json.loads(raw)
+                action, ids = msg.get("action"), [str(i) for i in msg.get("meeting_ids") or []]
+            except (ValueError, AttributeError, TypeError):
+                continue
+            if action == "subscribe":
+                record_notificator.subscribe(ws, ids)
+            elif action == "unsubscribe":
+                record_notificator.unsubscribe(ws, ids)
     except WebSocketDisconnect:
+        pass
+    finally:
         record_notificator.disconnect(ws)
\ No newline at end of file
@@ -1,12 +1,12 @@
 
 
 import random
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timezone
 from static.user import get_user_timezone
-from static.meeting import add_meeting, delete_meeting, find_meeting_by_id, find_meetings_by_username, add_user_to_meeting, find_recorded_meetings_by_username
+from static.meeting import create_meeting_with_creator, delete_meeting, find_meeting_by_id, find_meetings_by_username, add_user_to_meeting, find_recorded_meetings_by_username, encode_cursor, decode_cursor, MEETING_PAGE_LIMIT
 from dataclasses import dataclass
 import pytz
 from utils.jwt_utils import get_current_user
@@ -45,6 +45,8 @@ class MeetingGetResponse(BaseModel):
 class MeetingListGetResponse(BaseModel):
     success: bool
     meetings: List[dict]
+    # 还有下一页时返回，作为下一次请求的 cursor 参数
+    next_cursor: Optional[str] = None
 
 @dataclass
 class Meeting:
@@ -61,7 +63,7 @@ router = APIRouter(prefix="/meeting", tags=["meeting"])
 @router.post("/create", response_model=MeetingCreateResponse)
 async def create_meeting_controller(data: MeetingCreateDto, username: str = Depends(get_current_user)):
     meeting_id = str(random.randint(100_000_000, 999_999_999))
-    tz = pytz.timezone(get_user_timezone(username))  # 用户绑定的时区
+    tz = pytz.timezone(await get_user_timezone(username))  # 用户绑定的时区
     now = datetime.now(tz).astimezone(pytz.utc)
 
     meeting = Meeting(
@@ -75,28 +77,27 @@ async def create_meeting_controller(data: MeetingCreateDto, username: str = Depe
         end_time=data.end_time,
     )
 
-    if add_meeting(meeting) == 0:
+    # 会议与创建者的参会关系在同一事务中写入
+    if not await create_meeting_with_creator(meeting, username, now):
         raise HTTPException(status_code=500, detail="会议创建失败")
-    if add_user_to_meeting(username, meeting_id, now) == 0:
-        raise HTTPException(status_code=500, detail="加入会议失败")
     return MeetingCreateResponse(meeting_id=meeting_id, create_time=now)
 
 @router.post("/delete", response_model=MeetingDeleteResponse)
 async def delete_meeting_controller(data: MeetingDeleteDto, username: str = Depends(get_current_user)):
-    success = delete_meeting(data.meeting_id) > 0
+    success = await delete_meeting(data.meeting_id) > 0
     return MeetingDeleteResponse(success=success)
 
 
 @router.post("/get", response_model=MeetingGetResponse)
 async def get_meeting_controller(data: MeetingGetDto, username: str = Depends(get_current_user)):
-    meeting = find_meeting_by_id(data.meeting_id)
+    meeting = await find_meeting_by_id(data.meeting_id)
     return MeetingGetResponse(success=bool(meeting), meeting=meeting)
 
 
 @router.post("/join", response_model=MeetingJoinResponse)
 async def join_meeting_controller(data: MeetingJoinDto, username: str = Depends(get_current_user)):
-    meeting = find_meeting_by_id(data.meeting_id)
-    tz = pytz.timezone(get_user_timezone(username))  # 用户绑定的时区
+    meeting = await find_meeting_by_id(data.meeting_id)
+    tz = pytz.timezone(await get_user_timezone(username))  # 用户绑定的时区
     
     if meeting is None:
         return MeetingJoinResponse(success=False, reason="Meeting not found")
@@ -104,17 +105,34 @@ async def join_meeting_controller(data: MeetingJoinDto, username: str = Depends(
         return MeetingJoinResponse(success=False, reason="Meeting has ended")
     if meeting.start_time > datetime.now(tz).astimezone(pytz.utc):
         return MeetingJoinResponse(success=False, reason="Meeting has not started")
-    inserted = add_user_to_meeting(username, data.meeting_id, datetime.now(tz).astimezone(pytz.utc))
+    inserted = await add_user_to_meeting(username, data.meeting_id, datetime.now(tz).astimezone(pytz.utc))
 
     return MeetingJoinResponse(success=inserted > 0)
 
 
+async def _meeting_page(find, username: str, limit: int, cursor: Optional[str]) -> MeetingListGetResponse:
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    # 多取一条用来判断是否还有下一页
+    meetings = await find(username, limit + 1, after)
+    next_cursor = encode_cursor(meetings[limit - 1]) if len(meetings) > limit else None
+    return MeetingListGetResponse(success=True, meetings=meetings[:limit], next_cursor=next_cursor)
+
+
 @router.get("/get_all", response_model=MeetingListGetResponse)
-async def get_all_meetings_controller(username: str = Depends(get_current_user)):
-    meetings = find_meetings_by_username(username)
-    return MeetingListGetResponse(success=True, meetings=meetings)
+async def get_all_meetings_controller(
+    limit: int = Query(MEETING_PAGE_LIMIT, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    username: str = Depends(get_current_user),
+):
+    return await _meeting_page(find_meetings_by_username, username, limit, cursor)
 
 @router.get("/get_all_with_records", response_model=MeetingListGetResponse)
-async def get_all_meetings_with_records_controller(username: str = Depends(get_current_user)):
-    meetings = find_recorded_meetings_by_username(username)
-    return MeetingListGetResponse(success=True, meetings=meetings)
\ No newline at end of file
+async def get_all_meetings_with_records_controller(
+    limit: int = Query(MEETING_PAGE_LIMIT, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    username: str = Depends(get_current_user),
+):
+    return await _meeting_page(find_recorded_meetings_by_username, username, limit, cursor)
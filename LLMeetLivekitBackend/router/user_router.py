@@ -1,10 +1,8 @@
 from fastapi import APIRouter, Depends, FastAPI, HTTPException
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
 from static.user import username_exists, email_exists, insert_user, get_user_by_username, save_user_timezone
 from utils.jwt_utils import get_current_user, jwt_manager
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.password_hasher import password_hasher
 
 class RegisterRequest(BaseModel):
     username: str
@@ -28,34 +26,30 @@ class TimezoneDto(BaseModel):
 class TimezoneResponse(BaseModel):
     success: bool
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
-
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=RegisterResponse)
-def register(req: RegisterRequest):
-    if username_exists(req.username):
+async def register(req: RegisterRequest):
+    if await username_exists(req.username):
         raise HTTPException(status_code=400, detail="用户名已存在")
-    if email_exists(req.email):
+    if await email_exists(req.email):
         raise HTTPException(status_code=400, detail="邮箱已注册")
 
-    success = insert_user(req.username, req.email, hash_password(req.password))
+    # bcrypt 计算耗时，放到专用的进程池中执行
+    hashed = await password_hasher.hash(req.password)
+    success = await insert_user(req.username, req.email, hashed)
     if not success:
         raise HTTPException(status_code=500, detail="用户注册失败")
     return RegisterResponse(success=True)
 
 
 @router.post("/login", response_model=LoginResponse)
-def login(req: LoginRequest):
-    row = get_user_by_username(req.username)
+async def login(req: LoginRequest):
+    row = await get_user_by_username(req.username)
     if not row:
         raise HTTPException(status_code=401, detail="用户名或密码错误")
     username, hashed_pw = row  # 去掉 user_id
-    if not verify_password(req.password, hashed_pw):
+    if not await password_hasher.verify(req.password, hashed_pw):
         raise HTTPException(status_code=401, detail="用户名或密码错误")
 
     token = jwt_manager.create_token(username=username)
@@ -67,5 +61,5 @@ async def set_user_timezone(
     username: str = Depends(get_current_user)
 ):
     print(f"User {username} set timezone to {data.timezone}")
-    success = save_user_timezone(username, data.timezone)
+    success = await save_user_timezone(username, data.timezone)
     return TimezoneResponse(success=success)
@@ -0,0 +1,30 @@
+from typing import Optional
+
+from fastapi import APIRouter, Query
+from pydantic import BaseModel
+
+from utils.livekit_bot import bot_status, start_bot, stop_bot
+
+# -----------------------------
+# Bot worker 内部接口：只监听本机地址，由 API worker 通过 BotPool 调用
+# -----------------------------
+class WorkerStartRequest(BaseModel):
+    meeting_id: str
+    username: str
+
+class WorkerStopRequest(BaseModel):
+    meeting_id: str
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+@router.post("/start_bot")
+async def internal_start_bot(req: WorkerStartRequest):
+    return await start_bot(req.meeting_id, req.username)
+
+@router.post("/stop_bot")
+async def internal_stop_bot(req: WorkerStopRequest):
+    return await stop_bot(req.meeting_id)
+
+@router.get("/status")
+async def internal_status(meeting_id: Optional[str] = Query(None)):
+    return bot_status(meeting_id)
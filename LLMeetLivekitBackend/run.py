@@ -1,6 +1,20 @@
+import asyncio
+import os
+import subprocess
+import sys
 from fastapi import FastAPI
 from static.database_connector import init_connection_pool, close_connection_pool
-from router import bot_router, meeting_router, user_router
+from router import bot_router, meeting_router, metrics_router, user_router
+from utils.livekit_bot import rooms
+from utils.meeting_pipeline import meeting_pipeline
+from utils.bot_pool import bot_pool
+from utils.llm_proxy import llm_proxy
+from utils.password_hasher import password_hasher
+from utils.bot_registry import API_WORKERS, BOT_WORKERS, BOT_WORKER_BASE_PORT
+from utils.record_notificator import record_notificator
+from utils.admission import admission
+from utils.recording_governor import recording_governor
+from utils.recording_catalog import recording_catalog
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
@@ -11,9 +25,37 @@ async def lifespan(app: FastAPI):
     # 🟢 启动时：初始化数据库连接池
     init_connection_pool()
     print("✅ Database connection pool initialized.")
+    # 🟢 模型服务代理共享的长连接池
+    llm_proxy.start()
+    # 🟢 bcrypt 专用进程池，随应用关闭释放
+    password_hasher.start()
+    relay = None
+    if bot_pool.distributed:
+        # 🟢 Bot 运行在独立的 worker 进程中：转发它们发布的会后通知
+        relay = asyncio.create_task(record_notificator.relay(bot_pool.store.events))
+    else:
+        # 🟢 启动会后处理流水线，并接管上次遗留的 temps/<meeting_id>
+        await meeting_pipeline.start(is_active=lambda meeting_id: meeting_id in rooms)
+        # 🟢 事件循环延迟是准入控制的依据之一
+        admission.loop_lag.start()
+        # 🟢 CPU 超出预算时统一降低录制帧率 / 分辨率
+        recording_governor.start()
+        # 🟢 录制目录与磁盘定期对账（多 worker 部署时由第一个 Bot worker 负责）
+        recording_catalog.start()
 
     yield  # ⬅️ 应用正常运行
 
+    if relay:
+        relay.cancel()
+        await bot_pool.close()
+    else:
+        await recording_catalog.stop()
+        await recording_governor.stop()
+        await admission.loop_lag.stop()
+        await meeting_pipeline.stop()
+
+    await llm_proxy.close()
+    password_hasher.close()
     # 🔴 关闭时：释放数据库连接池
     close_connection_pool()
     print("✅ Database connection pool closed.")
@@ -31,10 +73,31 @@ app.add_middleware(
 app.include_router(bot_router.router)
 app.include_router(meeting_router.router)
 app.include_router(user_router.router)
+app.include_router(metrics_router.router)
+
+
+def spawn_bot_workers(count: int):
+    """每个 Bot worker 是一个独立进程，监听 BOT_WORKER_BASE_PORT + i"""
+    procs = []
+    for i in range(count):
+        env = {**os.environ, "BOT_WORKER_ID": f"bot-{i}", "BOT_WORKER_PORT": str(BOT_WORKER_BASE_PORT + i)}
+        procs.append(subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), "bot_worker.py")], env=env))
+    return procs
 
 
 def main():
-    uvicorn.run("run:app", host="0.0.0.0", port=7700, reload=True)
+    if not BOT_WORKERS:
+        # 单进程开发模式：Bot 与 API 在同一进程中
+        uvicorn.run("run:app", host="0.0.0.0", port=7700, reload=True)
+        return
+    procs = spawn_bot_workers(BOT_WORKERS)
+    try:
+        uvicorn.run("run:app", host="0.0.0.0", port=7700, workers=API_WORKERS)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
 
 
 if __name__ == "__main__":
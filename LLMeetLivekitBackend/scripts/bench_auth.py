@@ -0,0 +1,105 @@
+"""
+认证热路径基准：带 token 的请求延迟（p50 / p99）和 bcrypt 登录吞吐（每秒每核登录数）。
+
+    python scripts/bench_auth.py                      # 进程内 ASGI 应用，不需要数据库
+    python scripts/bench_auth.py --url http://localhost:8000 --token <JWT> --path /meeting/get_all
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TOKEN_SECRET_KEY", "local-benchmark-secret-key-not-for-production")
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from utils.jwt_utils import get_current_user, jwt_manager, token_cache
+from utils.password_hasher import password_hasher
+
+
+def _percentile(samples, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def _latency(client: httpx.AsyncClient, path: str, token: str, requests: int, concurrency: int, before=None):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            if before:
+                before()
+            start = time.perf_counter()
+            resp = await client.get(path, headers={"Authorization": f"Bearer {token}"})
+            latencies.append(time.perf_counter() - start)
+            resp.raise_for_status()
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+
+def _report(name: str, latencies):
+    print(
+        f"{name:<28} n={len(latencies):<6} p50={_percentile(latencies, 0.5) * 1000:.3f}ms "
+        f"p99={_percentile(latencies, 0.99) * 1000:.3f}ms mean={statistics.mean(latencies) * 1000:.3f}ms"
+    )
+
+
+async def bench_requests(args):
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            _report(f"GET {args.path}", await _latency(client, args.path, args.token, args.requests, args.concurrency))
+        return
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping(username: str = Depends(get_current_user)):
+        return {"username": username}
+
+    token = jwt_manager.create_token("bench")
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # 每次请求前清空缓存，相当于改动前每次都解码验签
+        cold = await _latency(client, "/ping", token, args.requests, args.concurrency, before=token_cache.clear)
+        warm = await _latency(client, "/ping", token, args.requests, args.concurrency)
+    _report("auth request (no cache)", cold)
+    _report("auth request (cached token)", warm)
+
+
+async def bench_logins(args):
+    hashed = await password_hasher.hash("bench-password")
+    # 预热：确保所有子进程都已启动
+    await asyncio.gather(*(password_hasher.verify("bench-password", hashed) for _ in range(password_hasher.workers)))
+    start = time.perf_counter()
+    await asyncio.gather(*(password_hasher.verify("bench-password", hashed) for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+    rate = args.logins / elapsed
+    print(
+        f"{'bcrypt verify':<28} n={args.logins:<6} workers={password_hasher.workers} "
+        f"{rate:.1f} logins/s  {rate / password_hasher.workers:.1f} logins/s/core"
+    )
+    password_hasher.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--url", help="压测已运行的服务，而不是进程内应用")
+    parser.add_argument("--token", help="--url 模式下使用的 JWT")
+    parser.add_argument("--path", default="/meeting/get_all")
+    args = parser.parse_args()
+    if args.url and not args.token:
+        parser.error("--url 需要同时提供 --token")
+    await bench_requests(args)
+    if args.logins and not args.url:
+        await bench_logins(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
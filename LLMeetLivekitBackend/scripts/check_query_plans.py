@@ -0,0 +1,55 @@
+"""
+检查会议列表分页查询的执行计划，出现全表扫描（type=ALL）、全索引扫描（type=index）、
+filesort 或临时表（排序没有走索引顺序，每页都要读出并排序该用户全部会议）时以非零状态退出。
+需要在数据量接近生产的库上运行，表太小时优化器会直接选择全表扫描：
+
+    python scripts/check_query_plans.py <username>
+"""
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from static.database_connector import close_connection_pool, get_connection, init_connection_pool
+from static.meeting import MEETING_PAGE_LIMIT, meetings_page_sql
+
+FULL_SCAN_TYPES = {"ALL", "index"}
+BAD_EXTRA = ("Using filesort", "Using temporary")
+
+
+def _queries(username: str):
+    # 游标取一个足够靠后的值，让计划与翻页时一致
+    after = (datetime.now(), "~")
+    for recorded in (False, True):
+        yield f"meetings recorded={recorded} first page", meetings_page_sql(recorded, False), (username, MEETING_PAGE_LIMIT)
+        yield f"meetings recorded={recorded} next page", meetings_page_sql(recorded, True), (username, after[0], after[0], after[1], MEETING_PAGE_LIMIT)
+
+
+def check(username: str) -> int:
+    failures = 0
+    with get_connection() as conn:
+        with conn.cursor(dictionary=True) as cur:
+            for name, sql, params in _queries(username):
+                cur.execute("EXPLAIN " + sql, params)
+                plan = cur.fetchall()
+                bad = [
+                    row for row in plan
+                    if row["type"] in FULL_SCAN_TYPES or any(x in (row["Extra"] or "") for x in BAD_EXTRA)
+                ]
+                print(f"{'FAIL' if bad else 'ok  '} {name}")
+                for row in plan:
+                    print(f"     {row['table']:<12} type={row['type']:<8} key={row['key']} rows={row['rows']} {row['Extra'] or ''}")
+                failures += bool(bad)
+    return failures
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(2)
+    init_connection_pool()
+    try:
+        sys.exit(1 if check(sys.argv[1]) else 0)
+    finally:
+        close_connection_pool()
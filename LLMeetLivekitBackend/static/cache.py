@@ -0,0 +1,227 @@
+import functools
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from loguru import logger
+
+from utils.metrics import metrics
+from .database_connector import async_db
+
+try:
+    import redis
+except ImportError:  # Redis 为可选依赖，默认使用进程内缓存
+    redis = None
+
+# 设置后所有 worker 共享同一份缓存（失效也随之同步），否则每个进程各自缓存
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+# 多进程部署（多个 API worker，或 Bot 在独立进程中写入会议记录）时，进程内缓存的失效只在写入的进程生效，
+# 其他进程最多要等到条目过期才能看到修改；未配置 Redis 时把这类缓存的 TTL 压到几秒
+MULTI_PROCESS = int(os.getenv("API_WORKERS", "1")) > 1 or int(os.getenv("BOT_WORKERS", "0")) > 0
+LOCAL_CACHE_MAX_TTL = float(os.getenv("LOCAL_CACHE_MAX_TTL", "5"))
+
+CACHE_HITS = metrics.counter("llmeet_cache_hits_total", "缓存命中次数", ["cache"])
+CACHE_MISSES = metrics.counter("llmeet_cache_misses_total", "缓存未命中次数", ["cache"])
+CACHE_EVICTIONS = metrics.counter("llmeet_cache_evictions_total", "因容量上限被淘汰的条目数", ["cache"])
+
+_MISSING = object()
+# Redis 中失效代数键的存活时间，远大于一次读穿加载的耗时即可
+GENERATION_TTL = 86400
+
+
+class TTLCache:
+    """
+    线程安全的 LRU + TTL 缓存：条目过期或超出容量时淘汰最久未使用的。
+    数据访问函数在数据库线程中写入后调用 invalidate，读路径在事件循环中查询。
+    每次 invalidate 递增版本号并记下该键的失效版本，读穿加载开始前取的 token
+    早于失效版本时，set 丢弃加载结果，失效前读到的旧值不会再被写回。
+    """
+
+    # 操作都在内存中完成，可以直接在事件循环中调用
+    blocking = False
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        # 最近失效的键及其失效版本，超出容量时淘汰最早的，并把其版本记入 _floor（保守地视为所有键都在那时失效）
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._floor = 0
+
+    def lookup(self, key: Hashable) -> Tuple[Any, int]:
+        """读穿缓存使用：返回 (值或 _MISSING, token)，token 交给加载完成后的 set"""
+        with self._lock:
+            token = self._version
+        return self.get(key), token
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, token: Optional[int] = None):
+        # ttl 可按条目指定（如 token 只缓存到其过期时间）；给出 token 时，加载期间该键已失效则不写入
+        with self._lock:
+            if token is not None and self._invalidated.get(key, self._floor) > token:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.inc(cache=self.name)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+            self._version += 1
+            self._invalidated[key] = self._version
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > self.maxsize:
+                _, version = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, version)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._version += 1
+            self._invalidated.clear()
+            self._floor = self._version
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisTTLCache:
+    """
+    与 TTLCache 接口相同，数据存放在 Redis 中，过期和淘汰交给 Redis（maxmemory-policy）。
+    每个键另有一个失效代数键，invalidate 时递增；set 在 Lua 脚本中比对代数，
+    加载期间被任一进程失效过的值不会写回。
+    """
+
+    # 每次调用都是一次网络往返，异步代码中放到数据库线程池执行
+    blocking = True
+
+    _SET_IF_FRESH = """
+        if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+            return 0
+        end
+        redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        return 1
+    """
+
+    def __init__(self, name: str, url: str, maxsize: int = 1024, ttl: float = 60.0):
+        if redis is None:
+            raise RuntimeError("CACHE_REDIS_URL 已设置，但未安装 redis 包")
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._r = redis.Redis.from_url(url)
+        self._prefix = f"llmeet:cache:{name}:"
+        self._gen_prefix = f"llmeet:cache-gen:{name}:"
+        self._set_if_fresh = self._r.register_script(self._SET_IF_FRESH)
+
+    def _key(self, key: Hashable) -> str:
+        return self._prefix + repr(key)
+
+    def _gen_key(self, key: Hashable) -> str:
+        return self._gen_prefix + repr(key)
+
+    def get(self, key: Hashable) -> Any:
+        raw = self._r.get(self._key(key))
+        # 缓存内容只由本服务写入
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def lookup(self, key: Hashable) -> Tuple[Any, str]:
+        # 值和失效代数一次往返取回
+        raw, gen = self._r.mget(self._key(key), self._gen_key(key))
+        return (_MISSING if raw is None else pickle.loads(raw)), (gen or b"").decode()
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, token: Optional[str] = None):
+        ex = max(1, int(self.ttl if ttl is None else ttl))
+        if token is None:
+            self._r.set(self._key(key), pickle.dumps(value), ex=ex)
+        else:
+            self._set_if_fresh(keys=[self._key(key), self._gen_key(key)], args=[token, pickle.dumps(value), ex])
+
+    def invalidate(self, key: Hashable):
+        with self._r.pipeline() as pipe:
+            pipe.delete(self._key(key))
+            pipe.incr(self._gen_key(key))
+            pipe.expire(self._gen_key(key), GENERATION_TTL)
+            pipe.execute()
+
+    def clear(self):
+        for key in self._r.scan_iter(self._prefix + "*"):
+            self._r.delete(key)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._r.scan_iter(self._prefix + "*"))
+
+
+caches: Dict[str, Any] = {}
+
+
+def make_cache(name: str, maxsize: int = 1024, ttl: float = 60.0, local: bool = False):
+    """local 为 True 时总是使用进程内缓存（不需要跨进程共享、或不宜写入 Redis 的数据）"""
+    if CACHE_REDIS_URL and not local:
+        cache = RedisTTLCache(name, CACHE_REDIS_URL, maxsize, ttl)
+    else:
+        if MULTI_PROCESS and not local and ttl > LOCAL_CACHE_MAX_TTL:
+            logger.warning(f"[Cache] 多进程部署未配置 CACHE_REDIS_URL，{name} 缓存 TTL 由 {ttl:g}s 降为 {LOCAL_CACHE_MAX_TTL:g}s")
+            ttl = LOCAL_CACHE_MAX_TTL
+        cache = TTLCache(name, maxsize, ttl)
+    caches[name] = cache
+    return cache
+
+
+def _inline(fn):
+    async def call(*args, **kwargs):
+        return fn(*args, **kwargs)
+    return call
+
+
+def cached(cache, key: Optional[Callable[..., Hashable]] = None, cache_if: Callable[[Any], bool] = lambda v: v is not None):
+    """
+    读穿缓存装饰器，用于 async_db 包装后的协程：命中时不再占用数据库线程。
+    key 默认取第一个位置参数；cache_if 决定结果是否写入缓存（失败返回的空值不缓存）。
+    加载期间该键被 invalidate 时结果照常返回，但不写入缓存。
+    """
+    wrap = async_db if cache.blocking else _inline
+    lookup, store = wrap(cache.lookup), wrap(cache.set)
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            k = key(*args, **kwargs) if key else args[0]
+            value, token = await lookup(k)
+            if value is not _MISSING:
+                CACHE_HITS.inc(cache=cache.name)
+                return value
+            CACHE_MISSES.inc(cache=cache.name)
+            value = await fn(*args, **kwargs)
+            if cache_if(value):
+                await store(k, value, None, token)
+            return value
+        return wrapper
+    return decorator
+
+
+@metrics.collector
+def _collect_cache_metrics():
+    # Redis 缓存的条目数需要扫描，只统计进程内缓存
+    yield "llmeet_cache_entries", "gauge", "缓存中的条目数", [
+        ({"cache": name}, len(c)) for name, c in caches.items() if isinstance(c, TTLCache)
+    ]
@@ -1,10 +1,17 @@
 import mysql.connector
 from mysql.connector import pooling
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+import asyncio
+import functools
 import loguru
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from utils.metrics import metrics
+
 load_dotenv()
 # 初始化日志
 logger = loguru.logger
@@ -20,20 +27,39 @@ dbconfig = {
     "raise_on_warnings": True,
 }
 
+# 连接池大小（mysql.connector 上限 32）；数据库线程池与之等大，线程永远拿得到连接
+DB_POOL_SIZE = min(int(os.environ.get("DB_POOL_SIZE", "10")), pooling.CNX_POOL_MAXSIZE)
+
+DB_POOL_WAIT_SECONDS = metrics.histogram("llmeet_db_pool_wait_seconds", "数据库调用等待空闲连接（线程）的时间")
+DB_CHECKOUT_SECONDS = metrics.histogram("llmeet_db_checkout_seconds", "连接从取出到归还的占用时间")
+DB_ERRORS = metrics.counter("llmeet_db_connection_errors_total", "获取数据库连接失败的次数")
+
 # 初始化连接池
 connection_pool = None
+db_executor = None
+_db_stats = {"queued": 0, "in_use": 0}
+_db_stats_lock = threading.Lock()
+
+
+def _bump(key: str, n: int):
+    with _db_stats_lock:
+        _db_stats[key] += n
 
 
 def init_connection_pool():
-    global connection_pool
+    global connection_pool, db_executor
     connection_pool = pooling.MySQLConnectionPool(
-        pool_name="llmeet_pool", pool_size=5, **dbconfig
+        pool_name="llmeet_pool", pool_size=DB_POOL_SIZE, **dbconfig
     )
+    db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
     logger.debug(f"连接池初始化完成，大小: {connection_pool.pool_size}")
 
 
 def close_connection_pool():
-    global connection_pool
+    global connection_pool, db_executor
+    if db_executor:
+        db_executor.shutdown(wait=True)
+        db_executor = None
     if connection_pool:
         connection_pool = None
         logger.debug("连接池已关闭。")
@@ -42,12 +68,66 @@ def close_connection_pool():
 @contextmanager
 def get_connection():
     conn = None
+    checked_out = None
     try:
         conn = connection_pool.get_connection()
+        checked_out = time.perf_counter()
+        _bump("in_use", 1)
         yield conn
     except mysql.connector.Error as err:
+        if checked_out is None:
+            DB_ERRORS.inc()
         logger.debug(f"获取连接失败: {err}")
         raise
     finally:
         if conn:
             conn.close()
+            _bump("in_use", -1)
+            DB_CHECKOUT_SECONDS.observe(time.perf_counter() - checked_out)
+
+
+@contextmanager
+def transaction(dictionary: bool = False):
+    """
+    工作单元：一个连接、一个事务，块内的所有语句一起提交，出错整体回滚。
+        with transaction() as cur:
+            cur.execute(...)
+            cur.executemany(...)
+    """
+    with get_connection() as conn:
+        conn.start_transaction()
+        cursor = conn.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def async_db(fn):
+    """
+    把阻塞的数据访问函数包装为协程：在与连接池等大的专用线程池中执行，
+    不阻塞事件循环，也不会因并发过高耗尽连接池。原函数可通过 __wrapped__ 同步调用。
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        submitted = time.perf_counter()
+        _bump("queued", 1)
+
+        def call():
+            _bump("queued", -1)
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - submitted)
+            return fn(*args, **kwargs)
+
+        return await asyncio.get_running_loop().run_in_executor(db_executor, call)
+    return wrapper
+
+
+@metrics.collector
+def _collect_db_metrics():
+    yield "llmeet_db_pool_size", "gauge", "数据库连接池大小", [({}, DB_POOL_SIZE)]
+    yield "llmeet_db_connections_in_use", "gauge", "正在使用的数据库连接", [({}, _db_stats["in_use"])]
+    yield "llmeet_db_calls_queued", "gauge", "等待数据库线程的调用数", [({}, _db_stats["queued"])]
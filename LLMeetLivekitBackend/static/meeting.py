@@ -1,8 +1,15 @@
+import base64
 from datetime import datetime
 import json
-from typing import Any, Dict, List, Optional
-from .database_connector import get_connection, logger
+from typing import Any, Dict, List, Optional, Tuple
+from .database_connector import async_db, get_connection, logger, transaction
+from .cache import cached, make_cache
 
+meeting_cache = make_cache("meeting", maxsize=2048, ttl=60)
+# 会议的录制文件列表，只在会后流水线登记时变化
+records_cache = make_cache("meeting_records", maxsize=2048, ttl=300)
+
+@async_db
 def add_meeting(meeting) -> int:
     try:
         with get_connection() as conn:
@@ -28,33 +35,41 @@ def add_meeting(meeting) -> int:
         return 0
 
 
+@async_db
 def add_user_to_meeting(username: str, meeting_id: str, joined_at: datetime) -> int:
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    "INSERT INTO user_meeting (username, meeting_id, joined_at) VALUES (%s, %s, %s)",
-                    (username, meeting_id, joined_at)
-                )
+                # 会议开始时间冗余到 user_meeting，会议列表分页只需走 user_meeting 的索引
+                cur.execute('''
+                    INSERT INTO user_meeting (username, meeting_id, joined_at, meeting_start)
+                    SELECT %s, meeting_id, %s, start_time FROM meeting WHERE meeting_id = %s
+                ''', (username, joined_at, meeting_id))
+                inserted = cur.rowcount
             conn.commit()
-        return 1
+        return 1 if inserted else 0
     except Exception as e:
         logger.error(f"add_user_to_meeting error: {e}")
         return 0
 
 
+@async_db
 def delete_meeting(meeting_id: str) -> int:
     try:
         with get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("DELETE FROM meeting WHERE meeting_id = %s", (meeting_id,))
             conn.commit()
+        meeting_cache.invalidate(meeting_id)
+        records_cache.invalidate(meeting_id)
         return 1
     except Exception as e:
         logger.error(f"delete_meeting error: {e}")
         return 0
 
 
+@cached(meeting_cache)
+@async_db
 def find_meeting_by_id(meeting_id: str) -> Optional[Dict[str, Any]]:
     try:
         with get_connection() as conn:
@@ -70,41 +85,179 @@ def find_meeting_by_id(meeting_id: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def find_meetings_by_username(username: str) -> List[Dict[str, Any]]:
+# 会议列表按 (start_time, meeting_id) 倒序做游标分页，依赖 migrations/001 中 user_meeting 的排序索引
+MEETING_PAGE_LIMIT = 500
+
+
+def meetings_page_sql(recorded: bool = False, after: bool = False) -> str:
+    """
+    用户会议列表的分页查询。过滤和排序都在 user_meeting 的 (username, meeting_start, meeting_id)
+    索引上完成，倒序读够 limit 行即停止，不需要 filesort；meeting 只按主键取这一页。
+    recorded 时只保留该用户有录制记录的会议（EXISTS 半连接，命中第一条记录即停止，不再 DISTINCT 去重）；
+    after 时从游标之后继续。参数依次为 username、[游标 start_time、start_time、meeting_id]、limit。
+    """
+    sql = '''
+        SELECT m.* FROM user_meeting um
+        JOIN meeting m ON m.meeting_id = um.meeting_id
+        WHERE um.username = %s
+    '''
+    if recorded:
+        sql += '''
+        AND EXISTS (SELECT 1 FROM records r WHERE r.user_meeting_id = um.user_meeting_id)
+        '''
+    if after:
+        # 展开写法而不是行构造器比较，保证优化器能走范围扫描
+        sql += '''
+        AND (um.meeting_start < %s OR (um.meeting_start = %s AND um.meeting_id < %s))
+        '''
+    return sql + '''
+        ORDER BY um.meeting_start DESC, um.meeting_id DESC
+        LIMIT %s
+    '''
+
+
+def encode_cursor(meeting: Dict[str, Any]) -> str:
+    """以一页最后一条会议的排序键生成不透明游标"""
+    raw = json.dumps([meeting["start_time"].isoformat(), meeting["meeting_id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析 encode_cursor 生成的游标，格式不对时抛出 ValueError"""
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute('''
-                    SELECT m.* FROM meeting m
-                    JOIN user_meeting um ON m.meeting_id = um.meeting_id
-                    WHERE um.username = %s
-                ''', (username,))
-                rows = cur.fetchall()
-                keys = [desc[0] for desc in cur.description]
-                return [dict(zip(keys, row)) for row in rows]
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        start_time, meeting_id = json.loads(raw)
+        return datetime.fromisoformat(start_time), str(meeting_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def _find_meetings_page(username: str, recorded: bool, limit: int, after: Optional[Tuple[datetime, str]]) -> List[Dict[str, Any]]:
+    params: tuple = (username,)
+    if after:
+        params += (after[0], after[0], after[1])
+    with get_connection() as conn:
+        with conn.cursor(dictionary=True) as cur:
+            cur.execute(meetings_page_sql(recorded, after is not None), params + (limit,))
+            return cur.fetchall()
+
+
+@async_db
+def find_meetings_by_username(
+    username: str,
+    limit: int = MEETING_PAGE_LIMIT,
+    after: Optional[Tuple[datetime, str]] = None,
+) -> List[Dict[str, Any]]:
+    try:
+        return _find_meetings_page(username, False, limit, after)
     except Exception as e:
         logger.error(f"find_meetings_by_username error: {e}")   
         return []
 
-def find_recorded_meetings_by_username(username: str) -> List[Dict[str, Any]]:
+@async_db
+def find_recorded_meetings_by_username(
+    username: str,
+    limit: int = MEETING_PAGE_LIMIT,
+    after: Optional[Tuple[datetime, str]] = None,
+) -> List[Dict[str, Any]]:
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute('''
-                    SELECT DISTINCT m.*
-                    FROM meeting m
-                    JOIN user_meeting um ON m.meeting_id = um.meeting_id
-                    JOIN records r ON r.user_meeting_id = um.user_meeting_id
-                    WHERE um.username = %s
-                ''', (username,))
-                rows = cur.fetchall()
-                keys = [desc[0] for desc in cur.description]
-                return [dict(zip(keys, row)) for row in rows]
+        return _find_meetings_page(username, True, limit, after)
     except Exception as e:
         logger.error(f"find_recorded_meetings_by_username error: {e}")
         return []
 
 
+@async_db
+def create_meeting_with_creator(meeting, username: str, joined_at: datetime) -> bool:
+    """
+    在同一个事务中创建会议并把创建者加入会议，避免只写入一半的状态。
+    """
+    try:
+        with transaction() as cur:
+            cur.execute('''
+                INSERT INTO meeting (meeting_id, title, description, creator_id, created_at, status, start_time, end_time)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ''', (
+                meeting.meeting_id,
+                meeting.title,
+                meeting.description,
+                meeting.creator_id,
+                meeting.created_at,
+                meeting.status,
+                meeting.start_time,
+                meeting.end_time
+            ))
+            cur.execute(
+                "INSERT INTO user_meeting (username, meeting_id, joined_at, meeting_start) VALUES (%s, %s, %s, %s)",
+                (username, meeting.meeting_id, joined_at, meeting.start_time)
+            )
+        return True
+    except Exception as e:
+        logger.error(f"create_meeting_with_creator error: {e}")
+        return False
+
+
+def _insert_records(cursor, records: List[Dict[str, str]]) -> List[str]:
+    """
+    批量登记录制文件：每个会议只查一次所有参会者的 user_meeting_id，再一次性插入。
+    records 中每项包含 meeting_id / username / path，返回成功登记的 path 列表。
+    """
+    by_meeting: Dict[str, List[Dict[str, str]]] = {}
+    for rec in records:
+        by_meeting.setdefault(rec["meeting_id"], []).append(rec)
+    rows, registered = [], []
+    for meeting_id, recs in by_meeting.items():
+        usernames = sorted({r["username"] for r in recs})
+        placeholders = ", ".join(["%s"] * len(usernames))
+        cursor.execute(
+            f"""
+            SELECT username, user_meeting_id FROM user_meeting
+            WHERE meeting_id = %s AND username IN ({placeholders})
+            """,
+            (meeting_id, *usernames)
+        )
+        # 同一用户多次加入时取任意一条关联即可
+        ids = {row["username"]: row["user_meeting_id"] for row in cursor.fetchall()}
+        for rec in recs:
+            if rec["username"] not in ids:
+                logger.error(f"[DB] 用户 {rec['username']} 无权限或未加入会议 {meeting_id}")
+                continue
+            rows.append((ids[rec["username"]], rec["path"]))
+            registered.append(rec["path"])
+    if rows:
+        # mysql.connector 会把 INSERT 的 executemany 改写为一条多行 VALUES 语句
+        cursor.executemany(
+            "INSERT INTO records (user_meeting_id, minutes_path) VALUES (%s, %s)",
+            rows
+        )
+    return registered
+
+
+def _invalidate_records(records: List[Dict[str, str]]):
+    for meeting_id in {rec["meeting_id"] for rec in records}:
+        records_cache.invalidate(meeting_id)
+
+
+@async_db
+def insert_meeting_records(records: List[Dict[str, str]]) -> Optional[List[str]]:
+    """
+    在一个事务中登记一场会议的全部录制文件。
+    成功返回已登记的 path 列表（未加入会议的用户的文件会被跳过），数据库错误时返回 None。
+    """
+    if not records:
+        return []
+    try:
+        with transaction(dictionary=True) as cursor:
+            registered = _insert_records(cursor, records)
+        _invalidate_records(records)
+        logger.info(f"[DB] 批量插入会议录制成功: {len(registered)}/{len(records)} 个文件")
+        return registered
+    except Exception as e:
+        logger.error(f"[DB] 批量插入会议录制失败: {e}")
+        return None
+
+
+@async_db
 def insert_meeting_record(
     meeting_id: str,
     username: str,
@@ -119,45 +272,23 @@ def insert_meeting_record(
     :return: 成功返回 True，失败返回 False
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor(dictionary=True) as cursor:
-                # 查找 user_meeting_id
-                cursor.execute(
-                    """
-                    SELECT user_meeting_id FROM user_meeting
-                    WHERE meeting_id = %s AND username = %s
-                    """,
-                    (meeting_id, username)
-                )
-                result = cursor.fetchone()
-                if not result:
-                    logger.error(f"[DB] 用户 {username} 无权限或未加入会议 {meeting_id}")
-                    return False
-
-                user_meeting_id = result['user_meeting_id']
-
-                # 插入新的录制记录
-                cursor.execute(
-                    """
-                    INSERT INTO records (user_meeting_id, minutes_path)
-                    VALUES (%s, %s)
-                    """,
-                    (user_meeting_id, minute_record_path)
-                )
-
-                conn.commit()
-                logger.info(
-                    f"[DB] 插入会议录制成功: meeting_id={meeting_id}, username={username}, path={minute_record_path}"
-                )
-                return True
-
+        with transaction(dictionary=True) as cursor:
+            registered = _insert_records(cursor, [
+                {"meeting_id": meeting_id, "username": username, "path": minute_record_path}
+            ])
+        records_cache.invalidate(meeting_id)
+        if registered:
+            logger.info(
+                f"[DB] 插入会议录制成功: meeting_id={meeting_id}, username={username}, path={minute_record_path}"
+            )
+        return bool(registered)
     except Exception as e:
         logger.error(f"[DB] 插入会议录制失败: {e}")
-        if conn:
-            conn.rollback()
         return False
 
 
+@cached(records_cache, cache_if=bool)
+@async_db
 def fetch_meeting_records(meeting_id: str) -> List[Dict[str, Any]]:
     """
     根据 meeting_id 查询与该会议关联的所有录制记录（记录文件路径和用户名）。
@@ -184,51 +315,189 @@ def fetch_meeting_records(meeting_id: str) -> List[Dict[str, Any]]:
         logger.error(f"fetch_meeting_records error: {e}")
         return []
     
-def insert_meeting_minutes(meeting_id: str, segments: Dict[str, Any], language: str = "en", video_summarization: str = "") -> bool:
+def _insert_segments(cursor, meeting_id: str, segments: List[Dict[str, Any]]):
+    if segments:
+        cursor.executemany(
+            "INSERT INTO minute_segments (meeting_id, `start`, `end`, speaker, text) VALUES (%s, %s, %s, %s, %s)",
+            [(meeting_id, seg["start"], seg["end"], seg.get("speaker"), seg.get("text", "")) for seg in segments]
+        )
+
+
+@async_db
+def insert_meeting_minutes(meeting_id: str, segments: List[Dict[str, Any]], language: str = "en", video_summarization: str = "") -> bool:
     """
-    插入或更新会议纪要到 minutes 表，包含 segments 和 language 字段。
+    插入或更新会议纪要：minutes 表只保存语言和画面总结，转写片段逐条写入 minute_segments，
+    已有的片段整体替换。
     """
     try:
-        minutes_json = json.dumps(segments, ensure_ascii=False)
-
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO minutes (meeting_id, segments, language, video_summarization)
-                    VALUES (%s, %s, %s, %s) AS new
-                    ON DUPLICATE KEY UPDATE 
-                        segments = new.segments,
-                        language = new.language,
-                        video_summarization = new.video_summarization
-                """, (meeting_id, minutes_json, language, video_summarization))
-                conn.commit()
+        with transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO minutes (meeting_id, language, video_summarization)
+                VALUES (%s, %s, %s) AS new
+                ON DUPLICATE KEY UPDATE 
+                    language = new.language,
+                    video_summarization = new.video_summarization,
+                    revision = minutes.revision + 1
+            """, (meeting_id, language, video_summarization))
+            cursor.execute("DELETE FROM minute_segments WHERE meeting_id = %s", (meeting_id,))
+            _insert_segments(cursor, meeting_id, segments)
         return True
     except Exception as e:
         logger.error(f"insert_meeting_minutes error: {e}")
         return False
 
-def get_meeting_minutes(meeting_id: str) -> Optional[Dict[str, Any]]:
+@async_db
+def append_meeting_minutes(meeting_id: str, segments: List[Dict[str, Any]], language: Optional[str] = None) -> bool:
+    """
+    会议进行中追加增量转写片段：只插入新的片段行，不读取也不改写已有内容。
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO minutes (meeting_id, language)
+                VALUES (%s, COALESCE(%s, 'en')) AS new
+                ON DUPLICATE KEY UPDATE
+                    language = COALESCE(%s, minutes.language),
+                    revision = minutes.revision + 1
+            """, (meeting_id, language, language))
+            _insert_segments(cursor, meeting_id, segments)
+        return True
+    except Exception as e:
+        logger.error(f"append_meeting_minutes error: {e}")
+        return False
+
+@async_db
+def update_minutes_summary(meeting_id: str, video_summarization: str, language: Optional[str] = None) -> bool:
     """
-    查询会议纪要，返回一个包含 segments、created_at、language, video_summarization 的字典。
+    会后只写入画面总结（以及最终识别的语言），保留会议中增量写入的片段。
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO minutes (meeting_id, language, video_summarization)
+                VALUES (%s, COALESCE(%s, 'en'), %s) AS new
+                ON DUPLICATE KEY UPDATE
+                    language = COALESCE(%s, minutes.language),
+                    video_summarization = new.video_summarization,
+                    revision = minutes.revision + 1
+            """, (meeting_id, language, video_summarization, language))
+        return True
+    except Exception as e:
+        logger.error(f"update_minutes_summary error: {e}")
+        return False
+
+@async_db
+def get_minutes_revision(meeting_id: str) -> Optional[int]:
+    """
+    只查询纪要的版本号，用于条件请求；没有纪要时返回 None。
     """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT revision FROM minutes WHERE meeting_id = %s", (meeting_id,))
+                row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"get_minutes_revision error: {e}")
+        return None
+
+@async_db
+def get_meeting_minutes(
+    meeting_id: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    speaker: Optional[str] = None,
+    offset: int = 0,
+    limit: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    查询会议纪要，返回一个包含 segments、total、created_at、language, video_summarization、revision 的字典。
+    start / end 取与该时间窗（秒）有重叠的片段，speaker 只取该发言人的片段；
+    offset / limit 在筛选结果上按时间顺序分页，total 为筛选后的片段总数。
+    """
+    where, params = ["meeting_id = %s"], [meeting_id]
+    if start is not None:
+        where.append("`end` > %s")
+        params.append(start)
+    if end is not None:
+        where.append("`start` < %s")
+        params.append(end)
+    if speaker is not None:
+        where.append("speaker = %s")
+        params.append(speaker)
+    condition = " AND ".join(where)
     try:
         with get_connection() as conn:
             with conn.cursor(dictionary=True) as cursor:
                 cursor.execute("""
-                    SELECT segments, created_at, language, video_summarization
+                    SELECT created_at, language, video_summarization, revision
                     FROM minutes
                     WHERE meeting_id = %s
                     LIMIT 1
                 """, (meeting_id,))
                 row = cursor.fetchone()
-        if not row or not row["segments"]:
-            return None
+                if not row:
+                    return None
+                page = ""
+                if limit is not None:
+                    page = " LIMIT %s OFFSET %s"
+                    cursor.execute(f"SELECT COUNT(*) AS total FROM minute_segments WHERE {condition}", params)
+                    total = cursor.fetchone()["total"]
+                cursor.execute(f"""
+                    SELECT `start`, `end`, COALESCE(speaker, '') AS speaker, text
+                    FROM minute_segments
+                    WHERE {condition}
+                    ORDER BY `start`, segment_id
+                    {page}
+                """, params + ([limit, offset] if limit is not None else []))
+                segments = cursor.fetchall()
+        if limit is None:
+            # 没有片段（例如会议中无人发言）时仍返回画面总结
+            total = len(segments)
         return {
-            "segments": json.loads(row["segments"]),
+            "segments": segments,
+            "total": total,
             "created_at": row["created_at"],
             "language": row["language"],
-            "video_summarization": row["video_summarization"]
+            "video_summarization": row["video_summarization"],
+            "revision": row["revision"]
         }
     except Exception as e:
         logger.error(f"get_meeting_minutes error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+@async_db
+def get_cached_summary(content_hash: str) -> Optional[str]:
+    """
+    按 summary_key（片段 + 画面总结 + 模型版本的哈希）查询已生成的会议总结。
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT summary FROM minute_summaries WHERE content_hash = %s", (content_hash,))
+                row = cursor.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error(f"get_cached_summary error: {e}")
+        return None
+
+@async_db
+def save_summary(content_hash: str, meeting_id: str, model_version: str, summary: str) -> bool:
+    """
+    保存生成的会议总结，同一内容重新生成时覆盖。
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO minute_summaries (content_hash, meeting_id, model_version, summary)
+                    VALUES (%s, %s, %s, %s) AS new
+                    ON DUPLICATE KEY UPDATE
+                        summary = new.summary,
+                        created_at = CURRENT_TIMESTAMP
+                """, (content_hash, meeting_id, model_version, summary))
+                conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"save_summary error: {e}")
+        return False
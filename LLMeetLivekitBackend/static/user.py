@@ -1,8 +1,13 @@
-from .database_connector import get_connection, logger
+from .database_connector import async_db, get_connection, logger
+from .cache import cached, make_cache
 from datetime import datetime, timezone
 from typing import Optional, Tuple
 
+# 每次创建 / 加入会议都要查询时区，几乎不变
+timezone_cache = make_cache("user_timezone", maxsize=4096, ttl=600)
 
+
+@async_db
 def username_exists(username: str) -> bool:
     try:
         with get_connection() as conn:
@@ -14,6 +19,7 @@ def username_exists(username: str) -> bool:
         return False
 
 
+@async_db
 def email_exists(email: str) -> bool:
     try:
         with get_connection() as conn:
@@ -25,6 +31,7 @@ def email_exists(email: str) -> bool:
         return False
 
 
+@async_db
 def insert_user(username: str, email: str, hashed_password: str) -> bool:
     try:
         with get_connection() as conn:
@@ -40,6 +47,7 @@ def insert_user(username: str, email: str, hashed_password: str) -> bool:
         return False
 
 
+@async_db
 def get_user_by_username(username: str) -> Optional[Tuple[int, str, str]]:
     try:
         with get_connection() as conn:
@@ -53,6 +61,7 @@ def get_user_by_username(username: str) -> Optional[Tuple[int, str, str]]:
         logger.error(f"get_user_by_username error: {e}")
         return None
 
+@async_db
 def save_user_timezone(username: str, timezone: str) -> bool:
     try:
         with get_connection() as conn:
@@ -62,11 +71,14 @@ def save_user_timezone(username: str, timezone: str) -> bool:
                     (timezone, username)
                 )
                 conn.commit()
+        timezone_cache.invalidate(username)
         return True
     except Exception as e:
         logger.error(f"save_user_timezone error: {e}")
         return False
     
+@cached(timezone_cache)
+@async_db
 def get_user_timezone(username: str) -> str:
     with get_connection() as conn:
         with conn.cursor(dictionary=True) as cursor:
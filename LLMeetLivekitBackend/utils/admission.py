@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from utils.encode_scheduler import encode_scheduler
+
+_CORES = os.cpu_count() or 2
+# 本进程的录制容量，默认按核数估算：每路 1080p 实时编码约占一个核
+MAX_ACTIVE_ROOMS = int(os.getenv("MAX_ACTIVE_ROOMS", str(_CORES)))
+MAX_VIDEO_TRACKS = int(os.getenv("MAX_VIDEO_TRACKS", str(_CORES)))
+MAX_ENCODE_QUEUE = int(os.getenv("MAX_ENCODE_QUEUE", str(encode_scheduler.max_concurrency)))
+# 事件循环延迟超过该值说明进程已饱和，新会议只录音频
+MAX_LOOP_LAG = float(os.getenv("MAX_LOOP_LAG", "0.25"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "8"))
+# 排队超过这么久的会议不再启动（会议多半已经结束）
+ADMISSION_QUEUE_TTL = float(os.getenv("ADMISSION_QUEUE_TTL", "600"))
+
+
+class LoopLagMonitor:
+    """周期性 sleep，测量实际唤醒时间比预期晚了多少，反映事件循环的拥塞程度"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            # 指数平滑，避免单次 GC 停顿触发降级
+            self.lag = 0.7 * self.lag + 0.3 * lag
+            self.max_lag = max(self.max_lag, lag)
+
+
+class AdmissionController:
+    """
+    Bot 准入控制：根据本进程的活跃会议数、正在录制的轨道数、收尾编码队列深度和事件循环延迟
+    决定新会议是正常录制、只录音频、排队等待还是拒绝。
+    会议数达到上限时排队，队列满则拒绝；视频相关的资源紧张时降级为只录音频。
+    """
+
+    def __init__(self):
+        self.loop_lag = LoopLagMonitor()
+        self.active_rooms: Dict[str, bool] = {}  # room -> audio_only
+        self.video_tracks = 0
+        self.audio_tracks = 0
+        self.rejected = 0
+        self._queue: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # room -> (username, queued_at)
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._queue)
+
+    @property
+    def tracks(self) -> int:
+        return self.video_tracks + self.audio_tracks
+
+    def video_pressure(self) -> Optional[str]:
+        """返回视频录制资源紧张的原因，没有压力时返回 None"""
+        if self.video_tracks >= MAX_VIDEO_TRACKS:
+            return "video_tracks"
+        if encode_scheduler.queue_depth >= MAX_ENCODE_QUEUE:
+            return "encode_queue"
+        if self.loop_lag.lag >= MAX_LOOP_LAG:
+            return "loop_lag"
+        return None
+
+    def admit(self, room: str, username: str) -> Dict[str, Any]:
+        """
+        返回 {"decision": "admit" | "audio_only" | "queued" | "rejected", ...}；
+        admit / audio_only 时调用方负责启动 Bot，并在结束时调用 release。
+        """
+        if room in self.active_rooms:
+            return {"decision": "audio_only" if self.active_rooms[room] else "admit"}
+        if room in self._queue:
+            return {"decision": "queued", "position": self.position(room)}
+        if len(self.active_rooms) >= MAX_ACTIVE_ROOMS:
+            if len(self._queue) >= ADMISSION_QUEUE_SIZE:
+                self.rejected += 1
+                logger.warning(f"[Admission] {room} 被拒绝：会议数 {len(self.active_rooms)} 已满且排队已满")
+                return {"decision": "rejected", "reason": "capacity"}
+            self._queue[room] = (username, time.time())
+            logger.info(f"[Admission] {room} 排队，位置 {self.position(room)}")
+            return {"decision": "queued", "position": self.position(room)}
+        return self._activate(room)
+
+    def _activate(self, room: str) -> Dict[str, Any]:
+        reason = self.video_pressure()
+        self.active_rooms[room] = reason is not None
+        if reason:
+            logger.warning(f"[Admission] {room} 降级为只录音频：{reason}")
+            return {"decision": "audio_only", "reason": reason}
+        return {"decision": "admit"}
+
+    def release(self, room: str):
+        self.active_rooms.pop(room, None)
+        self._queue.pop(room, None)
+
+    def pop_expired(self) -> List[str]:
+        """移出排队超时的会议并返回，调用方负责释放它们在 Bot 注册表中的归属"""
+        now = time.time()
+        expired = [room for room, (_, queued_at) in self._queue.items() if now - queued_at > ADMISSION_QUEUE_TTL]
+        for room in expired:
+            del self._queue[room]
+            logger.info(f"[Admission] {room} 排队超时，放弃启动")
+        return expired
+
+    def next_queued(self) -> Optional[Tuple[str, str, Dict[str, Any]]]:
+        """有空余名额时取出排在最前的会议并激活，返回 (room, username, 决定)；先调用 pop_expired 清掉超时的会议"""
+        if self._queue and len(self.active_rooms) < MAX_ACTIVE_ROOMS:
+            room, (username, _) = self._queue.popitem(last=False)
+            return room, username, self._activate(room)
+        return None
+
+    def position(self, room: str) -> Optional[int]:
+        for i, queued in enumerate(self._queue, start=1):
+            if queued == room:
+                return i
+        return None
+
+    def is_audio_only(self, room: str) -> bool:
+        return self.active_rooms.get(room, False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_rooms": len(self.active_rooms),
+            "max_active_rooms": MAX_ACTIVE_ROOMS,
+            "video_tracks": self.video_tracks,
+            "audio_tracks": self.audio_tracks,
+            "max_video_tracks": MAX_VIDEO_TRACKS,
+            "encode_queue_depth": encode_scheduler.queue_depth,
+            "max_encode_queue": MAX_ENCODE_QUEUE,
+            "loop_lag": round(self.loop_lag.lag, 4),
+            "max_loop_lag_seen": round(self.loop_lag.max_lag, 4),
+            "video_pressure": self.video_pressure(),
+            "queued": list(self._queue),
+            "rejected": self.rejected,
+        }
+
+
+admission = AdmissionController()
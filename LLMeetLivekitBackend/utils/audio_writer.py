@@ -0,0 +1,138 @@
+import struct
+import wave
+from fractions import Fraction
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import av
+import numpy as np
+from loguru import logger
+
+from utils.live_encoder import LiveEncoder
+from utils.metrics import metrics
+
+ASR_SAMPLE_RATE = 16000
+
+AUDIO_UNDERRUNS = metrics.counter("llmeet_audio_underruns_total", "音频断流（按静音补齐）的次数")
+AUDIO_UNDERRUN_SECONDS = metrics.counter("llmeet_audio_underrun_seconds_total", "按静音补齐的音频时长")
+
+
+class BatchedAudioWriter:
+    """
+    在 FrameWorker 线程中累积 LiveKit 的 10ms 音频帧，按 pts 补齐断流静音后，
+    以大块（默认 0.5s）同时写入录像编码器和 16 kHz 单声道 ASR 旁路 WAV，
+    转写服务可以直接使用旁路文件，无需再解码 MP4 重采样。
+    """
+
+    def __init__(
+        self,
+        encoder: LiveEncoder,
+        asr_path: Optional[Path],
+        sample_rate: int = 48000,
+        channels: int = 2,
+        batch_seconds: float = 0.5,
+    ):
+        self.encoder = encoder
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.batch_samples = int(sample_rate * batch_seconds)
+        self.samples_written = 0
+        self.underruns = 0
+        self._pending: List[bytes] = []
+        self._pending_samples = 0
+
+        self.asr_path = Path(asr_path) if asr_path else None
+        self._asr_file = None
+        self._asr_wav = None
+        self._resampler = None
+        # 每写出一块 16 kHz PCM 时回调（在 FrameWorker 线程中），用于会议中的增量转写
+        self.on_asr_pcm: Optional[Callable[[bytes], None]] = None
+        if self.asr_path:
+            # 大缓冲区顺序写，减少系统调用次数
+            self._asr_file = open(self.asr_path, "wb", buffering=1 << 20)
+            self._asr_wav = wave.open(self._asr_file, "wb")
+            self._asr_wav.setnchannels(1)
+            self._asr_wav.setsampwidth(2)
+            self._asr_wav.setframerate(ASR_SAMPLE_RATE)
+            self._resampler = av.AudioResampler(format="s16", layout="mono", rate=ASR_SAMPLE_RATE)
+
+    def write(self, pcm: bytes, pts: float):
+        """pcm 为 s16 交错采样，pts 为相对录制开始的秒数"""
+        expected = self.samples_written + self._pending_samples
+        gap = int(pts * self.sample_rate) - expected
+        # 断流留下的空档（超过 20ms）用静音补齐，音频时间轴始终与 pts 一致
+        if gap > self.sample_rate // 50:
+            self.underruns += 1
+            AUDIO_UNDERRUNS.inc()
+            AUDIO_UNDERRUN_SECONDS.inc(gap / self.sample_rate)
+            self._fill_silence(gap)
+        self._append(pcm)
+
+    def _fill_silence(self, samples: int):
+        # 按 batch_samples 分块补静音，长时间断流也不会一次分配整段缓冲区
+        while samples > 0:
+            n = min(samples, self.batch_samples - self._pending_samples)
+            self._append(bytes(n * self.channels * 2))
+            samples -= n
+
+    def _append(self, pcm: bytes):
+        self._pending.append(pcm)
+        self._pending_samples += len(pcm) // (2 * self.channels)
+        if self._pending_samples >= self.batch_samples:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        batch = np.frombuffer(b"".join(self._pending), dtype=np.int16)
+        self._pending.clear()
+        self.samples_written += self._pending_samples
+        self._pending_samples = 0
+        self.encoder.encode_audio(batch)
+        if self._resampler:
+            self._write_asr(self._make_frame(batch))
+
+    def _make_frame(self, pcm: np.ndarray) -> av.AudioFrame:
+        layout = "stereo" if self.channels == 2 else "mono"
+        frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout=layout)
+        frame.sample_rate = self.sample_rate
+        frame.time_base = Fraction(1, self.sample_rate)
+        return frame
+
+    def _write_asr(self, frame: Optional[av.AudioFrame]):
+        for out in self._resampler.resample(frame):
+            pcm = bytes(out.planes[0])[: out.samples * 2]
+            self._asr_wav.writeframesraw(pcm)
+            if self.on_asr_pcm:
+                self.on_asr_pcm(pcm)
+
+    def close(self):
+        """写出剩余数据并补写 WAV 头（阻塞，在 FrameWorker 停止后调用）"""
+        self.flush()
+        if self._asr_wav:
+            try:
+                self._write_asr(None)
+                self._asr_wav.close()
+            except Exception as e:
+                logger.warning(f"[AudioWriter] 关闭 ASR 旁路文件失败 {self.asr_path}: {e}")
+            finally:
+                self._asr_file.close()
+                self._asr_wav = None
+
+
+def repair_wav_header(path: Path):
+    """
+    进程崩溃时 wave 模块来不及回填 RIFF / data 长度，按实际文件大小修正，
+    只处理 wave 模块写出的标准 44 字节头。
+    """
+    size = path.stat().st_size
+    if size < 44:
+        return
+    with open(path, "r+b") as f:
+        header = f.read(44)
+        if header[:4] != b"RIFF" or header[36:40] != b"data":
+            return
+        f.seek(4)
+        f.write(struct.pack("<I", size - 8))
+        f.seek(40)
+        f.write(struct.pack("<I", size - 44))
@@ -0,0 +1,104 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import httpx
+from loguru import logger
+
+from utils import livekit_bot
+from utils.bot_registry import BOT_WORKERS, RegistryStore, bot_registry
+from utils.meeting_pipeline import meeting_pipeline
+
+
+class BotPool:
+    """
+    API 层的 Bot 调度入口。单进程模式直接调用本进程的 Bot；
+    多 worker 模式下按登记表把房间的 start / stop / status 转发给负责该房间的 Bot worker，
+    新房间分配给当前房间数最少的存活 worker。登记表的读写是同步 I/O，放到线程中执行。
+    """
+
+    def __init__(self, store: Optional[RegistryStore]):
+        self.store = store
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def distributed(self) -> bool:
+        return self.store is not None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30.0)
+        return self._client
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _call(self, worker: Dict[str, Any], method: str, path: str, **kwargs) -> Dict[str, Any]:
+        resp = await self._http().request(method, f"{worker['url']}{path}", **kwargs)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _owner(self, room: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.owner, room)
+
+    async def _workers(self) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.workers)
+
+    async def is_active(self, room: str) -> bool:
+        if not self.distributed:
+            return room in livekit_bot.rooms
+        return await self._owner(room) is not None
+
+    async def start(self, room: str, username: str) -> Dict[str, Any]:
+        if not self.distributed:
+            return await livekit_bot.start_bot(room, username)
+        worker = await self._owner(room)
+        if worker is None:
+            workers = await self._workers()
+            if not workers:
+                raise RuntimeError("没有可用的 Bot worker")
+            worker = min(workers, key=lambda w: w["rooms"])
+        result = await self._call(worker, "POST", "/internal/start_bot", json={"meeting_id": room, "username": username})
+        if result.get("status") == "owned":
+            # 并发启动时房间已被其他 worker 认领，转发给实际归属者
+            owner = next((w for w in await self._workers() if w["id"] == result["owner"]), None)
+            if owner:
+                result = await self._call(owner, "POST", "/internal/start_bot", json={"meeting_id": room, "username": username})
+        return result
+
+    async def stop(self, room: str) -> Dict[str, Any]:
+        if not self.distributed:
+            return await livekit_bot.stop_bot(room)
+        worker = await self._owner(room)
+        if worker is None:
+            return {"status": "not running", "room": room}
+        return await self._call(worker, "POST", "/internal/stop_bot", json={"meeting_id": room})
+
+    async def status(self, room: Optional[str] = None) -> Dict[str, Any]:
+        if not self.distributed:
+            return livekit_bot.bot_status(room)
+        if room:
+            worker = await self._owner(room)
+            if worker is None:
+                # 没有 Bot 在录制：只剩流水线状态（状态文件由执行它的 worker 写在共享目录中）
+                return {"room": room, "connected": False, "active_recordings": 0,
+                        "pipeline": meeting_pipeline.status(room), "recording_sessions": []}
+            return {**await self._call(worker, "GET", "/internal/status", params={"meeting_id": room}),
+                    "worker": worker["id"]}
+        workers = await self._workers()
+        results = await asyncio.gather(
+            *(self._call(w, "GET", "/internal/status") for w in workers), return_exceptions=True
+        )
+        summary = []
+        for w, r in zip(workers, results):
+            if isinstance(r, Exception):
+                logger.warning(f"[BotPool] 查询 worker {w['id']} 状态失败: {r}")
+                summary.append({"id": w["id"], "url": w["url"], "error": str(r)})
+            else:
+                summary.append({"id": w["id"], "url": w["url"], **r})
+        active_rooms = await asyncio.to_thread(self.store.rooms)
+        return {"active_rooms": list(active_rooms.keys()), "workers": summary}
+
+
+bot_pool = BotPool(bot_registry if BOT_WORKERS else None)
@@ -0,0 +1,239 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Redis 为可选依赖，默认使用本地 SQLite
+    redis = None
+
+# 0 表示 Bot 与 API 在同一进程中运行（单进程开发模式）
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+BOT_WORKER_BASE_PORT = int(os.getenv("BOT_WORKER_BASE_PORT", "7800"))
+BOT_REGISTRY_URL = os.getenv("BOT_REGISTRY_URL", "sqlite:///temps/bot_registry.db")
+# 由启动器为每个 Bot worker 进程设置
+BOT_WORKER_ID = os.getenv("BOT_WORKER_ID")
+HEARTBEAT_INTERVAL = 5.0
+# 超过这么久没有心跳的 worker 视为已退出，其名下的房间可以被重新认领
+WORKER_TTL = 15.0
+EVENT_RETENTION = 3600.0
+
+
+class RegistryStore(ABC):
+    """
+    房间归属登记表：记录哪个 Bot worker 进程负责哪个房间，以及各 worker 的心跳。
+    另外提供一个简单的事件队列，Bot worker 发布的通知由 API worker 转发给 WebSocket 客户端。
+    所有方法都是同步的短操作，但会访问 SQLite 文件或 Redis，异步代码中通过 asyncio.to_thread 调用。
+    """
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, url: str, rooms: int):
+        ...
+
+    @abstractmethod
+    def workers(self) -> List[Dict[str, Any]]:
+        """存活的 worker：[{id, url, rooms, seen}]"""
+
+    @abstractmethod
+    def claim(self, room: str, worker_id: str) -> str:
+        """认领房间，返回实际的归属 worker（已被其他存活 worker 认领时返回对方）"""
+
+    @abstractmethod
+    def release(self, room: str, worker_id: str):
+        ...
+
+    @abstractmethod
+    def release_all(self, worker_id: str):
+        ...
+
+    @abstractmethod
+    def rooms(self) -> Dict[str, str]:
+        """存活 worker 名下的房间：{room: worker_id}"""
+
+    @abstractmethod
+    def publish(self, event: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def events(self, cursor: Any) -> Tuple[List[Dict[str, Any]], Any]:
+        """读取 cursor 之后的事件，返回 (事件列表, 新 cursor)；cursor 为 None 时从最新位置开始"""
+
+    def owner(self, room: str) -> Optional[Dict[str, Any]]:
+        worker_id = self.rooms().get(room)
+        if worker_id is None:
+            return None
+        return next((w for w in self.workers() if w["id"] == worker_id), None)
+
+
+class SQLiteRegistryStore(RegistryStore):
+    """同一台机器上的多个进程共享一个 SQLite 文件（WAL 模式），无需额外服务"""
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, url TEXT NOT NULL, rooms INTEGER NOT NULL, seen REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS rooms (room TEXT PRIMARY KEY, worker_id TEXT NOT NULL, claimed_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, created REAL NOT NULL);
+            """)
+
+    def _alive_since(self) -> float:
+        return time.time() - WORKER_TTL
+
+    def heartbeat(self, worker_id: str, url: str, rooms: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workers (id, url, rooms, seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET url = excluded.url, rooms = excluded.rooms, seen = excluded.seen",
+                (worker_id, url, rooms, time.time()),
+            )
+
+    def workers(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, rooms, seen FROM workers WHERE seen >= ? ORDER BY id", (self._alive_since(),)
+            ).fetchall()
+        return [{"id": r[0], "url": r[1], "rooms": r[2], "seen": r[3]} for r in rows]
+
+    def claim(self, room: str, worker_id: str) -> str:
+        with self._lock:
+            # IMMEDIATE 事务：读-判断-写期间其他进程无法写入
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT r.worker_id FROM rooms r JOIN workers w ON w.id = r.worker_id "
+                    "WHERE r.room = ? AND w.seen >= ?", (room, self._alive_since()),
+                ).fetchone()
+                if row and row[0] != worker_id:
+                    self._conn.execute("COMMIT")
+                    return row[0]
+                self._conn.execute(
+                    "INSERT INTO rooms (room, worker_id, claimed_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(room) DO UPDATE SET worker_id = excluded.worker_id, claimed_at = excluded.claimed_at",
+                    (room, worker_id, time.time()),
+                )
+                self._conn.execute("COMMIT")
+                return worker_id
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def release(self, room: str, worker_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM rooms WHERE room = ? AND worker_id = ?", (room, worker_id))
+
+    def release_all(self, worker_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM rooms WHERE worker_id = ?", (worker_id,))
+
+    def rooms(self) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.room, r.worker_id FROM rooms r JOIN workers w ON w.id = r.worker_id WHERE w.seen >= ?",
+                (self._alive_since(),),
+            ).fetchall()
+        return dict(rows)
+
+    def publish(self, event: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO events (payload, created) VALUES (?, ?)", (json.dumps(event), now))
+            self._conn.execute("DELETE FROM events WHERE created < ?", (now - EVENT_RETENTION,))
+
+    def events(self, cursor: Optional[int]) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            if cursor is None:
+                row = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+                return [], row[0]
+            rows = self._conn.execute(
+                "SELECT id, payload FROM events WHERE id > ? ORDER BY id", (cursor,)
+            ).fetchall()
+        if not rows:
+            return [], cursor
+        return [json.loads(r[1]) for r in rows], rows[-1][0]
+
+
+class RedisRegistryStore(RegistryStore):
+    """多机部署时使用 Redis：worker / 房间存在哈希表中，事件使用 Stream"""
+
+    def __init__(self, url: str, prefix: str = "llmeet"):
+        if redis is None:
+            raise RuntimeError("BOT_REGISTRY_URL 指向 Redis，但未安装 redis 包")
+        self._r = redis.Redis.from_url(url, decode_responses=True)
+        self._workers_key = f"{prefix}:workers"
+        self._rooms_key = f"{prefix}:rooms"
+        self._events_key = f"{prefix}:events"
+
+    def heartbeat(self, worker_id: str, url: str, rooms: int):
+        self._r.hset(self._workers_key, worker_id, json.dumps(
+            {"id": worker_id, "url": url, "rooms": rooms, "seen": time.time()}
+        ))
+
+    def workers(self) -> List[Dict[str, Any]]:
+        since = time.time() - WORKER_TTL
+        workers = [json.loads(v) for v in self._r.hvals(self._workers_key)]
+        return sorted((w for w in workers if w["seen"] >= since), key=lambda w: w["id"])
+
+    def claim(self, room: str, worker_id: str) -> str:
+        alive = {w["id"] for w in self.workers()}
+        with self._r.pipeline() as pipe:
+            while True:
+                try:
+                    # WATCH + MULTI：并发认领时只有一个进程能写入
+                    pipe.watch(self._rooms_key)
+                    current = pipe.hget(self._rooms_key, room)
+                    if current and current != worker_id and current in alive:
+                        pipe.unwatch()
+                        return current
+                    pipe.multi()
+                    pipe.hset(self._rooms_key, room, worker_id)
+                    pipe.execute()
+                    return worker_id
+                except redis.WatchError:
+                    continue
+
+    def release(self, room: str, worker_id: str):
+        if self._r.hget(self._rooms_key, room) == worker_id:
+            self._r.hdel(self._rooms_key, room)
+
+    def release_all(self, worker_id: str):
+        for room, owner in self._r.hgetall(self._rooms_key).items():
+            if owner == worker_id:
+                self._r.hdel(self._rooms_key, room)
+
+    def rooms(self) -> Dict[str, str]:
+        alive = {w["id"] for w in self.workers()}
+        return {room: owner for room, owner in self._r.hgetall(self._rooms_key).items() if owner in alive}
+
+    def publish(self, event: Dict[str, Any]):
+        self._r.xadd(self._events_key, {"payload": json.dumps(event)}, maxlen=1000, approximate=True)
+
+    def events(self, cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], str]:
+        if cursor is None:
+            last = self._r.xrevrange(self._events_key, count=1)
+            return [], last[0][0] if last else "0-0"
+        entries = self._r.xrange(self._events_key, min=f"({cursor}")
+        if not entries:
+            return [], cursor
+        return [json.loads(fields["payload"]) for _, fields in entries], entries[-1][0]
+
+
+def create_store(url: str = BOT_REGISTRY_URL) -> RegistryStore:
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisRegistryStore(url)
+    if url.startswith("sqlite:///"):
+        return SQLiteRegistryStore(url[len("sqlite:///"):])
+    raise ValueError(f"不支持的 BOT_REGISTRY_URL: {url}")
+
+
+# 单进程模式下不需要登记表
+bot_registry: Optional[RegistryStore] = create_store() if BOT_WORKERS else None
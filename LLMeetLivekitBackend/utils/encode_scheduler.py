@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from loguru import logger
+
+# 负载（活跃实时编码器 + 排队任务）与核数之比 -> x264 preset / CRF，负载越高越偏向速度
+ENCODER_PROFILES: List[Tuple[float, str, int]] = [
+    (0.5, "veryfast", 23),
+    (1.0, "superfast", 25),
+    (float("inf"), "ultrafast", 28),
+]
+
+
+class EncodeScheduler:
+    """
+    进程内共享的编码任务调度器：会议结束时的收尾编码（flush 编码器、关闭文件等）
+    不再无限制地并发占用默认线程池，而是按核数限流，短录像优先。
+    同时根据积压情况为新开的实时编码器选择更快的 preset / 更高的 CRF。
+    """
+
+    def __init__(self, max_concurrency: int = None):
+        cores = os.cpu_count() or 2
+        self.cores = cores
+        self.max_concurrency = max_concurrency or max(1, cores // 2)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="encode")
+        self._waiting: List[Tuple[float, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.running = 0
+        self.live_encoders = 0
+        self.completed = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def load(self) -> float:
+        return (self.live_encoders + self.running + self.queue_depth) / self.cores
+
+    def encoder_profile(self) -> Tuple[str, int]:
+        """为新的实时编码器选择 (preset, crf)"""
+        load = self.load
+        for threshold, preset, crf in ENCODER_PROFILES:
+            if load < threshold:
+                return preset, crf
+        return ENCODER_PROFILES[-1][1:]
+
+    async def run(self, fn: Callable[..., Any], *args, priority: float = 0.0) -> Any:
+        """
+        提交一个阻塞的编码任务并等待结果；priority 越小越先执行（调用方传录像时长）。
+        """
+        if self.running >= self.max_concurrency:
+            slot = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (priority, next(self._seq), slot))
+            logger.info(f"[EncodeScheduler] 任务排队，当前队列深度 {self.queue_depth}")
+            try:
+                await slot
+            except asyncio.CancelledError:
+                self._discard(slot)
+                raise
+        else:
+            self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.completed += 1
+            self._release()
+
+    def _discard(self, slot: asyncio.Future):
+        if slot.done() and not slot.cancelled():
+            # 已经分到执行名额却被取消，把名额让给下一个
+            self._release()
+            return
+        self._waiting = [w for w in self._waiting if w[2] is not slot]
+        heapq.heapify(self._waiting)
+
+    def _release(self):
+        # 名额直接转交给队首任务，running 不变
+        while self._waiting:
+            _, _, slot = heapq.heappop(self._waiting)
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        preset, crf = self.encoder_profile()
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "live_encoders": self.live_encoders,
+            "completed": self.completed,
+            "load": round(self.load, 2),
+            "preset": preset,
+            "crf": crf,
+        }
+
+
+encode_scheduler = EncodeScheduler(int(os.getenv("ENCODE_MAX_CONCURRENCY", "0")) or None)
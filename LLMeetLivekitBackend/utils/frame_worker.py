@@ -0,0 +1,94 @@
+import threading
+from collections import deque
+from typing import Any, Callable
+
+from loguru import logger
+
+from utils.metrics import metrics
+
+VIDEO_FRAMES_DROPPED = metrics.counter("llmeet_video_frames_dropped_total", "编码跟不上而丢弃的视频帧")
+
+
+class FrameWorker:
+    """
+    录制会话的后台工作线程：帧格式转换、缩放和编码都在这里完成，不占用 asyncio 事件循环。
+
+    视频队列有上限，编码跟不上时按时间戳丢弃过旧的帧；音频数据量小且不能有缺口，从不丢弃。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_video: Callable[..., Any],
+        on_audio: Callable[..., Any],
+        max_pending_frames: int = 8,
+        max_lag: float = 0.5,
+    ):
+        self.on_video = on_video
+        self.on_audio = on_audio
+        self.max_pending_frames = max_pending_frames
+        self.max_lag = max_lag
+        self.dropped_frames = 0
+        self._cond = threading.Condition()
+        self._video: deque = deque()
+        self._audio: deque = deque()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_frames(self) -> int:
+        return len(self._video)
+
+    def submit_video(self, frame: Any, ts: float, *args):
+        """事件循环侧调用：只入队，不做任何转换"""
+        with self._cond:
+            if len(self._video) >= self.max_pending_frames:
+                self._video.popleft()
+                self.dropped_frames += 1
+                VIDEO_FRAMES_DROPPED.inc()
+            self._video.append((frame, ts, *args))
+            self._cond.notify()
+
+    def submit_audio(self, data: bytes, *args):
+        with self._cond:
+            self._audio.append((data, *args))
+            self._cond.notify()
+
+    def stop(self, timeout: float = None):
+        """处理完队列中剩余的数据后退出线程（阻塞，需在线程池中调用）"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _next_video(self):
+        # 调用方已持有锁；落后最新帧超过 max_lag 的帧直接丢弃
+        item = self._video.popleft()
+        newest_ts = self._video[-1][1] if self._video else item[1]
+        while self._video and newest_ts - item[1] > self.max_lag:
+            self.dropped_frames += 1
+            VIDEO_FRAMES_DROPPED.inc()
+            item = self._video.popleft()
+        return item
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._video or self._audio or self._stopping):
+                    self._cond.wait()
+                if self._stopping and not (self._video or self._audio):
+                    return
+                audio = list(self._audio)
+                self._audio.clear()
+                video = self._next_video() if self._video else None
+            for item in audio:
+                self._call(self.on_audio, *item)
+            if video is not None:
+                self._call(self.on_video, *video)
+
+    def _call(self, fn: Callable[..., Any], *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.error(f"[FrameWorker] {self._thread.name} 处理失败: {e}")
@@ -0,0 +1,92 @@
+import gzip
+import json
+from datetime import date, datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，没有时退回标准库
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，没有时只提供 gzip
+    brotli = None
+
+# 小于这个大小的响应压缩收益不大
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _default(obj: Any):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    """大响应的快速序列化：直接得到 UTF-8 字节，不经过 FastAPI 的 jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode()
+
+
+def negotiate_encoding(request: Request) -> Optional[str]:
+    """按 Accept-Encoding 选择压缩方式：优先 brotli，其次 gzip，都不接受时返回 None"""
+    if brotli is not None and _accepts(request, "br"):
+        return "br"
+    if _accepts(request, "gzip"):
+        return "gzip"
+    return None
+
+
+def make_etag(*parts: Any, encoding: Optional[str] = None) -> str:
+    """由数据版本生成强 ETag；不同压缩编码是不同的表示，ETag 也不同"""
+    tag = "-".join(str(p) for p in parts)
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"})
+
+
+def _accepts(request: Request, coding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _encode(content: Any, encoding: Optional[str]) -> tuple:
+    body = dumps(content)
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+
+
+async def json_response(content: Any, encoding: Optional[str] = None, etag: Optional[str] = None) -> Response:
+    """
+    序列化并压缩为最终响应体。多 MB 的纪要序列化和压缩要几十毫秒，放到线程池中执行，不阻塞事件循环。
+    """
+    body, applied = await run_in_threadpool(_encode, content, encoding)
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "private, no-cache"}
+    if etag:
+        headers["ETag"] = etag
+    if applied:
+        headers["Content-Encoding"] = applied
+    return Response(body, media_type="application/json", headers=headers)
@@ -1,10 +1,14 @@
 import os
+import time
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import jwt
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
+from loguru import logger
+
+from static.cache import CACHE_HITS, CACHE_MISSES, make_cache
 
 load_dotenv()
 security = HTTPBearer()
@@ -26,20 +30,34 @@ class JWTManager:
         return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
 
     def verify_token(self, token: str) -> Optional[str]:
-        """验证 JWT 并返回 username"""
+        """验证 JWT 并返回 username；验证通过的 token 缓存到其 exp 为止，之后的请求不再解码验签"""
+        username = token_cache.get(token)
+        if isinstance(username, str):
+            CACHE_HITS.inc(cache=token_cache.name)
+            return username
+        CACHE_MISSES.inc(cache=token_cache.name)
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload.get("sub")
         except (jwt.ExpiredSignatureError, jwt.InvalidTokenError) as e:
-            print(f"Token验证失败: {e}")
+            logger.debug(f"Token验证失败: {e}")
             return None
+        username = payload.get("sub")
+        if username is not None:
+            remaining = payload.get("exp", 0) - time.time()
+            if remaining > 0:
+                token_cache.set(token, username, ttl=remaining)
+        return username
+
 
+# 只缓存验签结果，不跨进程共享；条目在 token 过期时失效
+token_cache = make_cache("jwt_tokens", maxsize=int(os.environ.get("TOKEN_CACHE_SIZE", "10000")), ttl=3600, local=True)
 
 # 初始化
 jwt_manager = JWTManager(secret_key=os.environ.get("TOKEN_SECRET_KEY"))
 
 # FastAPI 依赖项：获取当前用户（username）
-def get_current_user(
+# 定义为协程：命中缓存时只是一次字典查找，不必再切换到线程池
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> str:
     token = credentials.credentials
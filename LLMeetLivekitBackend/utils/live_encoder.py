@@ -0,0 +1,196 @@
+from fractions import Fraction
+from pathlib import Path
+from typing import Optional, Tuple
+import shutil
+import time
+import av
+from av.video.frame import PictureType
+import numpy as np
+from loguru import logger
+
+from utils.metrics import metrics
+
+# fragmented MP4：边录边写 moof/mdat 分片，进程崩溃时已写入的分片依然可播放
+FRAGMENTED_MP4_FLAGS = "frag_keyframe+empty_moov+default_base_moof"
+VIDEO_TIME_BASE = Fraction(1, 90000)
+# 分段录制：HLS 播放列表 + fMP4 分片，init 分片与各媒体分片按顺序拼接即为完整的 fragmented MP4
+HLS_PLAYLIST = "index.m3u8"
+HLS_INIT_SEGMENT = "init.mp4"
+HLS_SEGMENT_PATTERN = "seg_%05d.m4s"
+
+FRAME_CONVERT_SECONDS = metrics.histogram("llmeet_frame_convert_seconds", "RGB 帧封装为 VideoFrame 的耗时")
+FRAME_ENCODE_SECONDS = metrics.histogram("llmeet_frame_encode_seconds", "单帧 libx264 编码并写入容器的耗时")
+AUDIO_ENCODE_SECONDS = metrics.histogram("llmeet_audio_encode_seconds", "一批 PCM 的 AAC 编码并写入容器的耗时")
+
+
+def segment_dir(final_file: Path) -> Path:
+    """final_<identity>_<ts>.mp4 对应的分片目录 hls_<identity>_<ts>/"""
+    final_file = Path(final_file)
+    return final_file.parent / f"hls_{final_file.stem[len('final_'):]}"
+
+
+def concat_segments(playlist: Path, out_path: Path) -> int:
+    """
+    按播放列表把 init 分片和已完成的媒体分片拼接为单个 MP4，返回拼接的分片数。
+    只读取播放列表中登记过的分片，进程崩溃时正在写的最后一个分片会被忽略。
+    """
+    playlist = Path(playlist)
+    init, segments = None, []
+    for line in playlist.read_text().splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-MAP:"):
+            init = line.split('URI="', 1)[1].split('"', 1)[0]
+        elif line and not line.startswith("#"):
+            segments.append(line)
+    if init is None or not segments:
+        return 0
+    tmp = Path(out_path).with_suffix(".part")
+    with open(tmp, "wb") as out:
+        for name in [init] + segments:
+            with open(playlist.parent / name, "rb") as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+    tmp.replace(out_path)
+    return len(segments)
+
+
+class LiveEncoder:
+    """
+    会议进行中的实时编码器：原始 RGB 帧和 PCM 直接送入 libx264 / AAC，
+    输出 fragmented MP4，结束时只需 flush 并关闭文件，无需再转码合并。
+    指定 segment_seconds 时改为写 HLS：path 为播放列表，分片与其同目录，
+    会议进行中即可边录边播。
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        width: int = 1920,
+        height: int = 1080,
+        fps: int = 24,
+        sample_rate: int = 48000,
+        channels: int = 2,
+        preset: str = "veryfast",
+        crf: int = 23,
+        segment_seconds: Optional[float] = None,
+        video: bool = True,
+    ):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.layout = "stereo" if channels == 2 else "mono"
+        if segment_seconds:
+            self.container = av.open(
+                str(self.path), mode="w", format="hls",
+                options={
+                    "hls_time": str(segment_seconds),
+                    "hls_segment_type": "fmp4",
+                    # EVENT 播放列表只追加不删除，播放器可以从头回看
+                    "hls_playlist_type": "event",
+                    "hls_flags": "independent_segments",
+                    "hls_fmp4_init_filename": HLS_INIT_SEGMENT,
+                    "hls_segment_filename": str(self.path.parent / HLS_SEGMENT_PATTERN),
+                },
+            )
+        else:
+            self.container = av.open(
+                str(self.path), mode="w", format="mp4",
+                options={"movflags": FRAGMENTED_MP4_FLAGS},
+            )
+
+        # video=False 时只录音频（准入控制降级）
+        self.video_stream = None
+        if video:
+            self.video_stream = self.container.add_stream("libx264", rate=fps)
+            self.video_stream.width = width
+            self.video_stream.height = height
+            self.video_stream.pix_fmt = "yuv420p"
+            self.video_stream.codec_context.time_base = VIDEO_TIME_BASE
+            # zerolatency 关闭 lookahead / B 帧，编码器内部几乎不积压帧
+            self.video_stream.options = {"preset": preset, "crf": str(crf), "tune": "zerolatency"}
+            if segment_seconds:
+                # 强制关键帧输出为 IDR，分片从这里切开后可以独立解码
+                self.video_stream.options["forced-idr"] = "1"
+
+        self.audio_stream = self.container.add_stream("aac", rate=sample_rate)
+        self.audio_stream.layout = self.layout
+
+        # 与画布宽高比不同的画面缩放后居中贴到这块黑底上
+        self._canvas: Optional[np.ndarray] = None
+        self._canvas_rect = None
+        self._segment_seconds = segment_seconds
+        self._next_keyframe = 0.0
+        self._last_video_pts = -1
+        self._audio_samples = 0
+        self.closed = False
+
+    def _fit(self, rgb: np.ndarray, box: Optional[Tuple[int, int]]) -> av.VideoFrame:
+        """
+        画布尺寸在创建时固定。会话中切换画面（摄像头 / 屏幕共享）后宽高比和录制规格可能不同，
+        此时把画面等比缩放到 box（新轨道的录制尺寸，不超过画布）并居中加黑边，
+        避免编码器把画面拉伸或放大到画布尺寸。
+        """
+        h, w = rgb.shape[:2]
+        cw, ch = self.video_stream.width, self.video_stream.height
+        bw, bh = box or (cw, ch)
+        scale = min(min(bw, cw) / w, min(bh, ch) / h)
+        tw, th = max(2, int(w * scale) // 2 * 2), max(2, int(h * scale) // 2 * 2)
+        frame = av.VideoFrame.from_ndarray(rgb, format="rgb24")
+        # 与画布一致时缩放 / 转 yuv420p 仍由编码器完成
+        if abs(tw - cw) <= 2 and abs(th - ch) <= 2:
+            return frame
+        if (tw, th) != (w, h):
+            frame = frame.reformat(width=tw, height=th)
+        x, y = (cw - tw) // 2, (ch - th) // 2
+        if self._canvas is None or self._canvas_rect != (x, y, tw, th):
+            self._canvas = np.zeros((ch, cw, 3), dtype=np.uint8)
+            self._canvas_rect = (x, y, tw, th)
+        self._canvas[y:y + th, x:x + tw] = frame.to_ndarray()
+        return av.VideoFrame.from_ndarray(self._canvas, format="rgb24")
+
+    def encode_video(self, rgb: np.ndarray, pts: float, box: Optional[Tuple[int, int]] = None):
+        """编码一帧 RGB24 画面，pts 为相对录制开始的秒数，box 为当前画面的录制尺寸（默认铺满画布）"""
+        if self.video_stream is None:
+            return
+        start = time.perf_counter()
+        frame = self._fit(rgb, box)
+        ticks = int(pts / VIDEO_TIME_BASE)
+        # libx264 要求 pts 严格递增
+        if ticks <= self._last_video_pts:
+            ticks = self._last_video_pts + 1
+        self._last_video_pts = ticks
+        frame.pts = ticks
+        frame.time_base = VIDEO_TIME_BASE
+        if self._segment_seconds and ticks * VIDEO_TIME_BASE >= self._next_keyframe:
+            # 分片只能在关键帧处切分。LiveKit 帧率不固定，按帧数设 GOP 会让分片时长漂移，
+            # 这里按时间在每个分片边界强制关键帧（相当于 force_key_frames expr:gte(t,n_forced*T)）
+            frame.pict_type = PictureType.I
+            while self._next_keyframe <= ticks * VIDEO_TIME_BASE:
+                self._next_keyframe += self._segment_seconds
+        encode_start = time.perf_counter()
+        FRAME_CONVERT_SECONDS.observe(encode_start - start)
+        self.container.mux(self.video_stream.encode(frame))
+        FRAME_ENCODE_SECONDS.observe(time.perf_counter() - encode_start)
+
+    def encode_audio(self, pcm: np.ndarray):
+        """编码一段连续的 s16 交错 PCM，pts 按已写入采样数排列（断流静音由调用方补齐）"""
+        frame = av.AudioFrame.from_ndarray(pcm.reshape(1, -1), format="s16", layout=self.layout)
+        frame.sample_rate = self.sample_rate
+        frame.pts = self._audio_samples
+        frame.time_base = Fraction(1, self.sample_rate)
+        self._audio_samples += frame.samples
+        with AUDIO_ENCODE_SECONDS.time():
+            self.container.mux(self.audio_stream.encode(frame))
+
+    def close(self):
+        """flush 编码器缓存的帧并关闭文件"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.video_stream is not None:
+                self.container.mux(self.video_stream.encode(None))
+            self.container.mux(self.audio_stream.encode(None))
+        except Exception as e:
+            logger.warning(f"[LiveEncoder] flush 失败 {self.path}: {e}")
+        finally:
+            self.container.close()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+from collections import Counter
+from typing import Dict, Optional
+from urllib.parse import quote
+
+import httpx
+from loguru import logger
+
+from static.meeting import append_meeting_minutes
+
+LIVE_TRANSCRIBE = os.getenv("LIVE_TRANSCRIBE", "1") == "1"
+ASR_SAMPLE_RATE = 16000
+# 每攒够这么多秒的 16 kHz 音频推送一次
+LIVE_CHUNK_SECONDS = 5.0
+MAX_FAILURES = 3
+FINAL_RETRY_DELAY = 1.0
+
+
+class LiveTranscriber:
+    """
+    会议进行中把每位参会者的 16 kHz 单声道音频分块推送到转写服务的 /stream 接口，
+    服务端按滚动窗口转写，返回的片段直接追加到 minutes，会议结束时只剩最后一个窗口。
+    """
+
+    def __init__(self, meeting_id: str, base_url: str):
+        self.meeting_id = meeting_id
+        self.t0: Optional[float] = None
+        # 任一路推送失败过多即视为不完整，会后流水线回退为完整转写
+        self.healthy = True
+        self.languages: Counter = Counter()
+        self.segment_count = 0
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=120.0)
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def language(self) -> Optional[str]:
+        return self.languages.most_common(1)[0][0] if self.languages else None
+
+    def attach(self, session):
+        """为录制会话创建推送任务，返回可在 FrameWorker 线程中调用的回调"""
+        if self.t0 is None or session.start_time < self.t0:
+            self.t0 = session.start_time
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues[session.session_id] = queue
+        self._tasks[session.session_id] = asyncio.create_task(self._sender(session, queue))
+        return lambda pcm: loop.call_soon_threadsafe(queue.put_nowait, pcm)
+
+    def finish(self, session_id: str):
+        queue = self._queues.get(session_id)
+        if queue:
+            queue.put_nowait(None)
+
+    async def close(self):
+        """等待所有参会者的最后一个窗口转写完成"""
+        for sid in list(self._queues):
+            self.finish(sid)
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        await self._client.aclose()
+
+    async def _sender(self, session, queue: asyncio.Queue):
+        chunk_bytes = int(LIVE_CHUNK_SECONDS * ASR_SAMPLE_RATE) * 2
+        sent_bytes = 0
+        buffer = bytearray()
+        # 连续失败次数，推送成功即清零
+        failures = 0
+        url = f"/stream/{quote(self.meeting_id, safe='')}/{quote(session.participant_identity, safe='')}"
+        while True:
+            pcm = await queue.get()
+            final = pcm is None
+            if not final:
+                buffer.extend(pcm)
+                if len(buffer) < chunk_bytes:
+                    continue
+            if failures >= MAX_FAILURES:
+                if final:
+                    return
+                buffer.clear()
+                continue
+            # 这段音频在会议时间轴上的起点
+            offset = (session.start_time - self.t0) + sent_bytes / 2 / ASR_SAMPLE_RATE
+            result = None
+            while failures < MAX_FAILURES:
+                try:
+                    # position 让服务端跳过超时请求已经收下的音频，重发不会产生重复片段
+                    resp = await self._client.post(
+                        url, content=bytes(buffer),
+                        params={
+                            "offset": offset, "final": str(final).lower(),
+                            "position": sent_bytes, "session": session.session_id,
+                        },
+                        headers={"Content-Type": "application/octet-stream"},
+                    )
+                    resp.raise_for_status()
+                    result = resp.json()
+                    failures = 0
+                    break
+                except Exception as e:
+                    failures += 1
+                    logger.warning(f"[{self.meeting_id}] 增量转写推送失败 ({failures}/{MAX_FAILURES}): {e}")
+                    if not final:
+                        # 保留缓冲区，随下一块一起重发
+                        break
+                    # 最后一块之后不会再有推送，在这里退避重试
+                    await asyncio.sleep(FINAL_RETRY_DELAY * failures)
+            if result is None:
+                if final or failures >= MAX_FAILURES:
+                    # 有音频没有送达，会后流水线必须回退为完整转写
+                    self.healthy = False
+                if final:
+                    return
+                continue
+            sent_bytes += len(buffer)
+            buffer.clear()
+            segments = result.get("segments", [])
+            if result.get("language"):
+                self.languages[result["language"]] += 1
+            if segments:
+                if await append_meeting_minutes(self.meeting_id, segments, result.get("language")):
+                    self.segment_count += len(segments)
+                else:
+                    self.healthy = False
+            if final:
+                return
@@ -1,146 +1,371 @@
 import os
 import asyncio
-import subprocess
 import shutil
 from pathlib import Path
-from typing import Dict, List
-import httpx
+from typing import Dict, List, Optional
 import pytz
 
-from static.meeting import insert_meeting_minutes, insert_meeting_record
+from utils.live_encoder import HLS_PLAYLIST, LiveEncoder, concat_segments, segment_dir
+from utils.frame_worker import FrameWorker
+from utils.audio_writer import BatchedAudioWriter
+from utils.encode_scheduler import encode_scheduler
+from utils.recording_catalog import recording_catalog
 from utils.record_notificator import record_notificator
+from utils.meeting_pipeline import TEMPS_DIR, TRANSCRIBE_BASE_URL, PipelineJob, meeting_pipeline, write_session_manifest
+from utils.live_transcriber import LIVE_TRANSCRIBE, LiveTranscriber
+from utils.bot_registry import BOT_WORKER_ID, bot_registry
+from utils.admission import admission
+from utils.metrics import RateMeter, metrics
+from utils.recording_governor import RecordingProfile, recording_governor
 from livekit import api as livekit_api, rtc as livekit_rtc
 
-import cv2
 import numpy as np
 from datetime import datetime, timezone
 from loguru import logger
-import wave
 import time
 
+VIDEO_FRAMES_RECEIVED = metrics.counter("llmeet_video_frames_received_total", "从 LiveKit 收到的视频帧")
+VIDEO_FRAMES_WRITTEN = metrics.counter("llmeet_video_frames_written_total", "已编码写入录像的视频帧")
+AUDIO_FRAMES_RECEIVED = metrics.counter("llmeet_audio_frames_received_total", "从 LiveKit 收到的音频帧")
+RECORDING_BYTES = metrics.counter("llmeet_recording_bytes_written_total", "已完成录制写入磁盘的字节数（录像 + ASR 旁路）")
+FINALIZE_SECONDS = metrics.histogram(
+    "llmeet_finalize_seconds", "录制收尾（flush 编码器、关闭文件、拼接分片）的耗时",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+FINALIZE_WAIT_SECONDS = metrics.histogram(
+    "llmeet_finalize_wait_seconds", "录制收尾在编码调度器中排队的时间",
+    buckets=(0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300),
+)
+
 # -----------------------------
 # 全局状态：支持多房间多 Bot
 # -----------------------------
 rooms: Dict[str, livekit_rtc.Room] = {}
 bot_tasks: Dict[str, asyncio.Task] = {}
 recording_sessions: Dict[str, Dict[str, 'RecordingSession']] = {}
+live_transcribers: Dict[str, LiveTranscriber] = {}
+bot_states: Dict[str, Dict] = {}
+
+# 音频到达时间超出连续排列位置这么多秒，视为断流（静音、网络中断），按到达时间重新对齐
+AUDIO_RESYNC_GAP = 0.5
+# fmp4：单个 fragmented MP4；hls：固定时长的 fMP4 分片 + 播放列表，会议中即可播放
+RECORDING_FORMAT = os.getenv("RECORDING_FORMAT", "fmp4")
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "6"))
+# 会话磁盘占用的刷新间隔（秒）
+DISK_MEASURE_INTERVAL = 5.0
 
 class RecordingSession:
-    def __init__(self, participant_identity: str, session_id: str, meeting_id: str):
+    def __init__(
+        self, participant_identity: str, session_id: str, meeting_id: str,
+        record_video: bool = True, profile: Optional[RecordingProfile] = None,
+    ):
         self.participant_identity = participant_identity
+        self.record_video = record_video
+        # 录制规格按参会者的视频来源和发布尺寸确定，不再统一放大到 1080p
+        self.profile = profile or recording_governor.profile_for(None)
+        self.video_track_sid: Optional[str] = None
+        self.video_task: Optional[asyncio.Task] = None
         self.session_id = session_id
         self.meeting_id = meeting_id
         self.start_time = time.time()
+        # 会话时钟：音视频 pts 都换算为相对 epoch 的秒数，同步由时间戳保证
+        self.epoch = time.monotonic()
         # 文件路径
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        temp_dir = Path(f"temps/{meeting_id}")
-        temp_dir.mkdir(parents=True, exist_ok=True)
         rec_dir = Path(f"recordings/{meeting_id}")
         rec_dir.mkdir(parents=True, exist_ok=True)
-        self.video_file = temp_dir / f"video_{participant_identity}_{timestamp}.avi"
-        self.audio_file = temp_dir / f"audio_{participant_identity}_{timestamp}.wav"
         self.final_file = rec_dir / f"final_{participant_identity}_{timestamp}.mp4"
+        # 16 kHz 单声道旁路音频，转写服务直接读取
+        self.asr_file = rec_dir / f"asr_{participant_identity}_{timestamp}.wav"
+        # 分段模式下编码器写播放列表和分片，结束时再拼接出 final_file 供后续流程使用
+        self.playlist: Optional[Path] = None
+        if RECORDING_FORMAT == "hls":
+            seg_dir = segment_dir(self.final_file)
+            seg_dir.mkdir(exist_ok=True)
+            self.playlist = seg_dir / HLS_PLAYLIST
 
-        self.video_writer = None
-        self.audio_writer = None
         self.is_recording = False
         self.video_frame_count = 0
+        self.video_frames_received = 0
         self.audio_frame_count = 0
-        self.expected_fps = 24
+        self.received_fps = RateMeter()
+        self.written_fps = RateMeter()
+        self.expected_fps = self.profile.fps
+        # 当前画面的录制尺寸；编码画布固定为会话开始时的规格
+        self.video_box = (self.profile.width, self.profile.height)
         self.audio_sample_rate = 48000
         self.final_files: List[Dict[str, str]] = []
+        self._video_offset: Optional[float] = None
+        self._next_video_pts = 0.0
+        self._audio_next_pts: Optional[float] = None
+        self.bytes_on_disk = 0
+        self._disk_measured_at = 0.0
+        # 会议中实时编码为 fragmented MP4，结束时只需关闭文件；preset/CRF 随当前编码负载调整
+        preset, crf = encode_scheduler.encoder_profile()
+        self.encoder = LiveEncoder(
+            self.playlist or self.final_file, width=self.profile.width, height=self.profile.height,
+            fps=self.expected_fps, sample_rate=self.audio_sample_rate,
+            preset=preset, crf=crf,
+            segment_seconds=HLS_SEGMENT_SECONDS if self.playlist else None,
+            video=record_video,
+        )
+        encode_scheduler.live_encoders += 1
+        self.audio_writer = BatchedAudioWriter(
+            self.encoder, self.asr_file, sample_rate=self.audio_sample_rate,
+        )
+        # 帧转换 / 编码在会话自己的线程中进行，避免阻塞事件循环
+        self.worker = FrameWorker(f"rec-{session_id}", self._write_video, self._write_audio)
+        self._write_manifest("recording")
+
+    def _write_manifest(self, state: str):
+        # Bot 崩溃后，启动清扫根据清单接管已写入的 fragmented MP4（或已完成的分片）
+        manifest = {
+            'meeting_id': self.meeting_id,
+            'username': self.participant_identity,
+            'path': str(self.final_file),
+            'asr_path': str(self.asr_file),
+            'state': state,
+        }
+        if self.playlist:
+            manifest['playlist'] = str(self.playlist)
+        write_session_manifest(self.meeting_id, self.session_id, manifest)
+
+    @property
+    def dropped_video_frames(self) -> int:
+        return self.worker.dropped_frames
+
+    def _measure_disk(self, final: bool = False):
+        """
+        统计已写入磁盘的字节数，只在写入线程中调用，抓取指标时直接读 bytes_on_disk。
+        录制中为 fragmented MP4 或媒体分片 + ASR 旁路；final=True 时只算最终文件和 ASR 旁路。
+        """
+        files = [self.final_file, self.asr_file]
+        if self.playlist and not final:
+            files.extend(f for f in self.playlist.parent.iterdir() if f.name != HLS_PLAYLIST)
+        total = 0
+        for f in files:
+            try:
+                total += f.stat().st_size
+            except OSError:
+                pass
+        self.bytes_on_disk = total
+        self._disk_measured_at = time.monotonic()
+
+    def video_pts(self, timestamp_us: int) -> float:
+        """把 LiveKit 帧时间戳换算为会话时钟上的 pts：首帧按到达时间对齐，之后保持原始帧间隔"""
+        ts = timestamp_us / 1e6
+        if self._video_offset is None:
+            self._video_offset = (time.monotonic() - self.epoch) - ts
+        return ts + self._video_offset
+
+    def switch_video(self, track_sid: str, profile: Optional[RecordingProfile] = None):
+        """
+        切换录制的画面轨道：新轨道的 timestamp_us 是另一套时钟，首帧重新按到达时间对齐。
+        来源、帧率上限和画面尺寸随新轨道更新；编码画布尺寸不变，画面等比缩放后由编码器加黑边。
+        """
+        self.video_track_sid = track_sid
+        self._video_offset = None
+        self._next_video_pts = 0.0
+        if profile is not None:
+            self.video_box = (profile.width, profile.height)
+            self.profile = profile._replace(width=self.profile.width, height=self.profile.height)
+            self.expected_fps = self.profile.fps
+
+    def accept_video(self, pts: float) -> bool:
+        """按当前帧率上限（受 CPU 调节器影响）抽帧，超出的帧在入队前丢弃"""
+        interval = 1.0 / recording_governor.fps_for(self.profile)
+        if pts + interval / 4 < self._next_video_pts:
+            return False
+        self._next_video_pts = max(self._next_video_pts, pts - interval / 2) + interval
+        return True
+
+    def audio_pts(self, samples: int) -> float:
+        """音频帧不带时间戳：按采样数连续排列，首帧或断流后按到达时间重新对齐"""
+        duration = samples / self.audio_sample_rate
+        arrived = time.monotonic() - self.epoch - duration
+        if self._audio_next_pts is None or arrived - self._audio_next_pts > AUDIO_RESYNC_GAP:
+            self._audio_next_pts = max(arrived, self._audio_next_pts or 0.0)
+        pts = self._audio_next_pts
+        self._audio_next_pts += duration
+        return pts
+
+    def _write_video(self, frame, pts: float):
+        # 运行在 FrameWorker 线程中
+        arr = np.frombuffer(frame.data, np.uint8).reshape((frame.height, frame.width, 3))
+        self.encoder.encode_video(arr, pts, self.video_box)
+        self.video_frame_count += 1
+        self.written_fps.mark()
+        VIDEO_FRAMES_WRITTEN.inc()
+        self._refresh_disk()
+
+    def _write_audio(self, data: bytes, pts: float):
+        self.audio_writer.write(data, pts)
+        self.audio_frame_count += 1
+        self._refresh_disk()
+
+    def _refresh_disk(self):
+        # 在写入线程里定期刷新磁盘占用，抓取指标时不在事件循环上 stat
+        if time.monotonic() - self._disk_measured_at > DISK_MEASURE_INTERVAL:
+            self._measure_disk()
+
+    def _finish_encoding(self, queued_at: float):
+        # 阻塞：等 FrameWorker 处理完积压的帧，再 flush 编码器并关闭文件
+        FINALIZE_WAIT_SECONDS.observe(time.monotonic() - queued_at)
+        with FINALIZE_SECONDS.time():
+            self.worker.stop()
+            self.audio_writer.close()
+            self.encoder.close()
+            if self.playlist and self.playlist.exists():
+                # 顺序拷贝分片即可得到完整 MP4，不涉及解码；分片目录保留用于回放
+                concat_segments(self.playlist, self.final_file)
+            self._measure_disk(final=True)
 
     async def finalize_recording(self):
         self.is_recording = False
-        if self.video_writer:
-            self.video_writer.release()
-            self.video_writer = None
-        if self.audio_writer:
-            self.audio_writer.close()
-            self.audio_writer = None
-        # 合并
-        video_exists = self.video_file.exists() and self.video_file.stat().st_size > 0
-        audio_exists = self.audio_file.exists() and self.audio_file.stat().st_size > 0
-        if not (video_exists or audio_exists):
-            logger.error(f"[Recording] 无效音视频: {self.session_id}")
-            self.cleanup()
-            return
         try:
-            logger.info(f"[Recording] 合并开始: {self.final_file}")
-            await self._merge_audio_video(video_exists, audio_exists)
-            self.final_files.append({
-                'meeting_id': self.meeting_id,
-                'username': self.participant_identity,
-                'path': str(self.final_file)
-            })
+            # 收尾编码交给共享调度器限流，短录像优先
+            await encode_scheduler.run(
+                self._finish_encoding, time.monotonic(), priority=time.time() - self.start_time
+            )
+            if self.dropped_video_frames:
+                logger.warning(f"[Recording] {self.session_id} 编码跟不上，共丢弃 {self.dropped_video_frames} 帧")
+            if self.final_file.exists() and self.final_file.stat().st_size > 0:
+                rec = {
+                    'meeting_id': self.meeting_id,
+                    'username': self.participant_identity,
+                    'path': str(self.final_file)
+                }
+                if self.audio_frame_count and self.asr_file.exists():
+                    rec['asr_path'] = str(self.asr_file)
+                self.final_files.append(rec)
+                RECORDING_BYTES.inc(self.bytes_on_disk)
+                logger.info(f"[Recording] 录制完成: {self.final_file}")
+                try:
+                    await asyncio.to_thread(recording_catalog.add, self.final_file)
+                except Exception as e:
+                    # 漏登的文件由定期对账补上
+                    logger.warning(f"[Recording] 登记录制目录失败 {self.final_file}: {e}")
+            else:
+                logger.error(f"[Recording] 无效音视频: {self.session_id}")
         except Exception as e:
-            logger.error(f"[Recording] 合并失败 {self.session_id}: {e}")
+            logger.error(f"[Recording] 关闭编码器失败 {self.session_id}: {e}")
         finally:
-            self.cleanup()
-            logger.info(f"[Recording] 合并完成: {self.final_file}")
-
-    async def _merge_audio_video(self, video_exists: bool, audio_exists: bool):
-        # 获取时长
-        def probe(path, s):
-            cmd = ["ffprobe", "-v", "error", "-select_streams", f"{s}:0", 
-                   "-show_entries", "stream=duration", 
-                   "-of", "default=noprint_wrappers=1:nokey=1", str(path)]
-            r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            return float(r.stdout.strip() or 0)
-        vd = probe(self.video_file, 'v') if video_exists else 0
-        ad = probe(self.audio_file, 'a') if audio_exists else 0
-        atempo = None
-        if vd and ad > vd:
-            speed = ad / vd
-            factors = []
-            while speed > 2.0:
-                factors.append(2.0)
-                speed /= 2.0
-            factors.append(speed)
-            atempo = ",".join(f"atempo={f:.6f}" for f in factors)
-        # 构造 ffmpeg
-        cmd = ["ffmpeg", "-y", "-report", "-loglevel", "error"]
-        if video_exists:
-            cmd += ["-i", str(self.video_file)]
-        if audio_exists:
-            cmd += ["-i", str(self.audio_file)]
-        if atempo:
-            cmd += ["-filter:a", atempo]
-        if video_exists:
-            cmd += ["-c:v", "libx264"]
-        if audio_exists:
-            cmd += ["-c:a", "aac"]
-        cmd += ["-preset", "medium", "-crf", "23", "-shortest", str(self.final_file)]
-        loop = asyncio.get_event_loop()
-        def run_ff():
-            logger.info(f"[FFmpeg] 正在合并: {' '.join(cmd)}")
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            logger.info(f"[FFmpeg 输出] {result.stdout}")
-            return result
-        res = await loop.run_in_executor(None, run_ff)
-        if res.returncode != 0:
-            raise RuntimeError(f"FFmpeg 失败: {res.stderr}")
-
-    def cleanup(self):
-        try:
-            tmp = self.video_file.parent
-            if tmp.exists(): shutil.rmtree(tmp)
-        except Exception as e:
-            logger.warning(f"清理失败 {self.session_id}: {e}")
+            encode_scheduler.live_encoders -= 1
+            self._write_manifest("closed")
+
+# -----------------------------
+# 本进程内的 Bot 控制（多 worker 部署时由 Bot worker 进程通过内部接口调用）
+# -----------------------------
+async def _release_room(room_name: str):
+    bot_tasks.pop(room_name, None)
+    admission.release(room_name)
+    if bot_registry and BOT_WORKER_ID:
+        await asyncio.to_thread(bot_registry.release, room_name, BOT_WORKER_ID)
+        # 等待释放期间本进程又启动了该房间，重新登记归属
+        if room_name in bot_tasks:
+            await asyncio.to_thread(bot_registry.claim, room_name, BOT_WORKER_ID)
+    # 释放的名额交给排队中的会议，排队超时的会议不再启动
+    await _drop_expired()
+    while (queued := admission.next_queued()) is not None:
+        room, username, decision = queued
+        logger.info(f"[{room}] 排队结束，启动 Bot")
+        _launch(room, username, decision)
+
+async def _drop_expired(keep: Optional[str] = None):
+    """排队期间一直持有注册表中的归属，超时放弃时一并释放，其他 worker 才能接手；keep 为正在重新启动的房间"""
+    for room in admission.pop_expired():
+        if bot_registry and BOT_WORKER_ID and room != keep and room not in bot_tasks:
+            await asyncio.to_thread(bot_registry.release, room, BOT_WORKER_ID)
+
+def _launch(room_name: str, username: str, decision: Dict):
+    audio_only = decision["decision"] == "audio_only"
+    bot_tasks[room_name] = asyncio.create_task(run_bot(room_name, f"bot-{room_name}", username, audio_only))
+
+def playlist_url(meeting_id: str, playlist: Path) -> str:
+    return f"/meeting/hls/{meeting_id}/{playlist.parent.name}/{playlist.name}"
+
+async def start_bot(room_name: str, username: str) -> Dict:
+    if room_name in rooms and rooms[room_name].connection_state == livekit_rtc.ConnectionState.CONN_CONNECTED:
+        logger.info(f"[{room_name}] Bot 已连接，无需重复启动")
+        return {"status": "already connected", "room": room_name}
+    if bot_registry and BOT_WORKER_ID:
+        owner = await asyncio.to_thread(bot_registry.claim, room_name, BOT_WORKER_ID)
+        if owner != BOT_WORKER_ID:
+            return {"status": "owned", "room": room_name, "owner": owner}
+    if room_name in bot_tasks:
+        return {"status": "connecting", "room": room_name, "audio_only": admission.is_audio_only(room_name)}
+    # 超时的排队项不占队列名额
+    await _drop_expired(keep=room_name)
+    decision = admission.admit(room_name, username)
+    if decision["decision"] == "rejected":
+        if bot_registry and BOT_WORKER_ID:
+            await asyncio.to_thread(bot_registry.release, room_name, BOT_WORKER_ID)
+        return {"status": "rejected", "room": room_name, "reason": decision["reason"]}
+    if decision["decision"] == "queued":
+        return {"status": "queued", "room": room_name, "position": decision["position"]}
+    _launch(room_name, username, decision)
+    return {"status": "connecting", "room": room_name, "audio_only": decision["decision"] == "audio_only"}
+
+async def stop_bot(room_name: str) -> Dict:
+    if room_name not in bot_tasks:
+        return {"status": "not running", "room": room_name}
+    await shutdown_bot(room_name, bot_states.get(room_name, {}).get("max_participant", 0))
+    return {"status": "stopped", "room": room_name}
+
+def bot_status(meeting_id: Optional[str] = None) -> Dict:
+    if meeting_id:
+        rm = rooms.get(meeting_id)
+        sess = recording_sessions.get(meeting_id, {})
+        return {
+            "room": meeting_id,
+            "connected": bool(rm and rm.connection_state == livekit_rtc.ConnectionState.CONN_CONNECTED),
+            "queue_position": admission.position(meeting_id),
+            "audio_only": admission.is_audio_only(meeting_id),
+            "active_recordings": len(sess),
+            "pipeline": meeting_pipeline.status(meeting_id),
+            "recording_sessions": [
+                {"session_id": sid, "participant": s.participant_identity,
+                 "video_frames": s.video_frame_count, "audio_frames": s.audio_frame_count,
+                 "dropped_video_frames": s.dropped_video_frames,
+                 "pending_video_frames": s.worker.pending_frames,
+                 "playlist": playlist_url(meeting_id, s.playlist) if s.playlist else None,
+                 "profile": {**s.profile._asdict(), "fps_cap": recording_governor.fps_for(s.profile)},
+                 "duration": time.time() - s.start_time}
+                for sid, s in sess.items()
+            ]
+        }
+    return {"active_rooms": list(rooms.keys()), "encode_scheduler": encode_scheduler.stats(),
+            "capacity": admission.stats(), "governor": recording_governor.stats()}
 
 # -----------------------------
 # Bot 主逻辑 + 自动停止
 # -----------------------------
-async def run_bot(room_name: str, bot_identity: str, username: str):
+def _preferred_video_publication(p):
+    videos = [pub for pub in p.track_publications.values() if pub.kind == livekit_rtc.TrackKind.KIND_VIDEO]
+    screens = [pub for pub in videos if pub.source == livekit_rtc.TrackSource.SOURCE_SCREENSHARE]
+    return (screens or videos or [None])[0]
+
+def _start_video(session: "RecordingSession", track, pub):
+    # 同一会话只保留一个画面录制任务
+    if session.video_task and not session.video_task.done():
+        session.video_task.cancel()
+    session.switch_video(track.sid, recording_governor.profile_for(pub))
+    session.video_task = asyncio.create_task(record_video(track, session))
+
+async def run_bot(room_name: str, bot_identity: str, username: str, audio_only: bool = False):
     logger.info(f"[{room_name}][{username}] Bot 启动")
     sessions: Dict[str, RecordingSession] = {}
     recording_sessions[room_name] = sessions
+    transcriber = LiveTranscriber(room_name, TRANSCRIBE_BASE_URL) if LIVE_TRANSCRIBE else None
+    if transcriber:
+        live_transcribers[room_name] = transcriber
     # 生成 token
     api_key = os.getenv("LIVEKIT_API_KEY")
     api_secret = os.getenv("LIVEKIT_API_SECRET")
     livekit_url = os.getenv("LIVEKIT_URL")
     if not (api_key and api_secret and livekit_url):
         logger.error("缺少 LiveKit 配置")
+        await _release_room(room_name)
         return
     token = (
         livekit_api.AccessToken()
@@ -152,6 +377,7 @@ async def run_bot(room_name: str, bot_identity: str, username: str):
     # 连接
     room = livekit_rtc.Room()
     state = {"max_participant": 0}
+    bot_states[room_name] = state
     rooms[room_name] = room
     @room.on("participant_connected")
     def on_join(p):
@@ -169,17 +395,40 @@ async def run_bot(room_name: str, bot_identity: str, username: str):
     def on_track(track, pub, p):
         sid = f"{p.identity}_{p.sid}"
         if sid not in sessions:
-            sessions[sid] = RecordingSession(p.identity, sid, room_name)
+            # 会议已降级或当前视频录制资源紧张时，新参会者只录音频
+            record_video = not audio_only and admission.video_pressure() is None
+            profile = recording_governor.profile_for(_preferred_video_publication(p))
+            sessions[sid] = RecordingSession(p.identity, sid, room_name, record_video, profile)
+            if transcriber:
+                sessions[sid].audio_writer.on_asr_pcm = transcriber.attach(sessions[sid])
         sess = sessions[sid]
         sess.is_recording = True
         if track.kind == livekit_rtc.TrackKind.KIND_VIDEO:
-            asyncio.create_task(record_video(track, sess))
+            # 每个会话只录一路画面：屏幕共享优先于摄像头
+            is_screen = pub.source == livekit_rtc.TrackSource.SOURCE_SCREENSHARE
+            if sess.record_video and (sess.video_track_sid is None or is_screen):
+                _start_video(sess, track, pub)
         else:
             asyncio.create_task(record_audio(track, sess))
+    @room.on("track_unsubscribed")
+    def on_untrack(track, pub, p):
+        sess = sessions.get(f"{p.identity}_{p.sid}")
+        if not sess or sess.video_track_sid != track.sid:
+            return
+        sess.video_track_sid = None
+        # 屏幕共享结束：回到该参会者仍在订阅的另一路画面（通常是摄像头）
+        fallback = [
+            other for other in p.track_publications.values()
+            if other.kind == livekit_rtc.TrackKind.KIND_VIDEO and other.track and other.track.sid != track.sid
+        ]
+        if fallback and sess.is_recording:
+            _start_video(sess, fallback[0].track, fallback[0])
     try:
         await room.connect(livekit_url, token)
     except Exception as e:
         logger.error(f"连接失败 {room_name}: {e}")
+        rooms.pop(room_name, None)
+        await _release_room(room_name)
         return
     try:
         while True:
@@ -194,97 +443,110 @@ async def shutdown_bot(room_name: str, max_participant: int):
         try: await task
         except: pass
     sessions = recording_sessions.get(room_name, {})
-    await asyncio.gather(*(s.finalize_recording() for s in sessions.values()), return_exceptions=True)
-    for s in sessions.values():
-        for rec in s.final_files:
-            insert_meeting_record(rec['meeting_id'], rec['username'], rec['path'])
-    room = rooms.get(room_name)
-    if room: await room.disconnect()
-    # 2. 调用 AI 服务器做转写
-    files_to_send = [
-        (
-            "files",
-            (
-                Path(rec["path"]).name,                 # filename
-                open(rec["path"], "rb"),               # file obj
-                "video/mp4"                            # MIME type
-            )
-        )
-        for rec in recording_sessions[room_name].values()
-        for rec in rec.final_files
-    ]
+    finished = 0
 
-    # 如果想传 num_speakers，可作为 query param 或 form field
-    data = {"num_speakers": max_participant}
-
-    try:
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            resp = await client.post(
-                "http://localhost:6006/transcribe",
-                data=data,
-                files=files_to_send
-            )
-            resp.raise_for_status()
-            ai_result = resp.json()  # {'language':..., 'segments':[...]}
+    async def finalize(session: RecordingSession):
+        nonlocal finished
+        try:
+            await session.finalize_recording()
+        finally:
+            # 收尾编码进度：按已完成的会话数计算
+            finished += 1
+            await record_notificator.progress(room_name, "encoding", finished / len(sessions) * 100)
 
-    except Exception as e:
-        logger.error(f"[{room_name}] 调用 /transcribe 失败：{e}")
-        return
-    print(ai_result)
-    # 3. 将 AI 转写结果写入会议纪要
-    insert_meeting_minutes(
-        meeting_id=room_name,
-        segments=ai_result.get("segments", []),
-        language=ai_result.get("language", 'en'),
-        video_summarization=ai_result.get("video_summarization", "")
-    )
-    logger.info(f"[{room_name}] 已将转写结果写入会议纪要")
+    await asyncio.gather(*(finalize(s) for s in sessions.values()), return_exceptions=True)
+    room = rooms.get(room_name)
+    if room: await room.disconnect()
+    # 等待增量转写的最后一个窗口
+    transcriber = live_transcribers.pop(room_name, None)
+    if transcriber:
+        await transcriber.close()
+    records = [rec for s in sessions.values() for rec in s.final_files]
     bot_tasks.pop(room_name, None)
     rooms.pop(room_name, None)
     recording_sessions.pop(room_name, None)
+    bot_states.pop(room_name, None)
+    await _release_room(room_name)
     logger.info(f"[{room_name}] Bot 已完全停止")
-    await record_notificator.broadcast({
-        "event": "merge_complete",
-        "meeting_id": room_name,
-    })
+    if not records:
+        logger.error(f"[{room_name}] 没有可用的录制文件")
+        shutil.rmtree(TEMPS_DIR / room_name, ignore_errors=True)
+        return
+    # 登记录像 → 转写 → 写入纪要 → 通知，交给持久化的后台流水线
+    # 增量转写完整时，会后只需生成画面总结
+    live = bool(transcriber and transcriber.healthy and transcriber.segment_count)
+    meeting_pipeline.submit(PipelineJob(
+        room_name, records, max_participant,
+        live_transcript=live, language=transcriber.language if transcriber else None,
+    ))
 
-# 录制细节
+# 录制细节：事件循环上只计算 pts 并入队，转换与编码交给会话的 FrameWorker
 async def record_video(track, session: RecordingSession):
     stream = livekit_rtc.VideoStream(track, format=livekit_rtc.VideoBufferType.RGB24)
-    ts_list, last_ts, buffer = [], None, []
+    admission.video_tracks += 1
     try:
         async for ev in stream:
-            if not session.is_recording: break
-            ts = ev.timestamp_us / 1e6
-            if last_ts is not None: ts_list.append(ts - last_ts)
-            last_ts = ts
-            arr = np.frombuffer(ev.frame.data, np.uint8).reshape((ev.frame.height, ev.frame.width, 3))
-            frame = cv2.resize(cv2.cvtColor(arr, cv2.COLOR_RGB2BGR), (1920,1080))
-            buffer.append(frame)
-            if not session.video_writer and len(ts_list) >= 30:
-                fps = 1/(sum(ts_list)/len(ts_list))
-                h,w,_ = frame.shape
-                session.video_writer = cv2.VideoWriter(str(session.video_file), cv2.VideoWriter_fourcc(*"MJPG"), fps, (w,h))
-                for f in buffer: session.video_writer.write(f)
-                session.video_frame_count += len(buffer)
-                buffer.clear()
-            elif session.video_writer:
-                session.video_writer.write(frame)
-                session.video_frame_count += 1
+            # 会话切换到了另一路画面（如开始屏幕共享）
+            if not session.is_recording or session.video_track_sid != track.sid: break
+            session.video_frames_received += 1
+            session.received_fps.mark()
+            VIDEO_FRAMES_RECEIVED.inc()
+            pts = session.video_pts(ev.timestamp_us)
+            if session.accept_video(pts):
+                session.worker.submit_video(ev.frame, pts)
     finally:
+        admission.video_tracks -= 1
         await stream.aclose()
 
 async def record_audio(track, session: RecordingSession):
     stream = livekit_rtc.AudioStream(track, sample_rate=session.audio_sample_rate, num_channels=2)
-    session.audio_writer = wave.open(str(session.audio_file), 'wb')
-    session.audio_writer.setnchannels(2)
-    session.audio_writer.setsampwidth(2)
-    session.audio_writer.setframerate(session.audio_sample_rate)
+    admission.audio_tracks += 1
     try:
         async for ev in stream:
             if not session.is_recording: break
             if ev.frame and ev.frame.data:
-                session.audio_writer.writeframes(ev.frame.data.tobytes())
-                session.audio_frame_count += 1
+                AUDIO_FRAMES_RECEIVED.inc()
+                pts = session.audio_pts(ev.frame.samples_per_channel)
+                session.worker.submit_audio(ev.frame.data.tobytes(), pts)
     finally:
+        admission.audio_tracks -= 1
         await stream.aclose()
+
+# -----------------------------
+# 抓取时计算的会话 / 房间 / 进程级指标
+# -----------------------------
+@metrics.collector
+def _collect_recording_metrics():
+    per_session = {
+        "llmeet_session_video_frames_received": ("gauge", "会话收到的视频帧", lambda s: s.video_frames_received),
+        "llmeet_session_video_frames_written": ("gauge", "会话已编码的视频帧", lambda s: s.video_frame_count),
+        "llmeet_session_video_frames_dropped": ("gauge", "会话丢弃的视频帧", lambda s: s.dropped_video_frames),
+        "llmeet_session_video_frames_pending": ("gauge", "等待编码的视频帧", lambda s: s.worker.pending_frames),
+        "llmeet_session_received_fps": ("gauge", "最近 10 秒收到的帧率", lambda s: s.received_fps.rate()),
+        "llmeet_session_written_fps": ("gauge", "最近 10 秒编码写入的帧率", lambda s: s.written_fps.rate()),
+        "llmeet_session_audio_frames": ("gauge", "会话写入的音频帧", lambda s: s.audio_frame_count),
+        "llmeet_session_audio_underruns": ("gauge", "会话音频断流次数", lambda s: s.audio_writer.underruns),
+        "llmeet_session_disk_bytes": ("gauge", "会话已写入磁盘的字节数", lambda s: s.bytes_on_disk),
+    }
+    sessions = [(room, s) for room, sess in list(recording_sessions.items()) for s in list(sess.values())]
+    for name, (type_, help, value) in per_session.items():
+        yield name, type_, help, [
+            ({"room": room, "participant": s.participant_identity}, value(s)) for room, s in sessions
+        ]
+    yield "llmeet_room_sessions", "gauge", "房间内的录制会话数", [
+        ({"room": room, "audio_only": str(admission.is_audio_only(room)).lower()}, len(sess))
+        for room, sess in list(recording_sessions.items())
+    ]
+    stats = encode_scheduler.stats()
+    yield "llmeet_event_loop_lag_seconds", "gauge", "事件循环延迟（平滑值）", [({}, admission.loop_lag.lag)]
+    yield "llmeet_active_rooms", "gauge", "本进程正在录制的房间数", [({}, len(rooms))]
+    yield "llmeet_recording_tracks", "gauge", "正在录制的轨道数", [
+        ({"kind": "video"}, admission.video_tracks), ({"kind": "audio"}, admission.audio_tracks),
+    ]
+    yield "llmeet_admission_queue_depth", "gauge", "等待准入的会议数", [({}, admission.queue_length)]
+    yield "llmeet_admission_rejected_total", "counter", "因容量不足被拒绝的会议数", [({}, admission.rejected)]
+    yield "llmeet_encode_queue_depth", "gauge", "等待收尾编码的任务数", [({}, stats["queue_depth"])]
+    yield "llmeet_encode_running", "gauge", "正在执行的收尾编码任务数", [({}, stats["running"])]
+    yield "llmeet_live_encoders", "gauge", "实时编码器数量", [({}, stats["live_encoders"])]
+    yield "llmeet_process_cpu_ratio", "gauge", "本进程 CPU 占用（相对全部核）", [({}, recording_governor.cpu)]
+    yield "llmeet_governor_level", "gauge", "录制降级档位，0 为不降级", [({}, recording_governor.level)]
@@ -0,0 +1,146 @@
+import os
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from loguru import logger
+
+from utils.metrics import metrics
+
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://localhost:7000")
+# 模型服务一次只能跑很少的生成，连接数不必多，保持长连接即可
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+# 同一用户同时进行的生成数，超出直接返回 429，不在模型服务前排队
+LLM_STREAMS_PER_USER = int(os.getenv("LLM_STREAMS_PER_USER", "2"))
+# 生成 token 之间的最长间隔
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+
+LLM_STREAMS = metrics.counter("llmeet_llm_streams_total", "代理到模型服务的流式请求数", ["endpoint", "outcome"])
+LLM_REJECTED = metrics.counter("llmeet_llm_rejected_total", "因超出单用户并发上限被拒绝的请求数")
+
+
+class LLMProxy:
+    """
+    chat / summarization 代理：进程内共享一个带长连接池的 httpx 客户端（随应用生命周期创建和关闭），
+    按用户限制并发生成数。浏览器断开时 StreamingResponse 会取消生成器，
+    这里随之关闭上游响应，模型服务检测到断开后停止生成。
+    """
+
+    def __init__(self, base_url: str = LLM_BASE_URL):
+        self.base_url = base_url
+        self._client: Optional[httpx.AsyncClient] = None
+        self._active: Dict[str, int] = defaultdict(int)
+
+    def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+                timeout=httpx.Timeout(10.0, read=LLM_READ_TIMEOUT),
+            )
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    def _acquire(self, username: str):
+        if self._active[username] >= LLM_STREAMS_PER_USER:
+            LLM_REJECTED.inc()
+            raise HTTPException(status_code=429, detail="同时进行的生成过多，请等待当前回答结束")
+        self._active[username] += 1
+
+    def _release(self, username: str):
+        self._active[username] -= 1
+        if self._active[username] <= 0:
+            del self._active[username]
+
+    async def collect(self, path: str, payload: Dict[str, Any]) -> bytes:
+        """后台任务（会后流水线）使用：读完整个上游响应，不占用户的并发名额"""
+        self.start()
+        async with self._client.stream("POST", path, json=payload) as resp:
+            resp.raise_for_status()
+            return await resp.aread()
+
+    async def response(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        username: str,
+        on_complete: Optional[Callable[[bytes], Awaitable[Any]]] = None,
+    ) -> StreamingResponse:
+        """
+        先拿到上游响应头（非 200 时直接抛出 HTTPException），再返回逐块转发的 SSE 响应。
+        转发结束、出错或浏览器断开时释放该用户的并发名额并关闭上游连接。
+        on_complete 在上游完整结束（未被取消）后以全部响应体调用。
+        """
+        self.start()
+        self._acquire(username)
+        try:
+            request = self._client.build_request("POST", path, json=payload)
+            resp = await self._client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            self._release(username)
+            LLM_STREAMS.inc(endpoint=path, outcome="error")
+            raise HTTPException(status_code=502, detail=f"模型服务不可用: {e}")
+        if resp.status_code != 200:
+            detail = (await resp.aread()).decode(errors="replace")
+            await resp.aclose()
+            self._release(username)
+            LLM_STREAMS.inc(endpoint=path, outcome="error")
+            raise HTTPException(status_code=resp.status_code, detail=detail)
+        relay = _Relay(self, resp, path, username, on_complete)
+        # 断开发生在开始转发之前时生成器不会执行 finally，由 background 兜底收尾
+        return StreamingResponse(relay.iterate(), media_type="text/event-stream", background=BackgroundTask(relay.close))
+
+
+class _Relay:
+    def __init__(self, proxy: LLMProxy, resp: httpx.Response, path: str, username: str, on_complete=None):
+        self.proxy = proxy
+        self.on_complete = on_complete
+        self.body: List[bytes] = []
+        self.resp = resp
+        self.path = path
+        self.username = username
+        self.outcome = "cancelled"
+        self.closed = False
+
+    async def iterate(self) -> AsyncIterator[bytes]:
+        try:
+            # 按照 SSE（Server-Sent Events）标准，逐块转发
+            async for chunk in self.resp.aiter_bytes():
+                if self.on_complete:
+                    self.body.append(chunk)
+                yield chunk
+            self.outcome = "ok"
+            if self.on_complete:
+                try:
+                    await self.on_complete(b"".join(self.body))
+                except Exception as e:
+                    logger.warning(f"[LLM] {self.path} 结束回调失败: {e}")
+        except httpx.HTTPError as e:
+            self.outcome = "error"
+            logger.warning(f"[LLM] {self.path} 上游流中断: {e}")
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # 先释放名额：下面的 aclose 可能被取消（浏览器断开），之后不会再有机会释放
+        self.proxy._release(self.username)
+        LLM_STREAMS.inc(endpoint=self.path, outcome=self.outcome)
+        # 未读完就关闭会断开这条连接，模型服务据此停止生成
+        await self.resp.aclose()
+
+
+llm_proxy = LLMProxy()
+
+
+@metrics.collector
+def _collect_llm_metrics():
+    yield "llmeet_llm_active_streams", "gauge", "正在进行的流式生成数", [({}, sum(llm_proxy._active.values()))]
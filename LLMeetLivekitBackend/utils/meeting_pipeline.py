@@ -0,0 +1,392 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import aiofiles
+import httpx
+from loguru import logger
+
+from static.meeting import get_meeting_minutes, insert_meeting_minutes, insert_meeting_records, update_minutes_summary
+from utils.audio_writer import repair_wav_header
+from utils.live_encoder import concat_segments
+from utils.record_notificator import record_notificator
+from utils.recording_catalog import recording_catalog
+from utils.summarizer import ensure_summary
+
+# temps/<meeting_id>/ 下保存录制会话清单 session_*.json 和流水线状态 pipeline.json
+TEMPS_DIR = Path("temps")
+TRANSCRIBE_BASE_URL = os.getenv("TRANSCRIBE_BASE_URL", "http://localhost:6006")
+# shared：转写服务与后端共享录像存储，只发送路径，服务端原地读取
+# upload：远程服务，逐个文件分块流式上传（不整体读入内存），再按批次转写
+# multipart：旧的 /transcribe 多文件表单上传
+TRANSCRIBE_MODE = os.getenv("TRANSCRIBE_MODE", "upload")
+# 共享模式下本机录像根目录在转写服务上的挂载位置，例如 /data/recordings
+TRANSCRIBE_SHARED_ROOT = os.getenv("TRANSCRIBE_SHARED_ROOT")
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# 会议结束后的处理阶段，按顺序执行，每个阶段完成后都会落盘
+STAGES = ["register_records", "transcribe", "store_minutes", "summarize", "notify"]
+MAX_ATTEMPTS = {"register_records": 3, "transcribe": 3, "store_minutes": 5, "summarize": 1, "notify": 1}
+# 会后预先生成会议总结，用户打开会议时直接返回缓存
+PIPELINE_SUMMARIZE = os.getenv("PIPELINE_SUMMARIZE", "1") == "1"
+RETRY_BASE_DELAY = 10.0
+
+
+def _write_json(path: Path, data: Dict[str, Any]):
+    # 先写临时文件再替换，进程崩溃时不会留下半个 JSON
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False))
+    os.replace(tmp, path)
+
+
+def session_manifest_path(meeting_id: str, session_id: str) -> Path:
+    return TEMPS_DIR / meeting_id / f"session_{session_id}.json"
+
+
+def write_session_manifest(meeting_id: str, session_id: str, record: Dict[str, Any]):
+    """录制开始 / 结束时记录会话输出文件，Bot 崩溃后启动清扫据此接管"""
+    _write_json(session_manifest_path(meeting_id, session_id), record)
+
+
+def _shared_path(path: str) -> str:
+    """把本机 recordings/ 下的路径换算成转写服务上共享挂载的路径"""
+    p = Path(path).resolve()
+    if not TRANSCRIBE_SHARED_ROOT:
+        return str(p)
+    return str(Path(TRANSCRIBE_SHARED_ROOT) / p.relative_to(Path("recordings").resolve()))
+
+
+async def _iter_file(path: str):
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+            yield chunk
+
+
+class PipelineJob:
+    def __init__(
+        self,
+        meeting_id: str,
+        records: List[Dict[str, Any]],
+        num_speakers: int,
+        stage: str = STAGES[0],
+        status: str = "pending",
+        attempts: Optional[Dict[str, int]] = None,
+        result: Optional[Dict[str, Any]] = None,
+        last_error: Optional[str] = None,
+        updated_at: Optional[float] = None,
+        live_transcript: bool = False,
+        language: Optional[str] = None,
+        created_at: Optional[float] = None,
+    ):
+        self.meeting_id = meeting_id
+        self.records = records
+        self.num_speakers = num_speakers
+        self.stage = stage
+        self.status = status
+        self.attempts = attempts or {}
+        self.result = result
+        self.last_error = last_error
+        self.updated_at = updated_at or time.time()
+        # 任务创建时间在重试和恢复之间保持不变（旧状态文件没有该字段时取第一次加载时的值）
+        self.created_at = created_at or self.updated_at
+        # 会议中已经增量转写并写入 minutes，会后只需生成画面总结
+        self.live_transcript = live_transcript
+        self.language = language
+
+    @property
+    def path(self) -> Path:
+        return TEMPS_DIR / self.meeting_id / "pipeline.json"
+
+    @property
+    def batch_id(self) -> str:
+        """上传模式的批次 ID：每次重试都上传到同一个批次，覆盖上次未完成的文件"""
+        return f"{self.meeting_id}-{int(self.created_at)}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "meeting_id": self.meeting_id,
+            "records": self.records,
+            "num_speakers": self.num_speakers,
+            "stage": self.stage,
+            "status": self.status,
+            "attempts": self.attempts,
+            "result": self.result,
+            "last_error": self.last_error,
+            "updated_at": self.updated_at,
+            "live_transcript": self.live_transcript,
+            "language": self.language,
+            "created_at": self.created_at,
+        }
+
+    def save(self):
+        self.updated_at = time.time()
+        _write_json(self.path, self.to_dict())
+
+    @classmethod
+    def load(cls, path: Path) -> "PipelineJob":
+        return cls(**json.loads(path.read_text()))
+
+
+class MeetingPipeline:
+    """
+    会议结束后的持久化处理流水线：登记录像 → 转写 → 写入纪要 → 通知。
+    状态机保存在 temps/<meeting_id>/pipeline.json，每个阶段独立重试；
+    在后台 worker 中运行，不占用 Bot 任务。启动时清扫遗留目录，恢复未完成的任务。
+    """
+
+    def __init__(self, workers: int = 2):
+        self.num_workers = workers
+        self.jobs: Dict[str, PipelineJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self, is_active: Callable[[str], bool] = lambda _: False, sweep: bool = True):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        if sweep:
+            self.sweep(is_active)
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: PipelineJob):
+        job.save()
+        self.jobs[job.meeting_id] = job
+        self._queue.put_nowait(job)
+
+    def status(self, meeting_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(meeting_id)
+        if not job:
+            # 任务可能由其他进程执行：状态文件在共享的 temps 目录中
+            job_file = TEMPS_DIR / meeting_id / "pipeline.json"
+            if not job_file.exists():
+                return None
+            try:
+                job = PipelineJob.load(job_file)
+            except (OSError, ValueError):
+                return None
+        return {"stage": job.stage, "status": job.status, "attempts": job.attempts, "last_error": job.last_error}
+
+    # -----------------------------
+    # 启动清扫
+    # -----------------------------
+    def sweep(self, is_active: Callable[[str], bool]):
+        if not TEMPS_DIR.exists():
+            return
+        for d in TEMPS_DIR.iterdir():
+            if not d.is_dir() or is_active(d.name):
+                continue
+            try:
+                self._recover(d)
+            except Exception as e:
+                logger.error(f"[Pipeline] 清扫 {d} 失败: {e}")
+
+    def _recover(self, d: Path):
+        job_file = d / "pipeline.json"
+        if job_file.exists():
+            job = PipelineJob.load(job_file)
+            if job.status == "done":
+                shutil.rmtree(d, ignore_errors=True)
+            elif job.status == "failed":
+                self.jobs[job.meeting_id] = job
+                logger.warning(f"[Pipeline] {job.meeting_id} 上次在 {job.stage} 阶段失败，保留待人工处理")
+            else:
+                logger.info(f"[Pipeline] 恢复未完成任务 {job.meeting_id}（阶段 {job.stage}）")
+                self.submit(job)
+            return
+        # 没有流水线状态：Bot 在录制中或收尾前崩溃。fragmented MP4 已写入的分片可以直接使用
+        records = []
+        for manifest in d.glob("session_*.json"):
+            rec = json.loads(manifest.read_text())
+            playlist = rec.pop("playlist", None)
+            if playlist and Path(playlist).exists() and not Path(rec["path"]).exists():
+                # 分段录制来不及拼接：只使用播放列表中已登记的分片，最多丢失最后一个分片
+                concat_segments(Path(playlist), Path(rec["path"]))
+                recording_catalog.add(Path(rec["path"]))
+            if not (Path(rec["path"]).exists() and Path(rec["path"]).stat().st_size > 0):
+                continue
+            asr_path = rec.get("asr_path")
+            if asr_path and Path(asr_path).exists():
+                repair_wav_header(Path(asr_path))
+            else:
+                rec.pop("asr_path", None)
+            rec.pop("state", None)
+            records.append(rec)
+        if not records:
+            shutil.rmtree(d, ignore_errors=True)
+            return
+        logger.info(f"[Pipeline] 接管遗留录制 {d.name}：{len(records)} 个文件")
+        speakers = len({r["username"] for r in records})
+        self.submit(PipelineJob(d.name, records, speakers))
+
+    # -----------------------------
+    # 执行
+    # -----------------------------
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except Exception as e:
+                logger.error(f"[Pipeline] {job.meeting_id} 异常: {e}")
+
+    async def _run(self, job: PipelineJob):
+        job.status = "running"
+        while job.stage in STAGES:
+            stage = job.stage
+            await record_notificator.progress(job.meeting_id, stage, STAGES.index(stage) / len(STAGES) * 100)
+            try:
+                await getattr(self, f"_stage_{stage}")(job)
+            except Exception as e:
+                attempts = job.attempts.get(stage, 0) + 1
+                job.attempts[stage] = attempts
+                job.last_error = f"{stage}: {e}"
+                if attempts >= MAX_ATTEMPTS[stage]:
+                    job.status = "failed"
+                    job.save()
+                    logger.error(f"[Pipeline] {job.meeting_id} 阶段 {stage} 重试 {attempts} 次后失败: {e}")
+                    if stage == "transcribe":
+                        await self._discard_batch(job)
+                    await record_notificator.progress(
+                        job.meeting_id, stage, STAGES.index(stage) / len(STAGES) * 100, status="failed", error=str(e)
+                    )
+                    return
+                delay = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+                job.status = "pending"
+                job.save()
+                logger.warning(f"[Pipeline] {job.meeting_id} 阶段 {stage} 失败，{delay:.0f}s 后重试: {e}")
+                await record_notificator.progress(
+                    job.meeting_id, stage, STAGES.index(stage) / len(STAGES) * 100, status="retrying", retry_in=delay
+                )
+                # 延迟后重新入队，不占用 worker
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+                return
+            job.stage = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else "done"
+            job.save()
+        job.status = "done"
+        job.save()
+        await record_notificator.progress(job.meeting_id, "done", 100)
+        shutil.rmtree(job.path.parent, ignore_errors=True)
+        logger.info(f"[Pipeline] {job.meeting_id} 处理完成")
+
+    async def _stage_register_records(self, job: PipelineJob):
+        pending = [rec for rec in job.records if not rec.get("registered")]
+        if not pending:
+            return
+        # 一个事务批量登记，失败时整体回滚，重试不会产生重复记录
+        registered = await insert_meeting_records(
+            [{"meeting_id": r["meeting_id"], "username": r["username"], "path": r["path"]} for r in pending]
+        )
+        if registered is None:
+            raise RuntimeError("insert_meeting_records 失败")
+        # 用户不属于该会议的文件不会被登记，这类记录不阻塞后续阶段
+        for rec in pending:
+            rec["registered"] = rec["path"] in registered
+        job.save()
+
+    async def _stage_transcribe(self, job: PipelineJob):
+        if job.result is not None:
+            return
+        files = []
+        for rec in job.records:
+            files.append((rec["path"], "video/mp4"))
+            # 旁路 16 kHz 音频：转写服务据此跳过 MP4 解码与重采样
+            if rec.get("asr_path"):
+                files.append((rec["asr_path"], "audio/wav"))
+        async with httpx.AsyncClient(base_url=TRANSCRIBE_BASE_URL, timeout=300.0) as client:
+            if TRANSCRIBE_MODE == "shared":
+                resp = await client.post("/transcribe_paths", json={
+                    "paths": [_shared_path(p) for p, _ in files],
+                    "num_speakers": job.num_speakers,
+                    "video_only": job.live_transcript,
+                })
+            elif TRANSCRIBE_MODE == "upload":
+                batch_id = job.batch_id
+                for path, mime in files:
+                    r = await client.put(
+                        f"/uploads/{batch_id}/{Path(path).name}",
+                        content=_iter_file(path),
+                        headers={"Content-Type": mime},
+                    )
+                    r.raise_for_status()
+                resp = await client.post("/transcribe_paths", json={
+                    "batch_id": batch_id,
+                    "num_speakers": job.num_speakers,
+                    "video_only": job.live_transcript,
+                })
+            else:
+                # 旧接口不支持只做画面总结，完整转写的结果会覆盖增量片段
+                job.live_transcript = False
+                with ExitStack() as stack:
+                    files_to_send = [
+                        ("files", (Path(p).name, stack.enter_context(open(p, "rb")), mime))
+                        for p, mime in files
+                    ]
+                    resp = await client.post("/transcribe", data={"num_speakers": job.num_speakers}, files=files_to_send)
+            resp.raise_for_status()
+            job.result = resp.json()  # {'language':..., 'segments':[...]}
+
+    async def _discard_batch(self, job: PipelineJob):
+        """转写最终失败时删除转写服务上已上传的批次，不在对端遗留录像"""
+        if TRANSCRIBE_MODE != "upload":
+            return
+        try:
+            async with httpx.AsyncClient(base_url=TRANSCRIBE_BASE_URL, timeout=30.0) as client:
+                (await client.delete(f"/uploads/{job.batch_id}")).raise_for_status()
+        except Exception as e:
+            logger.warning(f"[{job.meeting_id}] 删除上传批次 {job.batch_id} 失败: {e}")
+
+    async def _stage_store_minutes(self, job: PipelineJob):
+        if job.live_transcript:
+            # 增量片段已逐条写入 minute_segments（查询时按时间排序），只需补上画面总结
+            ok = await update_minutes_summary(
+                job.meeting_id,
+                video_summarization=job.result.get("video_summarization", ""),
+                language=job.language,
+            )
+            if not ok:
+                raise RuntimeError("update_minutes_summary 失败")
+        else:
+            ok = await insert_meeting_minutes(
+                meeting_id=job.meeting_id,
+                segments=job.result.get("segments", []),
+                language=job.result.get("language") or 'en',
+                video_summarization=job.result.get("video_summarization", "")
+            )
+            if not ok:
+                raise RuntimeError("insert_meeting_minutes 失败")
+        logger.info(f"[{job.meeting_id}] 已将转写结果写入会议纪要")
+
+    async def _stage_summarize(self, job: PipelineJob):
+        # 总结只是加速，失败时不阻塞通知，用户打开会议时会再生成
+        if not PIPELINE_SUMMARIZE:
+            return
+        try:
+            minutes = await get_meeting_minutes(job.meeting_id)
+            if minutes is None:
+                return
+            await ensure_summary(job.meeting_id, minutes["segments"], minutes["video_summarization"] or "")
+        except Exception as e:
+            logger.warning(f"[{job.meeting_id}] 预生成会议总结失败: {e}")
+
+    async def _stage_notify(self, job: PipelineJob):
+        # 通知失败不影响已经写入的纪要
+        try:
+            await record_notificator.broadcast({
+                "event": "merge_complete",
+                "meeting_id": job.meeting_id,
+            })
+        except Exception as e:
+            logger.warning(f"[{job.meeting_id}] 通知客户端失败: {e}")
+
+
+meeting_pipeline = MeetingPipeline(int(os.getenv("PIPELINE_WORKERS", "2")))
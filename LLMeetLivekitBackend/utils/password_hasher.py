@@ -0,0 +1,109 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from loguru import logger
+from passlib.context import CryptContext
+
+from utils.metrics import metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt 是纯 CPU 计算，放到独立进程中，既不占用共享线程池，也不受 GIL 限制
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(2, os.cpu_count() or 1))))
+# 允许排队的哈希任务数，超出直接返回 503，登录洪峰不会无限堆积
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+
+BCRYPT_WAIT_SECONDS = metrics.histogram("llmeet_bcrypt_queue_wait_seconds", "bcrypt 任务等待空闲进程的时间")
+BCRYPT_SECONDS = metrics.histogram("llmeet_bcrypt_seconds", "单次 bcrypt 计算耗时", ["op"])
+BCRYPT_REJECTED = metrics.counter("llmeet_bcrypt_rejected_total", "因排队已满被拒绝的 bcrypt 任务数")
+BCRYPT_POOL_RESTARTS = metrics.counter("llmeet_bcrypt_pool_restarts_total", "子进程异常退出后重建进程池的次数")
+
+
+def _timed(fn: Callable, *args) -> Tuple[Any, float, float]:
+    # 在子进程中执行：返回结果以及开始、结束的时间戳，用于在主进程中统计排队和计算耗时
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify(plain: str, hashed: str) -> bool:
+    return pwd_context.verify(plain, hashed)
+
+
+class PasswordHasher:
+    """有界的 bcrypt 进程池：pending 统计已提交但未完成的任务"""
+
+    def __init__(self, workers: int = BCRYPT_WORKERS, max_pending: int = BCRYPT_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._pool is None:
+            # spawn：不从带着事件循环和数据库线程的父进程 fork
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        # 同一个坏掉的池上失败的并发任务只重建一次
+        if self._pool is broken:
+            logger.warning("[PasswordHasher] bcrypt 子进程异常退出，重建进程池")
+            BCRYPT_POOL_RESTARTS.inc()
+            self.close()
+            self.start()
+
+    async def _run(self, op: str, fn: Callable, *args):
+        if self.pending >= self.max_pending:
+            BCRYPT_REJECTED.inc()
+            raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        self.start()
+        self.pending += 1
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._pool
+            try:
+                result, started, finished = await loop.run_in_executor(pool, _timed, fn, *args)
+            except BrokenProcessPool:
+                # 子进程被杀（OOM 等）后整个池不可用：换一个新池重试一次，仍失败时返回 503
+                self._restart(pool)
+                try:
+                    result, started, finished = await loop.run_in_executor(self._pool, _timed, fn, *args)
+                except BrokenProcessPool:
+                    self._restart(self._pool)
+                    raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试")
+        finally:
+            self.pending -= 1
+        BCRYPT_WAIT_SECONDS.observe(max(0.0, started - submitted))
+        BCRYPT_SECONDS.observe(finished - started, op=op)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, password)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run("verify", _verify, plain, hashed)
+
+
+password_hasher = PasswordHasher()
+
+
+@metrics.collector
+def _collect_bcrypt_metrics():
+    yield "llmeet_bcrypt_workers", "gauge", "bcrypt 进程数", [({}, password_hasher.workers)]
+    yield "llmeet_bcrypt_pending", "gauge", "已提交但未完成的 bcrypt 任务数", [({}, password_hasher.pending)]
@@ -1,23 +1,133 @@
-
+import asyncio
 import json
-from typing import List
+from typing import Callable, Dict, Iterable, Optional, Set
 from fastapi import WebSocket
+from loguru import logger
+
+from utils.metrics import metrics
+
+# 每个客户端最多积压的消息数，超出说明客户端读得太慢，直接断开
+CLIENT_QUEUE_SIZE = 64
+# 单条消息发送超时，半断开的连接不会一直占着发送协程
+SEND_TIMEOUT = 5.0
+
+NOTIFY_MESSAGES = metrics.counter("llmeet_notify_messages_total", "投递到客户端发送队列的消息数")
+NOTIFY_EVICTIONS = metrics.counter("llmeet_notify_evictions_total", "因积压或发送超时被断开的客户端数", ["reason"])
+
+
+class _Client:
+    """一个 WebSocket 连接：独立的有界发送队列和发送协程，topics 为 None 表示订阅全部会议"""
+
+    def __init__(self, ws: WebSocket, topics: Optional[Set[str]]):
+        self.ws = ws
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.sender: Optional[asyncio.Task] = None
+
+    def wants(self, meeting_id: Optional[str]) -> bool:
+        return self.topics is None or meeting_id is None or meeting_id in self.topics
 
 
 class RecordNotificator:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, _Client] = {}
+        # Bot worker 进程没有 WebSocket 客户端：设置后消息转交给 API worker 广播
+        self.forward: Optional[Callable[[dict], None]] = None
 
-    async def connect(self, ws: WebSocket):
+    async def connect(self, ws: WebSocket, meeting_ids: Optional[Iterable[str]] = None):
         await ws.accept()
-        self.active_connections.append(ws)
+        client = _Client(ws, set(meeting_ids) if meeting_ids else None)
+        client.sender = asyncio.create_task(self._send_loop(client))
+        self.clients[ws] = client
 
     def disconnect(self, ws: WebSocket):
-        self.active_connections.remove(ws)
+        client = self.clients.pop(ws, None)
+        if client and client.sender:
+            client.sender.cancel()
+
+    def subscribe(self, ws: WebSocket, meeting_ids: Iterable[str]):
+        client = self.clients.get(ws)
+        # topics 为 None 的客户端已订阅全部会议，不能收窄为只订阅这几个
+        if client and client.topics is not None:
+            client.topics |= set(meeting_ids)
+
+    def unsubscribe(self, ws: WebSocket, meeting_ids: Iterable[str]):
+        client = self.clients.get(ws)
+        if client and client.topics is not None:
+            client.topics -= set(meeting_ids)
+
+    async def _send_loop(self, client: _Client):
+        try:
+            while True:
+                payload = await client.queue.get()
+                await asyncio.wait_for(client.ws.send_text(payload), SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            self._evict(client, "timeout")
+        except Exception:
+            # 连接已断开，由接收循环或这里清理
+            self.clients.pop(client.ws, None)
+
+    def _evict(self, client: _Client, reason: str):
+        if self.clients.pop(client.ws, None) is None:
+            return
+        NOTIFY_EVICTIONS.inc(reason=reason)
+        logger.warning(f"[RecordNotificator] 客户端处理过慢（{reason}），断开连接")
+        if client.sender and client.sender is not asyncio.current_task():
+            client.sender.cancel()
+        # 1013：稍后重试
+        asyncio.ensure_future(client.ws.close(code=1013))
 
     async def broadcast(self, message: dict):
+        """只放入订阅了该会议的客户端的发送队列，不等待任何一个客户端"""
+        if self.forward:
+            await asyncio.to_thread(self.forward, message)
+            return
         payload = json.dumps(message)
-        for ws in self.active_connections:
-            await ws.send_text(payload)
+        meeting_id = message.get("meeting_id")
+        for client in list(self.clients.values()):
+            if not client.wants(meeting_id):
+                continue
+            try:
+                client.queue.put_nowait(payload)
+                NOTIFY_MESSAGES.inc()
+            except asyncio.QueueFull:
+                self._evict(client, "queue_full")
+
+    async def progress(self, meeting_id: str, stage: str, percent: float, **extra):
+        """会后处理进度（收尾编码、流水线各阶段），客户端不必再轮询 /meeting/status"""
+        try:
+            await self.broadcast({
+                "event": "progress",
+                "meeting_id": meeting_id,
+                "stage": stage,
+                "percent": round(percent, 1),
+                **extra,
+            })
+        except Exception as e:
+            logger.warning(f"[{meeting_id}] 推送进度失败: {e}")
+
+    async def relay(self, read_events, interval: float = 1.0):
+        """API worker 中轮询 Bot worker 发布的事件并广播给本进程的客户端"""
+        cursor = None
+        while True:
+            try:
+                events, cursor = await asyncio.to_thread(read_events, cursor)
+                for event in events:
+                    await self.broadcast(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[RecordNotificator] 读取事件失败: {e}")
+            await asyncio.sleep(interval)
+
+record_notificator = RecordNotificator()
+
 
-record_notificator = RecordNotificator()
\ No newline at end of file
+@metrics.collector
+def _collect_notify_metrics():
+    yield "llmeet_notify_clients", "gauge", "已连接的 WebSocket 客户端数", [({}, len(record_notificator.clients))]
+    yield "llmeet_notify_queued", "gauge", "客户端发送队列中积压的消息总数", [
+        ({}, sum(c.queue.qsize() for c in record_notificator.clients.values()))
+    ]
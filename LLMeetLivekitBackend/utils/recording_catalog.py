@@ -0,0 +1,205 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import av
+from loguru import logger
+
+RECORDINGS_DIR = Path("recordings")
+RECORDING_CATALOG_PATH = os.getenv("RECORDING_CATALOG_PATH", "temps/recordings.db")
+# 对账间隔：补登 Bot 之外新增的文件，删除已不存在的条目
+RECONCILE_INTERVAL = float(os.getenv("RECORDING_RECONCILE_INTERVAL", "600"))
+# fragmented MP4 录制中也叫 final_*.mp4，最近仍在写入的文件留给 finalize 登记
+RECONCILE_GRACE = 120.0
+
+COLUMNS = [
+    "path", "meeting_id", "filename", "username", "size", "duration",
+    "video_codec", "audio_codec", "width", "height", "created_at", "modified_at",
+]
+
+
+def _username(path: Path) -> str:
+    # final_<identity>_<YYYYmmdd>_<HHMMSS>.mp4
+    return path.stem[len("final_"):].rsplit("_", 2)[0]
+
+
+def probe(path: Path) -> Dict[str, Any]:
+    """读取容器头部得到时长、编码和分辨率，不解码"""
+    info: Dict[str, Any] = {"duration": None, "video_codec": None, "audio_codec": None, "width": None, "height": None}
+    try:
+        with av.open(str(path)) as container:
+            if container.duration is not None:
+                info["duration"] = round(container.duration / av.time_base, 3)
+            if container.streams.video:
+                stream = container.streams.video[0]
+                info["video_codec"] = stream.codec_context.name
+                info["width"], info["height"] = stream.codec_context.width, stream.codec_context.height
+            if container.streams.audio:
+                info["audio_codec"] = container.streams.audio[0].codec_context.name
+    except Exception as e:
+        logger.warning(f"[Catalog] 读取 {path} 信息失败: {e}")
+    return info
+
+
+class RecordingCatalog:
+    """
+    录制文件目录：finalize 时登记，列表接口直接查询，不再每次遍历 recordings/。
+    与 Bot 登记表一样使用本机共享的 SQLite 文件（WAL），API 与 Bot worker 进程都可读写。
+    """
+
+    def __init__(self, path: str = RECORDING_CATALOG_PATH, root: Path = RECORDINGS_DIR):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.root = root
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS recordings (
+                    path TEXT PRIMARY KEY, meeting_id TEXT NOT NULL, filename TEXT NOT NULL, username TEXT NOT NULL,
+                    size INTEGER NOT NULL, duration REAL, video_codec TEXT, audio_codec TEXT,
+                    width INTEGER, height INTEGER, created_at REAL NOT NULL, modified_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_recordings_created ON recordings (created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_recordings_meeting ON recordings (meeting_id, created_at DESC);
+                CREATE INDEX IF NOT EXISTS idx_recordings_username ON recordings (username, created_at DESC);
+            """)
+
+    def add(self, path: Path, st: Optional[os.stat_result] = None):
+        """登记（或更新）一个录制文件，会读取容器头部，应在线程中调用"""
+        st = st or path.stat()
+        row = {
+            "path": str(path),
+            "meeting_id": path.parent.name,
+            "filename": path.name,
+            "username": _username(path),
+            "size": st.st_size,
+            **probe(path),
+            "created_at": st.st_ctime,
+            "modified_at": st.st_mtime,
+        }
+        placeholders = ", ".join("?" * len(COLUMNS))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO recordings ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                [row[c] for c in COLUMNS],
+            )
+
+    def remove(self, path: Path):
+        with self._lock:
+            self._conn.execute("DELETE FROM recordings WHERE path = ?", (str(path),))
+
+    def query(
+        self,
+        meeting_id: Optional[str] = None,
+        username: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """按创建时间倒序分页，返回 (当前页, 筛选后的总数)"""
+        where, params = self._filters(meeting_id, username, since, until)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM recordings {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM recordings {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [dict(zip(COLUMNS, r)) for r in rows], total
+
+    def meetings(
+        self,
+        username: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """按会议汇总：文件数、总大小、总时长、最近一次录制时间"""
+        where, params = self._filters(None, username, since, until)
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(DISTINCT meeting_id) FROM recordings {where}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"""
+                SELECT meeting_id, COUNT(*), SUM(size), SUM(duration), MAX(created_at)
+                FROM recordings {where}
+                GROUP BY meeting_id ORDER BY MAX(created_at) DESC LIMIT ? OFFSET ?
+                """,
+                params + [limit, offset],
+            ).fetchall()
+        keys = ["meeting_id", "files", "size", "duration", "created_at"]
+        return [dict(zip(keys, r)) for r in rows], total
+
+    @staticmethod
+    def _filters(meeting_id, username, since, until) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for clause, value in (
+            ("meeting_id = ?", meeting_id),
+            ("username = ?", username),
+            ("created_at >= ?", since),
+            ("created_at < ?", until),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def reconcile(self) -> Tuple[int, int]:
+        """与磁盘对账：登记新增或被改动的文件，删除已不存在的条目，返回 (登记数, 删除数)"""
+        with self._lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self._conn.execute("SELECT path, size, modified_at FROM recordings")
+            }
+        added, seen = 0, set()
+        cutoff = time.time() - RECONCILE_GRACE
+        if self.root.exists():
+            for meeting_dir in os.scandir(self.root):
+                if not meeting_dir.is_dir():
+                    continue
+                for entry in os.scandir(meeting_dir.path):
+                    if not (entry.name.startswith("final_") and entry.name.endswith(".mp4")):
+                        continue
+                    path = str(Path(entry.path))
+                    seen.add(path)
+                    st = entry.stat()
+                    if known.get(path) == (st.st_size, st.st_mtime) or st.st_mtime > cutoff or not st.st_size:
+                        continue
+                    self.add(Path(path), st)
+                    added += 1
+        removed = [path for path in known if path not in seen]
+        if removed:
+            with self._lock:
+                self._conn.executemany("DELETE FROM recordings WHERE path = ?", [(p,) for p in removed])
+        return added, len(removed)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                added, removed = await asyncio.to_thread(self.reconcile)
+                if added or removed:
+                    logger.info(f"[Catalog] 对账完成：登记 {added} 个文件，移除 {removed} 个条目")
+            except Exception as e:
+                logger.error(f"[Catalog] 对账失败: {e}")
+            await asyncio.sleep(RECONCILE_INTERVAL)
+
+
+recording_catalog = RecordingCatalog()
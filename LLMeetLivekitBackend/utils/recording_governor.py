@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from livekit import rtc as livekit_rtc
+from loguru import logger
+
+from utils.admission import admission
+
+
+class RecordingProfile(NamedTuple):
+    width: int
+    height: int
+    fps: int
+    source: str
+
+
+def _cap(env: str, default: str) -> Tuple[int, int, int]:
+    w, h, fps = os.getenv(env, default).split("x")
+    return int(w), int(h), int(fps)
+
+
+# 各类轨道的录制上限（宽x高x帧率）：摄像头画面不需要 1080p，屏幕共享需要清晰度但帧率可以很低
+TRACK_CAPS: Dict[str, Tuple[int, int, int]] = {
+    "camera": _cap("CAMERA_RECORDING_CAP", "1280x720x24"),
+    "screen_share": _cap("SCREEN_RECORDING_CAP", "1920x1080x15"),
+}
+# 只有音频轨道或拿不到发布尺寸时使用的默认值
+DEFAULT_SIZE = (1280, 720)
+MIN_FPS = 5
+MIN_SHORT_SIDE = 180
+
+# 降级档位：(帧率系数, 分辨率系数)。帧率对正在录制的会话立即生效，分辨率只影响新开的编码器
+GOVERNOR_LEVELS: List[Tuple[float, float]] = [
+    (1.0, 1.0),
+    (0.75, 1.0),
+    (0.5, 1.0),
+    (0.5, 0.75),
+    (0.35, 0.5),
+]
+# 本进程允许使用的 CPU 比例（相对全部核）
+CPU_BUDGET = float(os.getenv("RECORDING_CPU_BUDGET", "0.8"))
+GOVERNOR_INTERVAL = 5.0
+# 连续这么多个周期负载低于预算的 60%，才恢复一档，避免来回抖动
+RECOVER_TICKS = 3
+
+
+def _source_name(source) -> str:
+    if source == livekit_rtc.TrackSource.SOURCE_SCREENSHARE:
+        return "screen_share"
+    return "camera"
+
+
+def _even(v: float) -> int:
+    # yuv420p 要求宽高为偶数
+    return max(2, int(v) // 2 * 2)
+
+
+class RecordingGovernor:
+    """
+    进程级的录制 CPU 预算调节器：周期性测量本进程的 CPU 占用，
+    超出预算时为所有会话降低帧率（并让新会话使用更低的分辨率），负载回落后逐级恢复。
+    """
+
+    def __init__(self):
+        self.cores = os.cpu_count() or 2
+        self.level = 0
+        self.cpu = 0.0
+        self._calm_ticks = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def fps_factor(self) -> float:
+        return GOVERNOR_LEVELS[self.level][0]
+
+    @property
+    def scale_factor(self) -> float:
+        return GOVERNOR_LEVELS[self.level][1]
+
+    def profile_for(self, publication=None) -> RecordingProfile:
+        """按轨道来源和发布尺寸确定新会话的录制规格：保持原始分辨率，只在超过上限时等比缩小"""
+        source = _source_name(publication.source) if publication is not None else "camera"
+        cap_w, cap_h, cap_fps = TRACK_CAPS[source]
+        width, height = DEFAULT_SIZE
+        if publication is not None and publication.width and publication.height:
+            width, height = publication.width, publication.height
+        scale = min(1.0, cap_w / width, cap_h / height) * self.scale_factor
+        # 降级不把小画面缩得更小
+        scale = max(scale, min(1.0, MIN_SHORT_SIDE / min(width, height)))
+        return RecordingProfile(_even(width * scale), _even(height * scale), cap_fps, source)
+
+    def fps_for(self, profile: RecordingProfile) -> float:
+        return max(MIN_FPS, profile.fps * self.fps_factor)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        # process_time 包含所有线程（编码线程、FrameWorker）的 CPU 时间
+        last_cpu, last_wall = time.process_time(), time.monotonic()
+        while True:
+            await asyncio.sleep(GOVERNOR_INTERVAL)
+            cpu, wall = time.process_time(), time.monotonic()
+            self.cpu = (cpu - last_cpu) / max(wall - last_wall, 1e-6) / self.cores
+            last_cpu, last_wall = cpu, wall
+            self._adjust()
+
+    def _adjust(self):
+        overloaded = self.cpu > CPU_BUDGET or admission.video_pressure() == "loop_lag"
+        if overloaded and self.level < len(GOVERNOR_LEVELS) - 1:
+            self.level += 1
+            self._calm_ticks = 0
+            logger.warning(f"[Governor] CPU {self.cpu:.0%} 超出预算 {CPU_BUDGET:.0%}，降至第 {self.level} 档 {GOVERNOR_LEVELS[self.level]}")
+        elif not overloaded and self.level and self.cpu < CPU_BUDGET * 0.6:
+            self._calm_ticks += 1
+            if self._calm_ticks >= RECOVER_TICKS:
+                self.level -= 1
+                self._calm_ticks = 0
+                logger.info(f"[Governor] CPU {self.cpu:.0%} 回落，恢复至第 {self.level} 档 {GOVERNOR_LEVELS[self.level]}")
+        else:
+            self._calm_ticks = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cpu": round(self.cpu, 3),
+            "budget": CPU_BUDGET,
+            "level": self.level,
+            "fps_factor": self.fps_factor,
+            "scale_factor": self.scale_factor,
+        }
+
+
+recording_governor = RecordingGovernor()
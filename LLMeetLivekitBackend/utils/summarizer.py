@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+from typing import Any, AsyncIterator, Dict, List
+
+from loguru import logger
+
+from static.meeting import get_cached_summary, save_summary
+from utils.llm_proxy import llm_proxy
+
+# 模型或 LoRA 适配器更新后修改此值，旧的总结自然失效
+SUMMARY_MODEL_VERSION = os.getenv("SUMMARY_MODEL_VERSION", "qwen3-14b-summarization-lora-meetingbank")
+SUMMARY_PATH = "/v1/chat/summarization"
+
+
+def _normalize(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # 只保留模型实际使用的字段，数据库与客户端传来的片段得到相同的哈希
+    return [
+        {"start": float(s["start"]), "end": float(s["end"]), "text": s.get("text", ""), "speaker": s.get("speaker") or ""}
+        for s in segments
+    ]
+
+
+def summary_key(segments: List[Dict[str, Any]], video_summarization: str) -> str:
+    raw = json.dumps(
+        [_normalize(segments), video_summarization or "", SUMMARY_MODEL_VERSION],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def summary_payload(segments: List[Dict[str, Any]], video_summarization: str) -> Dict[str, Any]:
+    """模型服务 /v1/chat/summarization 的请求体：片段以 JSON 放在第一条 user 消息中"""
+    return {
+        "messages": [{"role": "user", "content": json.dumps(_normalize(segments), ensure_ascii=False)}],
+        "segments": None,
+        "video_summarization": video_summarization or "",
+        "stream": True,
+    }
+
+
+def parse_sse(body: bytes) -> str:
+    """拼接 SSE 响应中各个 delta 的内容"""
+    text = []
+    for part in body.decode("utf-8", errors="replace").split("\n\n"):
+        if not part.startswith("data:"):
+            continue
+        data = part[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            delta = json.loads(data)["choices"][0]["delta"].get("content")
+        except (ValueError, KeyError, IndexError):
+            continue
+        if delta:
+            text.append(delta)
+    return "".join(text)
+
+
+async def replay(summary: str) -> AsyncIterator[str]:
+    """以与模型服务相同的 SSE 格式一次性返回已缓存的总结，客户端无需区分"""
+    chunk = {"choices": [{"delta": {"content": summary}, "index": 0, "finish_reason": "stop"}]}
+    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def store(content_hash: str, meeting_id: str, body: bytes):
+    summary = parse_sse(body)
+    if summary:
+        await save_summary(content_hash, meeting_id, SUMMARY_MODEL_VERSION, summary)
+
+
+async def ensure_summary(meeting_id: str, segments: List[Dict[str, Any]], video_summarization: str) -> bool:
+    """会后流水线预先生成总结；已有相同内容的总结时跳过。返回是否新生成"""
+    content_hash = summary_key(segments, video_summarization)
+    if await get_cached_summary(content_hash) is not None:
+        return False
+    body = await llm_proxy.collect(SUMMARY_PATH, summary_payload(segments, video_summarization))
+    summary = parse_sse(body)
+    if not summary:
+        raise RuntimeError("模型服务返回空总结")
+    if not await save_summary(content_hash, meeting_id, SUMMARY_MODEL_VERSION, summary):
+        raise RuntimeError("save_summary 失败")
+    logger.info(f"[{meeting_id}] 已预生成会议总结（{len(summary)} 字）")
+    return True
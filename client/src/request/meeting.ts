@@ -149,27 +149,17 @@ export const stopBot = async (meeting_id: string) => {
   }
 };
 
-export const getAllMeetingListByUsername = async () => {
-  const res = await requestWrapper(
-    '/meeting/get_all',
-    undefined,
-    {
-      method: 'GET'
-    },
-    true
-  );
-  if (typeof res !== 'number') {
-    const body = await res.json();
-    console.log('res', body);
-    return body;
-  } else {
-    return res;
-  }
-};
+export interface MeetingPage {
+  success: boolean;
+  meetings: any[];
+  next_cursor?: string | null;
+}
 
-export const getAllMeetingListWithRecordByUsername = async () => {
+// 会议列表按游标分页返回，每次只取一页，由页面在需要时带上 next_cursor 继续加载
+const fetchMeetingPage = async (path: string, cursor?: string | null) => {
+  const query: string = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
   const res = await requestWrapper(
-    '/meeting/get_all_with_records',
+    `${path}${query}`,
     undefined,
     {
       method: 'GET'
@@ -177,7 +167,7 @@ export const getAllMeetingListWithRecordByUsername = async () => {
     true
   );
   if (typeof res !== 'number') {
-    const body = await res.json();
+    const body: MeetingPage = await res.json();
     console.log('res', body);
     return body;
   } else {
@@ -185,6 +175,12 @@ export const getAllMeetingListWithRecordByUsername = async () => {
   }
 };
 
+export const getMeetingPageByUsername = (cursor?: string | null) =>
+  fetchMeetingPage('/meeting/get_all', cursor);
+
+export const getRecordedMeetingPageByUsername = (cursor?: string | null) =>
+  fetchMeetingPage('/meeting/get_all_with_records', cursor);
+
 export const getVideoBlob = async (path: string) => {
   const res = await requestWrapper(
     `/meeting/video`,
@@ -245,12 +241,19 @@ export const convertContent = async (meeting_id: string) => {
   }
 };
 
-export const getSummary = async (segments: any[], video_summarization: string) => {
+export const getSummary = async (
+  segments: any[],
+  video_summarization: string,
+  meeting_id?: string,
+  regenerate = false
+) => {
   const res = await requestWrapper(
     `/meeting/v1/chat/summarization`,
     {
       segments,
-      video_summarization
+      video_summarization,
+      meeting_id,
+      regenerate
     },
     {
       method: 'POST'
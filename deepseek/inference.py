@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from typing import List, Literal, Optional
 from unsloth import FastLanguageModel
 from peft import PeftModel
-from transformers import TextIteratorStreamer
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 from fastapi.responses import StreamingResponse
 import threading
 import asyncio
@@ -58,11 +58,23 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 
-# 🔧 将同步迭代器转换为异步生成器
+_DONE = object()
+
+# 🔧 将同步迭代器转换为异步生成器：阻塞的 next() 放到线程里，事件循环才能及时发现客户端断开
 async def _aiter_from_sync(sync_iter):
-    for item in sync_iter:
+    while True:
+        item = await asyncio.to_thread(next, sync_iter, _DONE)
+        if item is _DONE:
+            return
         yield item
-        await asyncio.sleep(0)
+
+# 🛑 客户端断开后让 generate 在下一个 token 处停止，不再生成到 max_new_tokens
+class _CancelCriteria(StoppingCriteria):
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
 
 def build_summarization_messages(segments: List[TranscriptSegment], video_summarization: str) -> List[dict]:
     system = {
@@ -123,6 +135,7 @@ async def _stream_response(chat_messages: List[dict]):
         skip_special_tokens=True,
         skip_prompt=True,
     )
+    cancelled = threading.Event()
     thread = threading.Thread(
         target=model.generate,
         kwargs={
@@ -133,6 +146,7 @@ async def _stream_response(chat_messages: List[dict]):
             "top_p": 0.9,
             "top_k": 40,
             "streamer": streamer,
+            "stopping_criteria": StoppingCriteriaList([_CancelCriteria(cancelled)]),
         },
     )
     thread.daemon = True
@@ -141,21 +155,25 @@ async def _stream_response(chat_messages: List[dict]):
     collecting = False
     buffer = ""
 
-    async for token in _aiter_from_sync(streamer):
-        buffer += token
-        if not collecting:
-            if "</think>" in buffer:
-                collecting = True
-                buffer = buffer.split("</think>", 1)[1]  # 只保留 think 后内容
-                continue
-            else:
-                continue
-
-        # 进入正式输出阶段
-        chunk = {"choices": [{"delta": {"content": token}, "index": 0, "finish_reason": None}]}
-        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
-    torch.cuda.empty_cache()
-    yield "data: [DONE]\n\n"
+    try:
+        async for token in _aiter_from_sync(streamer):
+            buffer += token
+            if not collecting:
+                if "</think>" in buffer:
+                    collecting = True
+                    buffer = buffer.split("</think>", 1)[1]  # 只保留 think 后内容
+                    continue
+                else:
+                    continue
+
+            # 进入正式输出阶段
+            chunk = {"choices": [{"delta": {"content": token}, "index": 0, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        # 正常结束或客户端断开（StreamingResponse 取消生成器）都会走到这里
+        cancelled.set()
+        torch.cuda.empty_cache()
 
 # 🚀 /v1/chat/completions
 @app.post("/v1/chat/completions")
@@ -1,16 +1,19 @@
 # app.py
 import os
+import re
 import shutil
 import tempfile
 from pathlib import Path
 from typing import List, Optional
 
-from fastapi import FastAPI, Form, UploadFile, File, HTTPException
+from fastapi import FastAPI, Form, Query, Request, UploadFile, File, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from loguru import logger
 
-from speech_brain_test import extract_and_diarize_transcribe_and_visualize
+from speech_brain_test import extract_and_diarize_transcribe_and_visualize, extract_video_summarization
+from stream_transcriber import stream_transcriber
 
 app = FastAPI(title="Audio Diarization & Transcription API")
 
@@ -27,39 +30,178 @@ class TranscribeResponse(BaseModel):
     segments: List[dict]
     video_summarization: str
 
+class TranscribePathsRequest(BaseModel):
+    paths: List[str] = []
+    batch_id: Optional[str] = None
+    num_speakers: Optional[int] = None
+    # 会议中已增量转写完语音时只生成画面总结
+    video_only: bool = False
+
+class StreamResponse(BaseModel):
+    segments: List[dict]
+    language: Optional[str] = None
+
+class UploadResponse(BaseModel):
+    batch_id: str
+    filename: str
+    size: int
+
+ALLOWED_SUFFIXES = (".mp4", ".wav")
+CHUNK_SIZE = 1 << 20
+# 与后端共享的录像目录（NFS / 同机挂载），路径引用模式只允许读取该目录下的文件
+SHARED_RECORDINGS_ROOT = Path(os.getenv("SHARED_RECORDINGS_ROOT", "/data/recordings")).resolve()
+# 远程模式下流式上传的暂存目录
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", tempfile.gettempdir())) / "llmeet_uploads"
+BATCH_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _copy_upload(src, dst: str):
+    with open(dst, "wb") as wf:
+        shutil.copyfileobj(src, wf, CHUNK_SIZE)
+
+
+def _run_transcription(mp4_dir: str, num_speakers: Optional[int], video_only: bool = False):
+    if video_only:
+        return {
+            "language": "",
+            "segments": [],
+            "video_summarization": extract_video_summarization(mp4_dir),
+        }
+    result = extract_and_diarize_transcribe_and_visualize(
+        mp4_dir=mp4_dir,
+        whisper_model="medium",
+        whisper_cache="/root/autodl-tmp/whisper_model",
+        num_speakers=num_speakers
+    )
+    logger.info(result)
+    return result
+
 @app.post(
     "/transcribe",
     response_model=TranscribeResponse,
-    summary="上传多段 MP4，返回带说话人标签的转写结果"
+    summary="上传多段 MP4（可附带 16 kHz ASR 旁路 WAV），返回带说话人标签的转写结果"
 )
 async def transcribe_endpoint(
-    files: List[UploadFile] = File(..., description="多段 MP4 文件"),
+    files: List[UploadFile] = File(..., description="多段 MP4 文件，以及可选的 asr_*.wav 旁路音频"),
     num_speakers: Optional[int] = Form(None, description="可选的说话人数（用于指导分离）"),
 ):
     tmpdir = tempfile.mkdtemp(prefix="transcribe_")
     try:
         saved = []
         for f in files:
-            if not f.filename.lower().endswith(".mp4"):
+            if not f.filename.lower().endswith((".mp4", ".wav")):
                 raise HTTPException(400, f"不支持的文件格式：{f.filename}")
-            dst = os.path.join(tmpdir, f.filename)
-            contents = await f.read()
-            with open(dst, "wb") as wf:
-                wf.write(contents)
+            dst = os.path.join(tmpdir, Path(f.filename).name)
+            # 分块拷贝，不把整个文件读进内存
+            await run_in_threadpool(_copy_upload, f.file, dst)
             saved.append(dst)
 
         logger.info(f"Saved {len(saved)} files to {tmpdir}")
+        return await run_in_threadpool(_run_transcription, tmpdir, num_speakers)
 
-        result = extract_and_diarize_transcribe_and_visualize(
-            mp4_dir=tmpdir,
-            whisper_model="medium",
-            whisper_cache="/root/autodl-tmp/whisper_model",
-            num_speakers=num_speakers
-        )
-        logger.info(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"转写失败: {e}", exc_info=True)
+        raise HTTPException(500, detail="内部服务器错误，请查看日志") from e
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
-        return result
+@app.post(
+    "/stream/{meeting_id}/{speaker}",
+    response_model=StreamResponse,
+    summary="会议进行中推送一段 16 kHz 单声道 s16 PCM，返回新完成窗口的转写片段"
+)
+async def stream_endpoint(
+    meeting_id: str,
+    speaker: str,
+    request: Request,
+    offset: Optional[float] = Query(None, description="这段音频在会议时间轴上的起点（秒）"),
+    final: bool = Query(False, description="该参会者音频结束，转写剩余部分"),
+    position: Optional[int] = Query(None, ge=0, description="这段音频在该路音频中的字节位置，重发时用于去重"),
+    session: str = Query("", description="录制会话 ID，同一参会者重新入会时区分不同的音频流"),
+):
+    pcm = await request.body()
+    if len(pcm) % 2:
+        raise HTTPException(400, "PCM 长度必须是 2 字节的整数倍")
+    try:
+        return await run_in_threadpool(stream_transcriber.feed, meeting_id, speaker, pcm, offset, final, position, session)
+    except Exception as e:
+        logger.error(f"增量转写失败: {e}", exc_info=True)
+        raise HTTPException(500, detail="内部服务器错误，请查看日志") from e
+
+
+@app.put(
+    "/uploads/{batch_id}/{filename}",
+    response_model=UploadResponse,
+    summary="流式上传单个录像文件，边收边写盘"
+)
+async def upload_endpoint(batch_id: str, filename: str, request: Request):
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise HTTPException(400, f"非法 batch_id：{batch_id}")
+    name = Path(filename).name
+    if not name.lower().endswith(ALLOWED_SUFFIXES):
+        raise HTTPException(400, f"不支持的文件格式：{name}")
+    batch_dir = UPLOAD_DIR / batch_id
+    dst = batch_dir / name
+    size = 0
+    # 磁盘写入放到线程池，大文件上传期间事件循环仍能处理 /stream 等请求
+    await run_in_threadpool(batch_dir.mkdir, parents=True, exist_ok=True)
+    wf = await run_in_threadpool(open, dst, "wb")
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(wf.write, chunk)
+            size += len(chunk)
+    finally:
+        await run_in_threadpool(wf.close)
+    return UploadResponse(batch_id=batch_id, filename=name, size=size)
 
+
+@app.delete(
+    "/uploads/{batch_id}",
+    summary="删除一个上传批次（后端放弃转写时清理）"
+)
+async def delete_upload_endpoint(batch_id: str):
+    if not BATCH_ID_PATTERN.match(batch_id):
+        raise HTTPException(400, f"非法 batch_id：{batch_id}")
+    await run_in_threadpool(shutil.rmtree, UPLOAD_DIR / batch_id, ignore_errors=True)
+    return {"batch_id": batch_id}
+
+
+@app.post(
+    "/transcribe_paths",
+    response_model=TranscribeResponse,
+    summary="按路径引用转写：共享存储上的录像原地读取，或转写已流式上传的批次"
+)
+async def transcribe_paths_endpoint(req: TranscribePathsRequest):
+    if req.batch_id:
+        if not BATCH_ID_PATTERN.match(req.batch_id):
+            raise HTTPException(400, f"非法 batch_id：{req.batch_id}")
+        batch_dir = UPLOAD_DIR / req.batch_id
+        if not batch_dir.is_dir():
+            raise HTTPException(404, f"批次不存在：{req.batch_id}")
+        try:
+            return await run_in_threadpool(_run_transcription, str(batch_dir), req.num_speakers, req.video_only)
+        except Exception as e:
+            logger.error(f"转写失败: {e}", exc_info=True)
+            raise HTTPException(500, detail="内部服务器错误，请查看日志") from e
+        finally:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+
+    if not req.paths:
+        raise HTTPException(400, "paths 与 batch_id 至少提供一个")
+    # 只建符号链接，不复制录像
+    tmpdir = tempfile.mkdtemp(prefix="transcribe_")
+    try:
+        for p in req.paths:
+            src = Path(p).resolve()
+            if not src.is_relative_to(SHARED_RECORDINGS_ROOT):
+                raise HTTPException(403, f"路径不在共享目录中：{p}")
+            if not src.is_file() or not src.name.lower().endswith(ALLOWED_SUFFIXES):
+                raise HTTPException(400, f"无效文件：{p}")
+            os.symlink(src, os.path.join(tmpdir, src.name))
+        logger.info(f"Linked {len(req.paths)} shared files into {tmpdir}")
+        return await run_in_threadpool(_run_transcription, tmpdir, req.num_speakers, req.video_only)
     except HTTPException:
         raise
     except Exception as e:
@@ -68,6 +210,7 @@ async def transcribe_endpoint(
     finally:
         shutil.rmtree(tmpdir, ignore_errors=True)
 
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -7,6 +7,7 @@ import tempfile
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
 import whisper
 import torch
 from scipy.io import wavfile
@@ -18,6 +19,13 @@ from PIL import Image
 import cv2
 import torch
 
+def has_video_stream(path) -> bool:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v", "-show_entries", "stream=index", "-of", "csv=p=0", str(path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    return result.returncode == 0 and bool(result.stdout.strip())
+
 def concat_videos_by_timestamp(
     mp4_dir: str,
     output_video: str = "merged_video.mp4"
@@ -33,6 +41,10 @@ def concat_videos_by_timestamp(
         entries.append((ts, f))
     if not entries:
         raise RuntimeError("❌ 没找到任何匹配的 MP4 文件")
+    # 录制端负载过高时会降级为只录音频，这些文件不参与画面合并
+    entries = [(ts, f) for ts, f in entries if has_video_stream(f)]
+    if not entries:
+        return None
     entries.sort(key=lambda x: x[0])
 
     list_file = Path(mp4_dir) / "concat_list.txt"
@@ -68,11 +80,49 @@ def concat_videos_by_timestamp(
     print(f"✅ 视频合并完成：{output_video}")
     return output_video
 
+ASR_SAMPLE_RATE = 16000
+
+
+def mix_asr_sidecars(entries, output_wav: str):
+    """
+    直接混合录制端生成的 16 kHz 单声道旁路 WAV：按文件名时间戳对齐后相加，
+    不需要解码 MP4，也不需要重采样。
+    """
+    t0 = entries[0][0]
+    tracks = []
+    for ts, wav in entries:
+        sr, data = wavfile.read(wav)
+        if sr != ASR_SAMPLE_RATE or data.ndim != 1:
+            raise RuntimeError(f"旁路音频格式不符：{wav}")
+        offset = int((ts - t0).total_seconds() * ASR_SAMPLE_RATE)
+        tracks.append((offset, data))
+    mixed = np.zeros(max(o + len(d) for o, d in tracks), dtype=np.int32)
+    for offset, data in tracks:
+        mixed[offset:offset + len(data)] += data
+    # 多人同时说话时可能溢出，整体缩放到 int16 范围
+    peak = int(np.abs(mixed).max()) if len(mixed) else 0
+    if peak > 32767:
+        mixed = mixed * (32767 / peak)
+    wavfile.write(output_wav, ASR_SAMPLE_RATE, mixed.astype(np.int16))
+    print(f"✅ 旁路音频合并完成：{output_wav}")
+
+
 def mix_audio_by_timestamp(
     mp4_dir: str,
     output_wav: str = "merged.wav"
 ):
     p = Path(mp4_dir)
+    # 每段录像都带有 asr_*.wav 旁路音频时直接混合，跳过 ffmpeg 解码
+    asr_pattern = re.compile(r"^asr_.+?_(\d{8}_\d{6})\.wav$")
+    sidecars = []
+    for f in p.glob("asr_*.wav"):
+        m = asr_pattern.match(f.name)
+        if m:
+            sidecars.append((datetime.strptime(m.group(1), "%Y%m%d_%H%M%S"), f))
+    if sidecars and len(sidecars) == len(list(p.glob("final_*.mp4"))):
+        sidecars.sort(key=lambda x: x[0])
+        return mix_asr_sidecars(sidecars, output_wav)
+
     pattern = re.compile(r"^final_.+?_(\d{8}_\d{6})\.mp4$")
     entries = []
     for f in p.glob("*.mp4"):
@@ -215,6 +265,17 @@ def extract_video_insights_with_llava(
         response = raw_text.strip()  # fallback
     return response
 
+def extract_video_summarization(
+        mp4_dir: str,
+        llava_cache: str = "/root/autodl-tmp/llava_model",
+        llava_model: str = "llava-hf/LLaVA-NeXT-Video-7B-hf",
+    ) -> str:
+    """会议中已完成增量转写时，会后只需要生成画面总结"""
+    merged_video = concat_videos_by_timestamp(mp4_dir)
+    if merged_video is None:
+        return ""
+    return extract_video_insights_with_llava(mp4_dir=merged_video, llava_cache=llava_cache, llava_model_name=llava_model)
+
 def extract_and_diarize_transcribe_and_visualize(
         mp4_dir: str,
         whisper_model: str = "large",
@@ -252,7 +313,9 @@ def extract_and_diarize_transcribe_and_visualize(
     torch.cuda.empty_cache()
     # 选择一个视频文件（取时间最早那段）
     merged_video = concat_videos_by_timestamp(mp4_dir)
-    video_summarization = extract_video_insights_with_llava(mp4_dir=merged_video, llava_cache=llava_cache, llava_model_name=llava_model)
+    video_summarization = extract_video_insights_with_llava(
+        mp4_dir=merged_video, llava_cache=llava_cache, llava_model_name=llava_model
+    ) if merged_video else ""
 
     return {
         'language': result['language'],
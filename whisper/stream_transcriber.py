@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import whisper
+from loguru import logger
+
+SAMPLE_RATE = 16000
+# 每积累这么多秒音频转写一次；窗口越短延迟越低，但句子被截断的概率越高
+WINDOW_SECONDS = float(os.getenv("STREAM_WINDOW_SECONDS", "30"))
+MIN_TAIL_SECONDS = 0.5
+# 超过这么久没有新推送的流（最后一块始终没到，或已结束等待重发）直接丢弃
+STREAM_IDLE_SECONDS = float(os.getenv("STREAM_IDLE_SECONDS", "600"))
+STREAM_WHISPER_MODEL = os.getenv("STREAM_WHISPER_MODEL", "small")
+WHISPER_CACHE = os.getenv("WHISPER_CACHE", "/root/autodl-tmp/whisper_model")
+
+
+class _SpeakerStream:
+    def __init__(self, start: float):
+        self.buffer = bytearray()
+        self.start = start
+        self.prompt = ""
+        # 已收到的字节数，客户端超时重发时据此跳过已有的音频
+        self.received = 0
+        # 上一次推送的起始位置和结果，重发同一块时一并返回，避免片段丢失
+        self.last_position: Optional[int] = None
+        self.last_result: Dict = {"segments": [], "language": None}
+        self.finished = False
+        self.touched = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class StreamTranscriber:
+    """
+    会议进行中的增量转写：每位参会者一路 16 kHz 单声道 PCM，按滚动窗口转写，
+    返回换算到会议时间轴上的新片段。说话人即参会者身份，无需再做声纹聚类。
+    """
+
+    def __init__(self):
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._streams: Dict[Tuple[str, str], _SpeakerStream] = {}
+        self._streams_lock = threading.Lock()
+
+    def _get_model(self):
+        if self._model is None:
+            logger.info(f"加载流式转写模型 {STREAM_WHISPER_MODEL}")
+            self._model = whisper.load_model(STREAM_WHISPER_MODEL, download_root=WHISPER_CACHE)
+        return self._model
+
+    def feed(
+        self,
+        meeting_id: str,
+        speaker: str,
+        pcm: bytes,
+        offset: Optional[float],
+        final: bool = False,
+        position: Optional[int] = None,
+        session: str = "",
+    ) -> Dict:
+        """
+        阻塞调用（在线程池中运行）。offset 为这段 PCM 在会议时间轴上的起点（秒），
+        position 为它在这一路音频中的字节位置：早于已收到部分的字节视为重发，直接跳过。
+        """
+        key = (meeting_id, speaker, session)
+        now = time.monotonic()
+        with self._streams_lock:
+            for k in [k for k, s in self._streams.items() if now - s.touched > STREAM_IDLE_SECONDS]:
+                logger.warning(f"增量转写流 {k} 超过 {STREAM_IDLE_SECONDS:.0f}s 没有推送，丢弃")
+                del self._streams[k]
+            stream = self._streams.get(key)
+            if stream is None:
+                stream = self._streams[key] = _SpeakerStream(offset or 0.0)
+            stream.touched = now
+
+        # 客户端超时重发时，原请求可能仍在转写，同一路流的推送逐个处理
+        with stream.lock:
+            carry: Dict = {"segments": [], "language": None}
+            if position is not None:
+                if position < stream.received:
+                    if position == stream.last_position:
+                        carry = stream.last_result
+                    skip = min(stream.received - position, len(pcm))
+                    pcm = pcm[skip:]
+                    if offset is not None:
+                        offset += skip / 2 / SAMPLE_RATE
+                elif position > stream.received and not stream.buffer:
+                    # 服务重启或流已过期，中间的音频不在这里，从当前位置接着转写
+                    stream.received = position
+            if stream.finished and not pcm:
+                return carry
+            if not stream.buffer and offset is not None and pcm:
+                stream.start = offset
+            stream.buffer.extend(pcm)
+            stream.received += len(pcm)
+
+            window_bytes = int(WINDOW_SECONDS * SAMPLE_RATE) * 2
+            segments: List[Dict] = list(carry["segments"])
+            language = carry["language"]
+            while len(stream.buffer) >= window_bytes:
+                chunk = bytes(stream.buffer[:window_bytes])
+                del stream.buffer[:window_bytes]
+                language = self._transcribe(stream, speaker, chunk, segments) or language
+            if final:
+                if len(stream.buffer) >= int(MIN_TAIL_SECONDS * SAMPLE_RATE) * 2:
+                    language = self._transcribe(stream, speaker, bytes(stream.buffer), segments) or language
+                stream.buffer.clear()
+                # 保留到过期，最后一块的重发仍能拿到结果
+                stream.finished = True
+            result = {"segments": segments, "language": language}
+            if position is not None:
+                stream.last_position = position
+                stream.last_result = result
+            return result
+
+    def _transcribe(self, stream: _SpeakerStream, speaker: str, chunk: bytes, out: List[Dict]) -> Optional[str]:
+        audio = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768.0
+        with self._model_lock:
+            result = self._get_model().transcribe(
+                audio, language=None, task="transcribe",
+                # 上一窗口的文本作为提示，减少窗口边界处的断句错误
+                initial_prompt=stream.prompt or None,
+            )
+        for seg in result["segments"]:
+            text = seg["text"].strip()
+            if not text:
+                continue
+            out.append({
+                "speaker": speaker,
+                "start": stream.start + seg["start"],
+                "end": stream.start + seg["end"],
+                "text": text,
+            })
+        stream.prompt = result.get("text", "")[-200:]
+        stream.start += len(chunk) / 2 / SAMPLE_RATE
+        return result.get("language")
+
+
+stream_transcriber = StreamTranscriber()